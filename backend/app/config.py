@@ -18,10 +18,51 @@ class Settings(BaseSettings):
 
     # API Key Settings
     api_key_prefix: str = "rpe_"
+    api_key_cache_size: int = 1024  # cached key hash -> merchant lookups; 0 disables
+    api_key_cache_ttl_s: float = 30.0
 
     # ML Model
     model_path: str = "ml/models/scoring_model.joblib"
     bootstrap_train: bool = True  # train an initial model on startup if none exists
+    compiled_inference: bool = True  # serve tree ensembles from flat arrays instead of sklearn
+    mmap_model_arrays: bool = True  # share compiled arrays across worker processes via mmapped .npy files
+    preload_model: bool = False  # bootstrap + load the model at import, before gunicorn --preload forks workers
+    explanation_method: str = "ablation"  # "ablation" or "treeshap"; stored in each trained bundle
+    registry_compression: str = "zlib"  # registry blobs: "zlib", "lzma" or "none"
+    registry_compression_level: int = 3
+    registry_retention_versions: int = 5  # newest versions that keep their blob (plus active and pinned ones)
+    registry_poll_interval_s: float = 5.0  # workers switch to a newly activated version within this; 0 disables
+    retrain_job_stale_s: float = 900.0  # a running retrain job silent this long is failed (its worker died)
+
+    # Micro-batching: coalesce concurrent /score predictions into one model call
+    microbatch_enabled: bool = False
+    microbatch_window_ms: float = 2.0  # wait this long after the first queued row
+    microbatch_max_rows: int = 64  # ...or until this many rows are queued
+
+    # Inference pool: run prediction/explanation in N worker processes (0 = in-process)
+    inference_workers: int = 0
+    inference_timeout_s: float = 10.0
+
+    # Buyer/product profile cache used by scoring (per worker process)
+    profile_cache_size: int = 10000  # entries per cache; 0 disables caching
+    profile_cache_ttl_s: float = 60.0
+
+    # Per-buyer return-velocity counters (per worker process; see app.services.velocity)
+    velocity_cache_size: int = 50000  # buyers kept in memory
+    velocity_cache_ttl_s: float = 30.0  # re-read a buyer's events after this (other workers' returns)
+
+    # Write-behind persistence of scored returns (see app.services.score_writer)
+    write_behind_mode: str = "off"  # "off", "async" or "group_commit"
+    write_behind_flush_ms: float = 5.0  # flush at least this often...
+    write_behind_batch_size: int = 200  # ...or once this many rows are queued
+    write_behind_queue_size: int = 10000  # queued requests before backpressure
+    write_behind_block_ms: float = 50.0  # wait on a full queue, then write synchronously
+
+    # Streaming drift counters (see app.services.drift)
+    drift_flush_interval_s: float = 10.0  # add in-memory counters to the bucket tables this often
+    drift_bucket_retention_days: int = 90  # buckets and snapshots older than this are deleted on startup
+    drift_snapshot_interval_s: float = 3600.0  # store per-feature PSI for every merchant this often; 0 disables
+    drift_snapshot_window_hours: int = 24  # traffic window each snapshot covers
 
     # Scoring thresholds
     high_risk_threshold: float = 30.0
@@ -20,13 +20,42 @@ settings = get_settings()
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+if settings.preload_model:
+    # gunicorn --preload imports this module once in the master: bootstrap
+    # and load the model here, so workers neither repeat it nor hold their
+    # own copy (forked workers share the master's pages)
+    from app.services.bootstrap import run_bootstrap
+    from app.ml.predict import get_predictor
+    run_bootstrap(engine, SessionLocal)
+    get_predictor()
+    engine.dispose()  # connections must not be shared across the fork
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Self-provisioning: schema upgrades, initial model, demo merchant
-    from app.services.bootstrap import run_bootstrap
-    run_bootstrap(engine, SessionLocal)
+    if not settings.preload_model:
+        from app.services.bootstrap import run_bootstrap
+        run_bootstrap(engine, SessionLocal)
+    from app.ml.predict import get_predictor
+    from app.services.drift import drift_accumulator
+    from app.services.drift_history import drift_snapshot_job
+    from app.services.model_sync import model_version_watcher
+    from app.services.retrain_jobs import retrain_jobs
+    from app.services.score_writer import score_writer
+    get_predictor().start_pool(settings.inference_workers)
+    score_writer.start(SessionLocal)
+    drift_accumulator.start(SessionLocal)
+    drift_snapshot_job.start(SessionLocal)
+    model_version_watcher.start(SessionLocal)
+    retrain_jobs.start(SessionLocal)
     yield
+    retrain_jobs.stop()
+    model_version_watcher.stop()
+    drift_snapshot_job.stop()
+    score_writer.stop()
+    drift_accumulator.stop()
+    get_predictor().shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -64,6 +93,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -93,6 +123,31 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+def metrics():
+    """In-process serving metrics (per worker)."""
+    from app.ml.predict import get_predictor
+    from app.services.auth import api_key_cache
+    from app.services.drift import drift_accumulator
+    from app.services.drift_history import drift_snapshot_job
+    from app.services.model_sync import model_version_watcher
+    from app.services.profile_cache import profile_cache_stats
+    from app.services.retrain_jobs import retrain_jobs
+    from app.services.score_writer import score_writer
+    from app.services.velocity import velocity_tracker
+    return {
+        "inference": get_predictor().stats(),
+        "profile_cache": profile_cache_stats(),
+        "api_key_cache": api_key_cache.stats(),
+        "velocity": velocity_tracker.stats(),
+        "write_behind": score_writer.stats(),
+        "drift": drift_accumulator.stats(),
+        "drift_snapshots": drift_snapshot_job.stats(),
+        "model_sync": model_version_watcher.stats(),
+        "retrain_jobs": retrain_jobs.stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,202 @@
+"""Memory-mapped serving arrays shared by every worker process.
+
+The large arrays behind inference - the compiled ensemble's node arrays
+and the TreeSHAP lookup tables - are written once per model bundle as
+.npy files in a directory next to the joblib artifact, named after the
+bundle's version and trained_at
+(ml/models/scoring_model.v7-20260301T120000.arrays/). Workers open them
+with np.load(mmap_mode="r") instead of compiling their own copy, so N API
+or inference-pool processes share one page-cache copy, and a worker start
+skips compilation and table precomputation.
+
+An export is written under a temporary name and renamed into place only
+if its directory does not exist yet; it is never replaced. A directory
+therefore only ever holds one complete export of one bundle, and workers
+serving different bundles during a rollout each use their own. meta.json
+records the scalars and the bundle the arrays were built from, as a
+check.
+
+Each process records the export it maps in a marker file named after its
+pid ({base}.arrays-in-use/<pid>). Publishing an export removes every other
+export no live process has marked, whatever its version, so rollbacks and
+re-exports of a version do not accumulate (a process mapping files that
+are removed keeps them until it unmaps).
+"""
+import glob
+import json
+import os
+import re
+import shutil
+from typing import Any, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from app.ml.compiled import CompiledEnsemble
+from app.ml.treeshap import TreeShapExplainer
+
+FORMAT_VERSION = 1
+
+COMPILED_ARRAYS = ("feature", "threshold", "left", "right", "value", "cover", "roots")
+TREESHAP_ARRAYS = ("leaf_feature", "lower", "upper", "table")
+
+
+def arrays_dir(model_path: str, bundle: Dict[str, Any]) -> str:
+    """Export directory of `bundle`'s arrays."""
+    trained_at = re.sub(r"[^0-9A-Za-z]", "", str(bundle.get("trained_at") or ""))
+    return f"{os.path.splitext(model_path)[0]}.v{bundle.get('version')}-{trained_at}.arrays"
+
+
+def _fingerprint(bundle: Dict[str, Any]) -> Dict[str, Any]:
+    return {"version": bundle.get("version"), "trained_at": bundle.get("trained_at")}
+
+
+def _in_use_dir(model_path: str) -> str:
+    return f"{os.path.splitext(model_path)[0]}.arrays-in-use"
+
+
+def _mark_in_use(model_path: str, directory: str):
+    """Record `directory` as the export this process maps."""
+    markers = _in_use_dir(model_path)
+    os.makedirs(markers, exist_ok=True)
+    marker = os.path.join(markers, str(os.getpid()))
+    with open(f"{marker}.tmp", "w") as f:
+        f.write(os.path.basename(directory))
+    os.replace(f"{marker}.tmp", marker)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _exports_in_use(model_path: str) -> Set[str]:
+    """Export directory names marked by live processes; markers of exited
+    processes are removed."""
+    markers = _in_use_dir(model_path)
+    in_use = set()
+    try:
+        names = os.listdir(markers)
+    except OSError:
+        return in_use
+    for name in names:
+        if not name.isdigit():
+            continue
+        marker = os.path.join(markers, name)
+        if not _pid_alive(int(name)):
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(marker) as f:
+                in_use.add(f.read().strip())
+        except OSError:
+            continue
+    return in_use
+
+
+def _remove_unused_exports(model_path: str, published: str):
+    """Delete every export but `published` and those still in use, and the
+    single shared directory earlier releases used."""
+    base = os.path.splitext(model_path)[0]
+    keep = _exports_in_use(model_path) | {os.path.basename(published)}
+    for directory in glob.glob(f"{glob.escape(base)}.v*.arrays"):
+        if os.path.basename(directory) not in keep:
+            shutil.rmtree(directory, ignore_errors=True)
+    shutil.rmtree(f"{base}.arrays", ignore_errors=True)
+
+
+def export_arrays(
+    model_path: str,
+    bundle: Dict[str, Any],
+    compiled: CompiledEnsemble,
+    shap_explainer: Optional[TreeShapExplainer] = None,
+) -> str:
+    """Write the serving arrays of `bundle`, unless they already are;
+    returns the directory, marked in use by this process."""
+    directory = arrays_dir(model_path, bundle)
+    if os.path.isdir(directory):
+        _mark_in_use(model_path, directory)
+        return directory
+    staging = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    arrays = {f"compiled_{name}": getattr(compiled, name) for name in COMPILED_ARRAYS}
+    meta: Dict[str, Any] = {
+        "format": FORMAT_VERSION,
+        **_fingerprint(bundle),
+        "compiled": {
+            "init_raw": compiled.init_raw,
+            "learning_rate": compiled.learning_rate,
+            "max_depth": compiled.max_depth,
+            "n_features": compiled.n_features,
+        },
+        "treeshap": None,
+    }
+    if shap_explainer is not None:
+        arrays.update({f"treeshap_{name}": getattr(shap_explainer, name) for name in TREESHAP_ARRAYS})
+        meta["treeshap"] = {
+            "expected_value": shap_explainer.expected_value,
+            "n_features": shap_explainer.n_features,
+        }
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        # Fails if the directory exists: never replace a published export
+        os.rename(staging, directory)
+    except OSError:
+        # Out of space, or another process exported the same bundle at the
+        # same moment
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(directory):
+            raise
+    _mark_in_use(model_path, directory)
+    _remove_unused_exports(model_path, directory)
+    return directory
+
+
+def load_arrays(
+    model_path: str, bundle: Dict[str, Any], mmap_mode: Optional[str] = "r"
+) -> Optional[Tuple[CompiledEnsemble, Optional[TreeShapExplainer]]]:
+    """The exported serving arrays of `bundle`, memory-mapped, or None if
+    there is no export for this bundle."""
+    directory = arrays_dir(model_path, bundle)
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != FORMAT_VERSION:
+        return None
+    if any(meta.get(key) != value for key, value in _fingerprint(bundle).items()):
+        return None
+    try:
+        _mark_in_use(model_path, directory)
+    except OSError as e:
+        print(f"Warning: Could not mark model arrays in use: {e}")
+
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    try:
+        compiled = CompiledEnsemble(
+            **{name: load(f"compiled_{name}") for name in COMPILED_ARRAYS}, **meta["compiled"]
+        )
+        shap_explainer = None
+        if meta["treeshap"] is not None:
+            shap_explainer = TreeShapExplainer(
+                *(load(f"treeshap_{name}") for name in TREESHAP_ARRAYS), **meta["treeshap"]
+            )
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Could not map model arrays from {directory}: {e}")
+        return None
+    return compiled, shap_explainer
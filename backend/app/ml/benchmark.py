@@ -0,0 +1,87 @@
+"""Explanation benchmark: baseline ablation vs exact TreeSHAP.
+
+    python -m app.ml.benchmark [--samples 5000] [--rows 200]
+
+Trains a model on synthetic data, times both explainers on single-row
+requests (the /score path) and on one batch (the /score/batch path), and
+reports how closely their attributions agree.
+"""
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+
+from app.ml.compiled import CompiledEnsemble
+from app.ml.ecommerce_data import generate_flipkart_amazon_dataset
+from app.ml.explain import explain_batch, explain_treeshap_batch
+from app.ml.train import ModelTrainer
+from app.ml.treeshap import TreeShapExplainer
+
+
+def _time_per_row(fn: Callable[[int], object], n_rows: int, repeat: int = 3) -> float:
+    """Best-of-`repeat` milliseconds per row."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(n_rows)
+        best = min(best, time.perf_counter() - start)
+    return best / n_rows * 1000
+
+
+def run_benchmark(n_samples: int = 5000, n_rows: int = 200) -> None:
+    trainer = ModelTrainer()
+    trainer.train(n_synthetic_samples=n_samples, run_cv=False)
+    bundle = trainer.bundle
+    names = bundle["feature_names"]
+
+    data, _ = generate_flipkart_amazon_dataset(n_rows)
+    X = trainer.feature_extractor.extract_batch(data)
+
+    compiled = CompiledEnsemble.from_model(trainer.model)
+    build_start = time.perf_counter()
+    shap = TreeShapExplainer.from_ensemble(compiled)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    def ablation(model):
+        return lambda i: explain_batch(model, X[i:i + 1], bundle["baselines"], names, [data[i]])
+
+    def treeshap(i):
+        return explain_treeshap_batch(shap, compiled, X[i:i + 1], names, [data[i]])
+
+    timings = {
+        "ablation (sklearn), per request": lambda n: [ablation(trainer.model)(i) for i in range(n)],
+        "ablation (compiled), per request": lambda n: [ablation(compiled)(i) for i in range(n)],
+        "treeshap, per request": lambda n: [treeshap(i) for i in range(n)],
+        "ablation (compiled), one batch": lambda n: explain_batch(
+            compiled, X[:n], bundle["baselines"], names, data[:n]),
+        "treeshap, one batch": lambda n: explain_treeshap_batch(shap, compiled, X[:n], names, data[:n]),
+    }
+
+    print("\n" + "=" * 60)
+    print(f"Explanation benchmark ({n_rows} rows, {len(trainer.model.estimators_)} trees)")
+    print("=" * 60)
+    print(f"  TreeSHAP table build: {build_ms:.1f} ms (once per model load)")
+    for label, fn in timings.items():
+        print(f"  {label:<36} {_time_per_row(fn, n_rows):8.3f} ms/row")
+
+    full = len(names)
+    ablated = explain_batch(compiled, X, bundle["baselines"], names, data, top_k=full)
+    exact = explain_treeshap_batch(shap, compiled, X, names, data, top_k=full)
+    top1 = np.mean([
+        bool(a) and bool(s) and a[0]["feature"] == s[0]["feature"]
+        for a, s in zip(ablated, exact)
+    ])
+    overlap = np.mean([
+        len({c["feature"] for c in a[:3]} & {c["feature"] for c in s[:3]}) / 3
+        for a, s in zip(ablated, exact)
+    ])
+    print(f"  Same top feature: {top1:.0%}   top-3 overlap: {overlap:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5000, help="training samples")
+    parser.add_argument("--rows", type=int, default=200, help="rows to explain")
+    args = parser.parse_args()
+    run_benchmark(n_samples=args.samples, n_rows=args.rows)
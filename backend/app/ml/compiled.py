@@ -0,0 +1,142 @@
+"""Flat-array inference backend for the gradient boosting model.
+
+For a single row, sklearn's GradientBoostingClassifier.predict_proba spends
+most of its time validating input and dispatching into each of its ~100
+estimators. CompiledEnsemble copies every tree of a fitted binary
+classifier into shared contiguous arrays (split feature, threshold, left and
+right child, leaf value, cover) and walks all trees for all rows at once:
+one vectorized step per tree level, no per-tree Python calls.
+
+Leaves point to themselves, so every row can take exactly max_depth steps
+without checking whether it has already reached a leaf.
+"""
+from typing import Optional
+
+import numpy as np
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import GradientBoostingClassifier
+
+# Compiled output must match sklearn to this tolerance before it is served
+EQUIVALENCE_TOLERANCE = 1e-9
+
+
+class CompiledEnsemble:
+    """All trees of a binary log-loss GradientBoostingClassifier, flattened.
+
+    Node arrays are indexed globally; `roots[t]` is the first node of tree
+    t. Exposes predict_proba() with sklearn's shape, so it can stand in for
+    the model wherever only probabilities are needed.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        value: np.ndarray,
+        cover: np.ndarray,
+        roots: np.ndarray,
+        init_raw: float,
+        learning_rate: float,
+        max_depth: int,
+        n_features: int,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.cover = cover
+        self.roots = roots
+        self.init_raw = float(init_raw)
+        self.learning_rate = float(learning_rate)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def is_leaf(self) -> np.ndarray:
+        return self.left == np.arange(len(self.left))
+
+    @classmethod
+    def from_model(cls, model) -> Optional["CompiledEnsemble"]:
+        """Compile a fitted model, or return None if it isn't supported.
+
+        Supported: binary GradientBoostingClassifier with log-loss and the
+        default prior (or zero) initial estimator.
+        """
+        if not isinstance(model, GradientBoostingClassifier):
+            return None
+        if not hasattr(model, "estimators_") or model.estimators_.shape[1] != 1:
+            return None
+        if model.loss not in ("log_loss", "deviance"):
+            return None
+
+        n_features = int(model.n_features_in_)
+        if model.init_ == "zero":
+            init_raw = 0.0
+        elif isinstance(model.init_, DummyClassifier) and model.init_.strategy == "prior":
+            # Same clipping and link as sklearn's _init_raw_predictions
+            eps = np.finfo(np.float32).eps
+            p = model.init_.predict_proba(np.zeros((1, n_features)))[0, 1]
+            p = float(np.clip(p, eps, 1 - eps))
+            init_raw = np.log(p / (1 - p))
+        else:
+            return None
+
+        features, thresholds, lefts, rights, values, covers, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_[:, 0]:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            nodes = np.arange(n_nodes)
+            leaf = tree.children_left == -1
+
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, 0.0, tree.threshold))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            covers.append(tree.weighted_n_node_samples)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            cover=np.ascontiguousarray(np.concatenate(covers), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            init_raw=init_raw,
+            learning_rate=model.learning_rate,
+            max_depth=max_depth,
+            n_features=n_features,
+        )
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Global leaf index reached in every tree: shape (n_rows, n_trees)."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        """Raw log-odds of the positive class, one per row."""
+        return self.init_raw + self.learning_rate * self.value[self.leaves(X)].sum(axis=1)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        positive = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def matches(self, model, X: np.ndarray, tol: float = EQUIVALENCE_TOLERANCE) -> bool:
+        """Whether this compilation reproduces model.predict_proba on X."""
+        expected = model.predict_proba(X)
+        return bool(np.max(np.abs(self.predict_proba(X) - expected)) <= tol)
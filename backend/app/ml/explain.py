@@ -4,12 +4,17 @@ Produces feature contributions in score points (0-100 scale) using
 interventional ablation: each feature is replaced by its training-set
 baseline (median) and the resulting probability shift is attributed to
 that feature. This is model-agnostic and requires no extra dependencies.
+
+Bundles trained with explanation_method="treeshap" use exact TreeSHAP
+instead (app.ml.treeshap), reported on the same score-point scale.
 """
 import numpy as np
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence
 
 from app.ml.features import NUMERICAL_FEATURES
 
+EXPLANATION_METHODS = ("ablation", "treeshap")
+
 # Human-readable labels shown to merchants and buyers
 FEATURE_LABELS: Dict[str, str] = {
     "buyer_return_rate": "Buyer return rate",
@@ -58,27 +63,98 @@ def explain_prediction(
     score points: positive = pushed the score up (more eligible),
     negative = pushed the score down (more risky).
     """
-    base_prob = float(model.predict_proba(feature_vector)[0][1])
+    return explain_batch(
+        model, feature_vector, baselines, feature_names, [raw_features], top_k
+    )[0]
+
+
+def explain_batch(
+    model,
+    feature_matrix: np.ndarray,
+    baselines: List[float],
+    feature_names: List[str],
+    raw_features_list: List[Dict[str, Any]],
+    top_k: int = 6,
+) -> List[List[Dict[str, Any]]]:
+    """Baseline ablation for N rows with a single predict_proba call.
 
+    Each row expands into a block of n_features + 1 rows: the original,
+    then one copy per feature with that feature set to its baseline. All
+    blocks are scored together, so sklearn's validation and per-estimator
+    dispatch run once for the whole batch instead of once per feature.
+    """
+    X = np.asarray(feature_matrix, dtype=float)
+    n_rows, n_features = X.shape
+    base = np.asarray(baselines, dtype=float)
+
+    blocks = np.repeat(X[:, np.newaxis, :], n_features + 1, axis=1)
+    cols = np.arange(n_features)
+    blocks[:, cols + 1, cols] = base
+
+    probs = model.predict_proba(blocks.reshape(-1, n_features))[:, 1]
+    probs = probs.reshape(n_rows, n_features + 1)
+    deltas = (probs[:, :1] - probs[:, 1:]) * 100
+
+    return [
+        _top_contributions(deltas[row], X[row], feature_names, raw_features, top_k,
+                           candidates=X[row] != base)
+        for row, raw_features in enumerate(raw_features_list)
+    ]
+
+
+def explain_treeshap_batch(
+    explainer,
+    ensemble,
+    feature_matrix: np.ndarray,
+    feature_names: List[str],
+    raw_features_list: List[Dict[str, Any]],
+    top_k: int = 6,
+) -> List[List[Dict[str, Any]]]:
+    """Exact TreeSHAP attributions (see app.ml.treeshap) in score points.
+
+    SHAP values are additive in log-odds. To report them on the same 0-100
+    scale as ablation, each row's values are rescaled so they sum to the
+    gap between its probability and the model's expected probability.
+    """
+    X = np.asarray(feature_matrix, dtype=float)
+    phi = explainer.shap_values(X)
+
+    raw = ensemble.decision_function(X)
+    raw_gap = raw - explainer.expected_value
+    prob = 1.0 / (1.0 + np.exp(-raw))
+    prob_gap = prob - 1.0 / (1.0 + np.exp(-explainer.expected_value))
+    # At (almost) zero gap the ratio tends to the logistic slope
+    degenerate = np.abs(raw_gap) < 1e-9
+    scale = np.where(degenerate, prob * (1 - prob), prob_gap / np.where(degenerate, 1.0, raw_gap))
+    points = phi * scale[:, np.newaxis] * 100
+
+    return [
+        _top_contributions(points[row], X[row], feature_names, raw_features, top_k)
+        for row, raw_features in enumerate(raw_features_list)
+    ]
+
+
+def _top_contributions(
+    points: np.ndarray,
+    values: np.ndarray,
+    feature_names: List[str],
+    raw_features: Dict[str, Any],
+    top_k: int,
+    candidates: Optional[np.ndarray] = None,
+) -> List[Dict[str, Any]]:
+    """Format one row's per-feature score points, largest impact first."""
     contributions = []
     for idx, name in enumerate(feature_names):
-        actual = float(feature_vector[0, idx])
-        baseline = float(baselines[idx])
-        if actual == baseline:
+        if candidates is not None and not candidates[idx]:
             continue
-
-        ablated = feature_vector.copy()
-        ablated[0, idx] = baseline
-        ablated_prob = float(model.predict_proba(ablated)[0][1])
-        delta_points = (base_prob - ablated_prob) * 100
-
+        delta_points = float(points[idx])
         if abs(delta_points) < 0.05:
             continue
 
         contributions.append({
             "feature": name,
             "label": FEATURE_LABELS.get(name, name),
-            "value": _display_value(name, raw_features, actual),
+            "value": _display_value(name, raw_features, float(values[idx])),
             "contribution": round(delta_points, 2),
             "direction": "positive" if delta_points >= 0 else "negative",
         })
@@ -96,20 +172,33 @@ def compute_psi(
 
     < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant drift.
     """
+    counts, _ = np.histogram(np.array(recent_values, dtype=float), bins=np.array(bin_edges))
+    return psi_from_counts(train_proportions, counts)
+
+
+def psi_from_counts(train_proportions: List[float], recent_counts: Sequence[int]) -> float:
+    """PSI from recent per-bin counts (bins of the training histogram)."""
+    return float(compute_psi_matrix(
+        np.asarray(train_proportions, dtype=float), np.asarray(recent_counts, dtype=float)
+    ))
+
+
+def compute_psi_matrix(train_proportions: np.ndarray, recent_counts: np.ndarray) -> np.ndarray:
+    """PSI for many distributions at once, bins along the last axis.
+
+    recent_counts has shape (..., n_bins), e.g. (merchants, features, bins);
+    train_proportions broadcasts against it. Zero-padded bins (features
+    with fewer bins) contribute nothing. Distributions with no recent
+    counts get PSI 0.
+    """
     eps = 1e-4
-    edges = np.array(bin_edges)
-    counts, _ = np.histogram(np.array(recent_values, dtype=float), bins=edges)
-    total = counts.sum()
-    if total == 0:
-        return 0.0
-    recent_props = counts / total
-
-    psi = 0.0
-    for p_train, p_recent in zip(train_proportions, recent_props):
-        p_t = max(float(p_train), eps)
-        p_r = max(float(p_recent), eps)
-        psi += (p_r - p_t) * np.log(p_r / p_t)
-    return float(psi)
+    counts = np.asarray(recent_counts, dtype=float)
+    totals = counts.sum(axis=-1, keepdims=True)
+    recent = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    p_t = np.maximum(np.asarray(train_proportions, dtype=float), eps)
+    p_r = np.maximum(recent, eps)
+    psi = ((p_r - p_t) * np.log(p_r / p_t)).sum(axis=-1)
+    return np.where(totals[..., 0] > 0, psi, 0.0)
 
 
 def build_histograms(X: np.ndarray, feature_names: List[str], n_bins: int = 10) -> Dict[str, Dict]:
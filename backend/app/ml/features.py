@@ -1,6 +1,8 @@
+from operator import itemgetter
+
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Sequence
 
 # Feature definitions for the ML model
 NUMERICAL_FEATURES = [
@@ -43,35 +45,94 @@ RETURN_REASON_MAP = {
 }
 
 
-class FeatureExtractor:
-    """Extract and transform features for ML model."""
+# Code used for unseen categorical values
+DEFAULT_PRICE_TIER = PRICE_TIER_MAP["medium"]
+DEFAULT_RETURN_REASON = RETURN_REASON_MAP["other"]
 
-    def __init__(self):
-        self.feature_names = NUMERICAL_FEATURES + ["price_tier_encoded", "return_reason_encoded"]
+# (input key, mapping, default value, code for unknown values), in column order
+_CATEGORICAL_PLAN = (
+    ("product_price_tier", PRICE_TIER_MAP, "medium", DEFAULT_PRICE_TIER),
+    ("return_reason", RETURN_REASON_MAP, "other", DEFAULT_RETURN_REASON),
+)
 
-    def extract(self, raw_features: Dict[str, Any]) -> np.ndarray:
-        """Extract features from raw input dictionary."""
-        features = []
 
-        # Numerical features
-        for feat in NUMERICAL_FEATURES:
-            value = raw_features.get(feat, 0)
-            if value is None:
-                value = 0
-            features.append(float(value))
+class _CategoryEncoder:
+    """Vectorized category lookup: one hash probe per value, unknown -> default."""
 
-        # Encode categorical features
-        price_tier = raw_features.get("product_price_tier", "medium")
-        features.append(float(PRICE_TIER_MAP.get(price_tier, 1)))
+    def __init__(self, mapping: Dict[str, int], unknown: int):
+        self.categories = pd.Index(list(mapping.keys()), dtype=object)
+        # get_indexer returns -1 for misses, which selects the appended default
+        self.codes = np.append(np.fromiter(mapping.values(), dtype=np.int64), unknown)
 
-        return_reason = raw_features.get("return_reason", "other")
-        features.append(float(RETURN_REASON_MAP.get(return_reason, 7)))
+    def __call__(self, values: Sequence[Any]) -> np.ndarray:
+        return self.codes[self.categories.get_indexer(pd.Index(values, dtype=object))]
 
-        return np.array(features).reshape(1, -1)
 
-    def extract_batch(self, raw_features_list: List[Dict[str, Any]]) -> np.ndarray:
-        """Extract features for multiple samples."""
-        return np.vstack([self.extract(f) for f in raw_features_list])
+class FeatureExtractor:
+    """Extract and transform features for ML model.
+
+    `extract_batch` (list of request dicts) and `extract_columns` (data that
+    is already columnar) fill one preallocated matrix column by column
+    instead of building and stacking a small array per row.
+    """
+
+    def __init__(self):
+        self.feature_names = NUMERICAL_FEATURES + ["price_tier_encoded", "return_reason_encoded"]
+        n_numerical = len(NUMERICAL_FEATURES)
+        # Column plans shared by every extraction path
+        self._numerical_plan = tuple(enumerate(NUMERICAL_FEATURES))
+        self._numerical_getter = itemgetter(*NUMERICAL_FEATURES)
+        self._categorical_plan = tuple(
+            (n_numerical + i, key, mapping, default, unknown, _CategoryEncoder(mapping, unknown))
+            for i, (key, mapping, default, unknown) in enumerate(_CATEGORICAL_PLAN)
+        )
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def extract(self, raw_features: Dict[str, Any], dtype=np.float64) -> np.ndarray:
+        """Extract features from raw input dictionary, shape (1, n_features)."""
+        get = raw_features.get
+        row = [0.0 if (v := get(feat, 0)) is None else v for feat in NUMERICAL_FEATURES]
+        for _, key, mapping, default, unknown, _ in self._categorical_plan:
+            row.append(mapping.get(get(key, default), unknown))
+        return np.array(row, dtype=dtype).reshape(1, -1)
+
+    def extract_batch(self, raw_features_list: List[Dict[str, Any]], dtype=np.float64) -> np.ndarray:
+        """Extract features for multiple samples, shape (n, n_features)."""
+        rows = raw_features_list
+        matrix = np.empty((len(rows), self.n_features), dtype=dtype)
+        numerical = matrix[:, :len(NUMERICAL_FEATURES)]
+        try:
+            # Fast path: every row has every numerical key and no None values
+            numerical[:] = [self._numerical_getter(r) for r in rows]
+        except (KeyError, TypeError):
+            for idx, feat in self._numerical_plan:
+                numerical[:, idx] = [0.0 if (v := r.get(feat, 0)) is None else v for r in rows]
+        for idx, key, _, default, _, encode in self._categorical_plan:
+            matrix[:, idx] = encode([r.get(key, default) for r in rows])
+        return matrix
+
+    def extract_columns(self, columns: Dict[str, Sequence[Any]], dtype=np.float64) -> np.ndarray:
+        """Extract features from column arrays keyed by raw feature name.
+
+        Missing columns take the same defaults as missing dict keys.
+        """
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        matrix = np.zeros((n_rows, self.n_features), dtype=dtype)
+        for idx, feat in self._numerical_plan:
+            column = columns.get(feat)
+            if column is None:
+                continue
+            column = np.asarray(column)
+            if column.dtype == object:
+                column = np.where(pd.isna(column), 0.0, column)
+            matrix[:, idx] = column
+        for idx, key, mapping, default, _, encode in self._categorical_plan:
+            column = columns.get(key)
+            matrix[:, idx] = mapping[default] if column is None else encode(column)
+        return matrix
 
     def to_dataframe(self, raw_features: Dict[str, Any]) -> pd.DataFrame:
         """Convert features to DataFrame for analysis."""
@@ -0,0 +1,146 @@
+"""Out-of-process inference workers.
+
+Prediction and explanation are CPU-bound and hold the GIL, so inside the
+API process they stall every other request handled by the same worker.
+InferencePool starts N spawned processes that each load the active model
+bundle once; MLPredictor then forwards predict / batch_predict /
+explain_batch calls to an idle worker over a pipe.
+
+Hot swap: every call carries the pool's generation number. reload() bumps
+it, and a worker that sees a newer generation re-reads the model artifact
+before answering, so no request is served by a stale model after reload()
+returns.
+
+The artifact may already hold yet another version by then (see
+app.services.model_sync), so each call also carries the model version the
+caller is scoring with: a worker serving a different version answers only
+with its own version, and the caller scores locally.
+"""
+import multiprocessing
+import queue
+import threading
+from typing import Any, Dict, Tuple
+
+
+def _serve(conn, generation: int):
+    """Worker process main loop:
+    (method, generation, args, version) -> (ok, own version, result)."""
+    from app.ml.predict import MLPredictor
+
+    predictor = MLPredictor()
+    # Single-threaded worker: nothing to coalesce, don't wait for a window
+    predictor.dispatcher = None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        method, wanted, args, version = message
+        try:
+            if wanted != generation:
+                predictor.reload()
+                generation = wanted
+            state = predictor.state
+            if state.version != version:
+                conn.send((True, state.version, None))
+                continue
+            conn.send((True, state.version, getattr(predictor, method)(*args)))
+        except Exception as e:
+            conn.send((False, None, f"{type(e).__name__}: {e}"))
+
+
+class InferencePool:
+    """Fixed-size pool of inference processes with per-call checkout."""
+
+    def __init__(self, n_workers: int, timeout: float = 10.0):
+        self.n_workers = n_workers
+        self.timeout = timeout
+        self.generation = 0
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue" = queue.Queue()
+        self._processes: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._failures = 0
+        self._restarts = 0
+        self._version_mismatches = 0
+        for _ in range(n_workers):
+            self._idle.put(self._spawn())
+
+    def call_versioned(self, version, method: str, *args) -> Tuple[Any, Any]:
+        """(worker's model version, result) of predictor.<method>(*args);
+        the result is None if the worker does not serve `version`."""
+        conn = self._idle.get(timeout=self.timeout)
+        try:
+            conn.send((method, self.generation, args, version))
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"inference worker did not answer {method} in {self.timeout}s")
+            ok, worker_version, result = conn.recv()
+        except BaseException:
+            # The pipe may hold a late reply: never hand this worker out again
+            with self._lock:
+                self._failures += 1
+            self._replace(conn)
+            raise
+        self._idle.put(conn)
+        with self._lock:
+            self._calls += 1
+        if not ok:
+            raise RuntimeError(result)
+        if worker_version != version:
+            with self._lock:
+                self._version_mismatches += 1
+        return worker_version, result
+
+    def bump_generation(self):
+        """Make every worker reload the model before its next call."""
+        with self._lock:
+            self.generation += 1
+
+    def stop(self):
+        for conn, process in list(self._processes.values()):
+            try:
+                conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        for conn, process in list(self._processes.values()):
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._processes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.n_workers,
+            "alive": sum(p.is_alive() for _, p in self._processes.values()),
+            "generation": self.generation,
+            "calls": self._calls,
+            "failures": self._failures,
+            "restarts": self._restarts,
+            "version_mismatches": self._version_mismatches,
+        }
+
+    def _spawn(self):
+        parent, child = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_serve, args=(child, self.generation), name="inference-worker", daemon=True
+        )
+        process.start()
+        child.close()
+        self._processes[id(parent)] = (parent, process)
+        return parent
+
+    def _replace(self, conn):
+        _, process = self._processes.pop(id(conn), (None, None))
+        if process is not None and process.is_alive():
+            process.terminate()
+        conn.close()
+        try:
+            self._idle.put(self._spawn())
+            with self._lock:
+                self._restarts += 1
+        except Exception as e:
+            print(f"Warning: Could not restart inference worker: {e}")
@@ -3,7 +3,7 @@ import io
 import joblib
 import numpy as np
 from datetime import datetime
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, Callable, List, Sequence, Tuple
 
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.model_selection import train_test_split, cross_val_score
@@ -17,7 +17,7 @@ from sklearn.metrics import (
 
 from app.ml.features import FeatureExtractor, generate_synthetic_features
 from app.ml.ecommerce_data import generate_flipkart_amazon_dataset, generate_test_scenarios
-from app.ml.explain import build_histograms
+from app.ml.explain import build_histograms, EXPLANATION_METHODS
 from app.config import get_settings
 
 settings = get_settings()
@@ -32,6 +32,21 @@ def default_model_path() -> str:
     return os.path.join(base_dir, settings.model_path)
 
 
+def dump_bundle(bundle: Dict[str, Any]) -> bytes:
+    """Serialize a bundle for the model registry, compressed per settings."""
+    compress = 0
+    if settings.registry_compression != "none":
+        compress = (settings.registry_compression, settings.registry_compression_level)
+    buffer = io.BytesIO()
+    joblib.dump(bundle, buffer, compress=compress)
+    return buffer.getvalue()
+
+
+def load_bundle(blob: bytes) -> Any:
+    """Inverse of dump_bundle (also reads uncompressed blobs)."""
+    return joblib.load(io.BytesIO(blob))
+
+
 class ModelTrainer:
     """Train and evaluate ML models for return eligibility scoring."""
 
@@ -48,17 +63,37 @@ class ModelTrainer:
         n_synthetic_samples: int = 5000,
         test_size: float = 0.2,
         feedback_data: Optional[List[dict]] = None,
-        feedback_labels: Optional[List[int]] = None,
+        feedback_labels: Optional[Sequence[int]] = None,
+        feedback_matrix: Optional[np.ndarray] = None,
         version: int = 1,
         run_cv: bool = True,
+        explanation_method: Optional[str] = None,
+        progress: Optional[Callable[[str, float], None]] = None,
     ) -> Dict[str, Any]:
         """
         Train the model on provided or synthetic data, optionally mixed with
         merchant-feedback ground truth (manual approve/deny overrides).
 
+        Feedback comes either as raw feature dicts (feedback_data) or as
+        already encoded rows (feedback_matrix, e.g. from return_features).
+
+        explanation_method ("ablation" or "treeshap") is recorded in the
+        bundle and decides how serving explains this model's decisions;
+        defaults to the EXPLANATION_METHOD setting.
+
+        progress, if given, is called with (stage, fraction done) as
+        training advances, including once per boosting stage.
+
         Returns a dictionary with training results and metrics.
         """
+        explanation_method = explanation_method or settings.explanation_method
+        if explanation_method not in EXPLANATION_METHODS:
+            raise ValueError(f"Unknown explanation method: {explanation_method}")
+
+        report = progress or (lambda stage, fraction: None)
+
         if data is None or labels is None:
+            report("generating_data", 0.0)
             print(f"Generating {n_synthetic_samples} Flipkart/Amazon samples...")
             data, labels = generate_flipkart_amazon_dataset(n_synthetic_samples)
 
@@ -69,14 +104,22 @@ class ModelTrainer:
             data = list(data) + list(feedback_data) * FEEDBACK_WEIGHT
             labels = list(labels) + list(feedback_labels) * FEEDBACK_WEIGHT
 
+        report("extracting_features", 0.1)
         print("Extracting features...")
         X = self.feature_extractor.extract_batch(data)
         y = np.array(labels)
 
+        if feedback_matrix is not None and len(feedback_matrix) and feedback_labels is not None:
+            n_feedback += len(feedback_matrix)
+            print(f"Mixing in {len(feedback_matrix)} encoded feedback samples (x{FEEDBACK_WEIGHT} weight)...")
+            X = np.vstack([X, np.tile(np.asarray(feedback_matrix, dtype=X.dtype), (FEEDBACK_WEIGHT, 1))])
+            y = np.concatenate([y, np.tile(np.asarray(feedback_labels, dtype=y.dtype), FEEDBACK_WEIGHT)])
+
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=test_size, random_state=42, stratify=y
         )
 
+        report("fitting", 0.15)
         print("Training Gradient Boosting model...")
         self.model = GradientBoostingClassifier(
             n_estimators=100,
@@ -86,7 +129,12 @@ class ModelTrainer:
             min_samples_leaf=5,
             random_state=42
         )
-        self.model.fit(X_train, y_train)
+        n_stages = self.model.n_estimators
+        self.model.fit(
+            X_train, y_train,
+            monitor=lambda i, model, _: report("fitting", 0.15 + 0.7 * (i + 1) / n_stages),
+        )
+        report("evaluating", 0.85)
 
         y_pred = self.model.predict(X_test)
         y_proba = self.model.predict_proba(X_test)[:, 1]
@@ -114,6 +162,7 @@ class ModelTrainer:
             "feature_names": self.feature_extractor.feature_names,
             "baselines": baselines.tolist(),
             "histograms": build_histograms(X, self.feature_extractor.feature_names),
+            "explanation_method": explanation_method,
             "metrics": self.metrics,
             "version": version,
             "trained_at": datetime.utcnow().isoformat(),
@@ -139,7 +188,11 @@ class ModelTrainer:
             path = default_model_path()
         os.makedirs(os.path.dirname(path), exist_ok=True)
 
-        joblib.dump(self.bundle, path)
+        # Write aside and rename, so workers reloading concurrently never
+        # read a partial file
+        staging = f"{path}.tmp-{os.getpid()}"
+        joblib.dump(self.bundle, staging)
+        os.replace(staging, path)
         print(f"Model bundle saved to {path}")
         return path
 
@@ -147,9 +200,7 @@ class ModelTrainer:
         """Serialize the bundle for database storage (model registry)."""
         if self.bundle is None:
             raise ValueError("No model to serialize. Train first.")
-        buffer = io.BytesIO()
-        joblib.dump(self.bundle, buffer)
-        return buffer.getvalue()
+        return dump_bundle(self.bundle)
 
     def get_feature_importance(self) -> Dict[str, float]:
         """Get feature importance from trained model."""
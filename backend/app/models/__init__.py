@@ -3,5 +3,14 @@ from app.models.buyer import Buyer
 from app.models.product import Product
 from app.models.return_request import ReturnRequest
 from app.models.scoring_model import ScoringModel
+from app.models.return_velocity import ReturnVelocityEvent
+from app.models.return_features import ReturnFeatures
+from app.models.drift import DriftBucket, DriftBinCount, DriftSnapshot, DriftSnapshotRun
+from app.models.merchant_daily_stats import MerchantDailyStats
+from app.models.retrain_job import RetrainJob
 
-__all__ = ["Merchant", "Buyer", "Product", "ReturnRequest", "ScoringModel"]
+__all__ = [
+    "Merchant", "Buyer", "Product", "ReturnRequest", "ScoringModel",
+    "ReturnVelocityEvent", "ReturnFeatures", "DriftBucket", "DriftBinCount", "DriftSnapshot",
+    "DriftSnapshotRun", "MerchantDailyStats", "RetrainJob",
+]
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Index, case, cast, literal
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -8,6 +9,12 @@ from app.database import Base
 
 class Buyer(Base):
     __tablename__ = "buyers"
+    __table_args__ = (
+        # One row per merchant-side ID; scoring's get-or-create relies on it
+        Index("uq_buyers_merchant_external", "merchant_id", "external_buyer_id", unique=True),
+        # Keyset pagination of the dashboard list (newest first)
+        Index("ix_buyers_merchant_created", "merchant_id", "created_at", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     merchant_id = Column(String(36), ForeignKey("merchants.id"), nullable=False, index=True)
@@ -30,13 +37,21 @@ class Buyer(Base):
     merchant = relationship("Merchant", back_populates="buyers")
     return_requests = relationship("ReturnRequest", back_populates="buyer", cascade="all, delete-orphan")
 
-    @property
+    @hybrid_property
     def return_rate(self) -> float:
         """Calculate the buyer's return rate."""
-        if self.total_orders == 0:
+        if not self.total_orders:
             return 0.0
         return self.total_returns / self.total_orders
 
+    @return_rate.expression
+    def return_rate(cls):
+        # Same ratio in SQL, so lists and stats can filter and sort on it
+        return case(
+            (cls.total_orders > 0, cast(cls.total_returns, Float) / cls.total_orders),
+            else_=literal(0.0),
+        )
+
     @property
     def account_age_days(self) -> int:
         """Calculate account age in days."""
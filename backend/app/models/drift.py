@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from sqlalchemy import Column, String, Integer, Float, DateTime, Index
+
+from app.database import Base
+
+
+class DriftBucket(Base):
+    """Number of requests one model version scored for a merchant in one hour."""
+    __tablename__ = "drift_buckets"
+
+    merchant_id = Column(String(36), primary_key=True)
+    model_version = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DriftBucket v{self.model_version} {self.bucket_start}: {self.samples}>"
+
+
+class DriftBinCount(Base):
+    """How many of those requests fell into one training-histogram bin of
+    one feature. Bins are those of the model version's bundle; only
+    non-empty bins are stored."""
+    __tablename__ = "drift_bin_counts"
+
+    merchant_id = Column(String(36), primary_key=True)
+    model_version = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    feature = Column(String(64), primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DriftBinCount v{self.model_version} {self.feature}[{self.bin}]: {self.count}>"
+
+
+class DriftSnapshot(Base):
+    """PSI of one feature for one merchant, as computed by the scheduled
+    drift job (see app.services.drift_history)."""
+    __tablename__ = "drift_snapshots"
+    __table_args__ = (
+        Index("ix_drift_snapshots_merchant_time", "merchant_id", "computed_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    merchant_id = Column(String(36), nullable=False)
+    model_version = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, nullable=False, index=True)
+    window_hours = Column(Integer, nullable=False)
+    samples = Column(Integer, nullable=False)
+    feature = Column(String(64), nullable=False)
+    psi = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<DriftSnapshot {self.feature} @ {self.computed_at}: {self.psi:.3f}>"
+
+
+class DriftSnapshotRun(Base):
+    """One scheduled drift snapshot, keyed by the start of its interval.
+    The worker whose insert claims the interval computes it; the primary
+    key turns the others away (see app.services.drift_history)."""
+    __tablename__ = "drift_snapshot_runs"
+
+    computed_at = Column(DateTime, primary_key=True)
+    model_version = Column(Integer, nullable=False)
+    claimed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DriftSnapshotRun v{self.model_version} @ {self.computed_at}>"
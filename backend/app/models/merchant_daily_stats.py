@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Integer, Float, Date
+
+from app.database import Base
+
+
+class MerchantDailyStats(Base):
+    """Per-merchant, per-day counts of return requests by current decision.
+
+    Maintained incrementally when returns are scored and when a decision
+    changes, so long-range dashboard stats never scan return_requests
+    (see app.services.daily_stats). Days are the requests' created_at date.
+    """
+    __tablename__ = "merchant_daily_stats"
+
+    merchant_id = Column(String(36), primary_key=True)
+    day = Column(Date, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    approved = Column(Integer, nullable=False, default=0)
+    denied = Column(Integer, nullable=False, default=0)
+    pending = Column(Integer, nullable=False, default=0)  # pending or in manual review
+    score_sum = Column(Float, nullable=False, default=0.0)
+    score_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<MerchantDailyStats {self.merchant_id[:8]} {self.day}: {self.total}>"
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Index, Enum, case, cast, literal
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -40,6 +41,12 @@ CATEGORY_RISK_SCORES = {
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # One row per merchant-side ID; scoring's get-or-create relies on it
+        Index("uq_products_merchant_external", "merchant_id", "external_product_id", unique=True),
+        # Keyset pagination of the dashboard list (newest first)
+        Index("ix_products_merchant_created", "merchant_id", "created_at", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     merchant_id = Column(String(36), ForeignKey("merchants.id"), nullable=False, index=True)
@@ -64,13 +71,21 @@ class Product(Base):
     merchant = relationship("Merchant", back_populates="products")
     return_requests = relationship("ReturnRequest", back_populates="product", cascade="all, delete-orphan")
 
-    @property
+    @hybrid_property
     def return_rate(self) -> float:
         """Calculate the product's return rate."""
-        if self.total_sold == 0:
+        if not self.total_sold:
             return 0.0
         return self.total_returned / self.total_sold
 
+    @return_rate.expression
+    def return_rate(cls):
+        # Same ratio in SQL, so lists and stats can filter and sort on it
+        return case(
+            (cls.total_sold > 0, cast(cls.total_returned, Float) / cls.total_sold),
+            else_=literal(0.0),
+        )
+
     @property
     def category_risk_score(self) -> float:
         """Get the risk score for this product's category."""
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, JSON, Text
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class RetrainJob(Base):
+    """One asynchronous retraining run (see app.services.retrain_jobs)."""
+    __tablename__ = "retrain_jobs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    merchant_id = Column(String(36), ForeignKey("merchants.id"), nullable=True)  # who requested it
+
+    status = Column(String(20), nullable=False, default="queued")  # queued | running | succeeded | failed
+    stage = Column(String(50), nullable=True)  # current step while running
+    progress = Column(Float, nullable=False, default=0.0)  # 0-1
+
+    # 1 while queued or running, NULL once finished: the unique constraint
+    # admits a single unfinished job across all workers
+    active = Column(Integer, nullable=True, unique=True)
+
+    # Outcome
+    version = Column(Integer, nullable=True)
+    feedback_samples = Column(Integer, nullable=True)
+    metrics = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # heartbeat while running
+
+    def __repr__(self):
+        return f"<RetrainJob {self.id} {self.status} {self.progress:.0%}>"
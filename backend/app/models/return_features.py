@@ -0,0 +1,74 @@
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Index
+
+from app.database import Base
+
+# One column per model input, in FeatureExtractor.feature_names order
+FEATURE_COLUMNS = (
+    "buyer_return_rate",
+    "buyer_total_orders",
+    "buyer_total_returns",
+    "buyer_avg_review_score",
+    "buyer_account_age_days",
+    "buyer_total_spend",
+    "product_return_rate",
+    "product_category_risk",
+    "product_price",
+    "days_since_order",
+    "order_amount",
+    "request_hour",
+    "request_day_of_week",
+    "price_tier_encoded",
+    "return_reason_encoded",
+)
+
+# The buyer's recent returns when the request was scored (app.services.velocity).
+# Not model inputs, but recorded with the vector; NULL for rows backfilled
+# from snapshots that predate them.
+VELOCITY_COLUMNS = (
+    "buyer_returns_1h",
+    "buyer_returns_24h",
+    "buyer_returns_7d",
+    "buyer_returns_30d",
+)
+
+
+class ReturnFeatures(Base):
+    """The encoded model inputs a return request was scored with.
+
+    Typed copy of the feature vector (one float column per feature) so
+    drift monitoring and retraining can select it straight into a matrix
+    (see app.services.feature_store).
+    """
+    __tablename__ = "return_features"
+    __table_args__ = (
+        Index("ix_return_features_merchant_time", "merchant_id", "scored_at"),
+    )
+
+    return_request_id = Column(String(36), ForeignKey("return_requests.id"), primary_key=True)
+    merchant_id = Column(String(36), nullable=False)
+    model_version = Column(Integer, nullable=True, index=True)
+    scored_at = Column(DateTime, nullable=False)
+
+    buyer_return_rate = Column(Float)
+    buyer_total_orders = Column(Float)
+    buyer_total_returns = Column(Float)
+    buyer_avg_review_score = Column(Float)
+    buyer_account_age_days = Column(Float)
+    buyer_total_spend = Column(Float)
+    product_return_rate = Column(Float)
+    product_category_risk = Column(Float)
+    product_price = Column(Float)
+    days_since_order = Column(Float)
+    order_amount = Column(Float)
+    request_hour = Column(Float)
+    request_day_of_week = Column(Float)
+    price_tier_encoded = Column(Float)
+    return_reason_encoded = Column(Float)
+
+    buyer_returns_1h = Column(Integer)
+    buyer_returns_24h = Column(Integer)
+    buyer_returns_7d = Column(Integer)
+    buyer_returns_30d = Column(Integer)
+
+    def __repr__(self):
+        return f"<ReturnFeatures {self.return_request_id[:8]} v{self.model_version}>"
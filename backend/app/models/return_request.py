@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Enum, Text, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -7,6 +8,10 @@ import enum
 from app.database import Base
 
 
+# JSONB on PostgreSQL, JSON (text) elsewhere; Python None is stored as SQL NULL
+JSONDocument = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
+
+
 class ReturnReason(str, enum.Enum):
     SIZE_ISSUE = "size_issue"
     DEFECTIVE = "defective"
@@ -27,6 +32,10 @@ class ReturnDecision(str, enum.Enum):
 
 class ReturnRequest(Base):
     __tablename__ = "return_requests"
+    __table_args__ = (
+        # Keyset pagination of the dashboard list (newest first)
+        Index("ix_return_requests_merchant_created", "merchant_id", "created_at", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     merchant_id = Column(String(36), ForeignKey("merchants.id"), nullable=False, index=True)
@@ -46,10 +55,10 @@ class ReturnRequest(Base):
     # Scoring results
     eligibility_score = Column(Float, nullable=True)
     risk_level = Column(String(20), nullable=True)  # low, medium, high
-    risk_flags = Column(Text, nullable=True)  # JSON array of flags
+    risk_flags = Column(JSONDocument, nullable=True)  # Array of flags
     confidence = Column(Float, nullable=True)
-    explanation = Column(Text, nullable=True)  # JSON array of feature contributions
-    features_snapshot = Column(Text, nullable=True)  # JSON of features at scoring time (drift + retraining)
+    explanation = Column(JSONDocument, nullable=True)  # Array of feature contributions
+    features_snapshot = Column(JSONDocument, nullable=True)  # Legacy raw features; superseded by return_features
     model_version = Column(Integer, nullable=True)
 
     # Decision
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, String, DateTime, Index
+
+from app.database import Base
+
+
+class ReturnVelocityEvent(Base):
+    """One scored return, kept only as long as a velocity window can see it.
+
+    Narrow, derived copy of (buyer_id, request_date) from return_requests
+    that backs the in-memory velocity counters; rebuildable from history
+    (see app.services.velocity).
+    """
+    __tablename__ = "return_velocity_events"
+    __table_args__ = (
+        Index("ix_return_velocity_buyer_time", "buyer_id", "occurred_at"),
+    )
+
+    return_request_id = Column(String(36), primary_key=True)
+    merchant_id = Column(String(36), nullable=False)
+    buyer_id = Column(String(36), nullable=False)
+    occurred_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ReturnVelocityEvent {self.buyer_id} @ {self.occurred_at}>"
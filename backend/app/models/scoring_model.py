@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, LargeBinary, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, LargeBinary, Float, Index
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 import uuid
 
@@ -8,6 +8,11 @@ from app.database import Base
 
 class ScoringModel(Base):
     __tablename__ = "scoring_models"
+    __table_args__ = (
+        # Versions are allocated as max + 1; a second registration of the
+        # same number (e.g. by an expired retrain job) fails instead
+        Index("uq_scoring_models_version", "version", unique=True),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     merchant_id = Column(String(36), ForeignKey("merchants.id"), nullable=True, index=True)  # NULL = global model
@@ -15,8 +20,11 @@ class ScoringModel(Base):
     version = Column(Integer, nullable=False, default=1)
     model_type = Column(String(50), default="gradient_boosting")  # Type of ML model
 
-    # Model binary (serialized with joblib)
-    model_blob = Column(LargeBinary, nullable=True)
+    # Model binary (compressed joblib bundle). Deferred: loaded only when
+    # accessed, so listing the registry never pulls the blobs. NULL once
+    # garbage-collected (see app.services.model_registry).
+    model_blob = deferred(Column(LargeBinary, nullable=True))
+    blob_size = Column(Integer, nullable=True)  # bytes; NULL when there is no blob
 
     # Model metadata
     features_used = Column(String(1000), nullable=True)  # JSON array of feature names
@@ -30,6 +38,7 @@ class ScoringModel(Base):
 
     # Status
     is_active = Column(Boolean, default=False)
+    is_pinned = Column(Boolean, default=False)  # keep the blob regardless of retention
     created_at = Column(DateTime, default=datetime.utcnow)
     trained_at = Column(DateTime, nullable=True)
 
@@ -11,7 +11,7 @@ from app.schemas.merchant import (
     Token,
     APIKeyResponse,
 )
-from app.services.auth import AuthService, get_current_merchant
+from app.services.auth import AuthService, api_key_cache, get_current_merchant
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -82,6 +82,7 @@ def update_merchant(
 
     db.commit()
     db.refresh(merchant)
+    api_key_cache.discard(merchant.api_key_hash)
     return merchant
 
 
@@ -94,9 +95,11 @@ def generate_api_key(
     # Generate new API key
     api_key = AuthService.generate_api_key()
 
-    # Hash and store
+    # Hash and store; the old key stops authenticating immediately
+    old_hash = merchant.api_key_hash
     merchant.api_key_hash = AuthService.hash_api_key(api_key)
     db.commit()
+    api_key_cache.discard(old_hash)
 
     return APIKeyResponse(api_key=api_key)
 
@@ -107,5 +110,7 @@ def revoke_api_key(
     db: Session = Depends(get_db)
 ):
     """Revoke the current API key."""
+    old_hash = merchant.api_key_hash
     merchant.api_key_hash = None
     db.commit()
+    api_key_cache.discard(old_hash)
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 from app.database import get_db
 from app.models.merchant import Merchant
@@ -13,87 +17,90 @@ from app.schemas.buyer import (
     BuyerSync,
     BuyerSyncResponse,
 )
-from app.services.auth import get_merchant_from_api_key, get_current_merchant
+from app.services.auth import MerchantSnapshot, get_merchant_from_api_key, get_current_merchant
+from app.services.catalog_sync import SyncItem, SyncResult, read_ndjson_chunks, sync_catalog
+from app.services.pagination import keyset_page
+from app.services.profile_cache import buyer_profiles
 
 router = APIRouter(prefix="/buyers", tags=["Buyers"])
 
 
+def _sync_items(buyers: List[BuyerCreate]) -> List[SyncItem]:
+    return [(buyer_data.model_dump(), frozenset(buyer_data.model_fields_set)) for buyer_data in buyers]
+
+
+def _sync_and_commit(db: Session, merchant_id: str, buyers: List[BuyerCreate], result: SyncResult):
+    external_ids = sync_catalog(db, Buyer, "external_buyer_id", merchant_id, _sync_items(buyers), result)
+    db.commit()
+    buyer_profiles.invalidate(merchant_id, external_ids)
+
+
 @router.post("/sync", response_model=BuyerSyncResponse)
 def sync_buyers(
     sync_data: BuyerSync,
-    merchant: Merchant = Depends(get_merchant_from_api_key),
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
     db: Session = Depends(get_db)
 ):
     """
     Bulk sync buyer data from merchant's platform.
 
-    Creates new buyers or updates existing ones based on external_buyer_id.
+    Creates new buyers or updates existing ones based on external_buyer_id
+    (only the fields sent are updated). For very large catalogs use
+    /buyers/sync/ndjson.
     """
-    created = 0
-    updated = 0
-    failed = 0
-    errors = []
-
-    for buyer_data in sync_data.buyers:
-        try:
-            # Check if buyer exists
-            existing = db.query(Buyer).filter(
-                Buyer.merchant_id == merchant.id,
-                Buyer.external_buyer_id == buyer_data.external_buyer_id
-            ).first()
-
-            if existing:
-                # Update existing
-                for key, value in buyer_data.model_dump(exclude_unset=True).items():
-                    if key != "external_buyer_id":
-                        setattr(existing, key, value)
-                updated += 1
-            else:
-                # Create new
-                buyer = Buyer(
-                    merchant_id=merchant.id,
-                    **buyer_data.model_dump()
-                )
-                db.add(buyer)
-                created += 1
-
-        except Exception as e:
-            failed += 1
-            errors.append(f"{buyer_data.external_buyer_id}: {str(e)}")
+    result = SyncResult()
+    _sync_and_commit(db, merchant.id, sync_data.buyers, result)
+    return BuyerSyncResponse(**asdict(result))
 
-    db.commit()
 
-    return BuyerSyncResponse(
-        created=created,
-        updated=updated,
-        failed=failed,
-        errors=errors
-    )
+@router.post("/sync/ndjson", response_model=BuyerSyncResponse)
+async def sync_buyers_ndjson(
+    request: Request,
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk sync buyers streamed as NDJSON, one BuyerCreate object per line.
+
+    The body is read and committed SYNC_CHUNK_SIZE buyers at a time;
+    invalid lines are reported as failed, the rest are still synced.
+    """
+    result = SyncResult()
+    async for chunk in read_ndjson_chunks(request, BuyerCreate, result):
+        await run_in_threadpool(_sync_and_commit, db, merchant.id, chunk, result)
+    return BuyerSyncResponse(**asdict(result))
 
 
 @router.get("", response_model=List[BuyerResponse])
 def list_buyers(
+    response: Response,
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     min_return_rate: float = Query(None, ge=0, le=1),
+    sort: str = Query("recent", pattern="^(recent|return_rate)$"),
+    cursor: Optional[str] = None,
     merchant: Merchant = Depends(get_current_merchant),
     db: Session = Depends(get_db)
 ):
-    """List buyers for the merchant (dashboard)."""
-    query = db.query(Buyer).filter(Buyer.merchant_id == merchant.id)
+    """List buyers for the merchant (dashboard).
 
-    # Can't filter by computed property directly, so we fetch and filter
-    buyers = query.order_by(Buyer.created_at.desc())\
-        .offset((page - 1) * per_page)\
-        .limit(per_page * 2)\
-        .all()
+    sort=return_rate lists the riskiest buyers first. When there are
+    more buyers, the X-Next-Cursor header holds the next page's `cursor`.
+    """
+    query = db.query(Buyer).filter(Buyer.merchant_id == merchant.id)
 
-    # Filter by return rate if specified
     if min_return_rate is not None:
-        buyers = [b for b in buyers if b.return_rate >= min_return_rate]
-        buyers = buyers[:per_page]
+        query = query.filter(Buyer.return_rate >= min_return_rate)
+
+    if sort == "return_rate":
+        columns, key_types = (Buyer.return_rate, Buyer.id), (float, str)
+        key = lambda row: (row.return_rate, row.id)
     else:
-        buyers = buyers[:per_page]
+        columns, key_types = (Buyer.created_at, Buyer.id), (datetime, str)
+        key = lambda row: (row.created_at, row.id)
+    buyers, next_cursor = keyset_page(query, columns, key_types, key, sort, cursor, per_page, page)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     return [BuyerResponse(
         id=b.id,
@@ -156,7 +163,7 @@ def get_buyer(
 def update_buyer(
     buyer_id: str,
     update_data: BuyerUpdate,
-    merchant: Merchant = Depends(get_merchant_from_api_key),
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
     db: Session = Depends(get_db)
 ):
     """Update buyer information."""
@@ -176,6 +183,7 @@ def update_buyer(
 
     db.commit()
     db.refresh(buyer)
+    buyer_profiles.invalidate(merchant.id, [buyer_id])
 
     return BuyerResponse(
         id=buyer.id,
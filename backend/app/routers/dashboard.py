@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, select
 from datetime import datetime, timedelta
 
 from app.database import get_db
@@ -10,75 +12,95 @@ from app.models.product import Product
 from app.models.return_request import ReturnRequest, ReturnDecision
 from app.schemas.scoring import DashboardStats
 from app.services.auth import get_current_merchant
+from app.services.daily_stats import rollup_totals
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
+# Ranges longer than this (and all-time stats) are summed from the daily
+# rollups instead of aggregating return_requests
+ROLLUP_MIN_DAYS = 31
+
+HIGH_RISK_BUYER_RETURN_RATE = 0.3
+HIGH_RETURN_PRODUCT_RATE = 0.2
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
 
 @router.get("/stats", response_model=DashboardStats)
 def get_dashboard_stats(
+    days: Optional[int] = Query(None, ge=1, le=3650),
     merchant: Merchant = Depends(get_current_merchant),
     db: Session = Depends(get_db)
 ):
-    """Get dashboard statistics for the merchant."""
-    # Return request stats
-    total_returns = db.query(ReturnRequest).filter(
-        ReturnRequest.merchant_id == merchant.id
-    ).count()
-
-    approved_returns = db.query(ReturnRequest).filter(
-        ReturnRequest.merchant_id == merchant.id,
-        ReturnRequest.decision == ReturnDecision.APPROVED
-    ).count()
-
-    denied_returns = db.query(ReturnRequest).filter(
-        ReturnRequest.merchant_id == merchant.id,
-        ReturnRequest.decision == ReturnDecision.DENIED
-    ).count()
-
-    pending_returns = db.query(ReturnRequest).filter(
-        ReturnRequest.merchant_id == merchant.id,
-        ReturnRequest.decision.in_([ReturnDecision.PENDING, ReturnDecision.REVIEW])
-    ).count()
+    """Get dashboard statistics for the merchant.
 
-    # Approval rate
-    decided_returns = approved_returns + denied_returns
-    approval_rate = (approved_returns / decided_returns * 100) if decided_returns > 0 else 0
-
-    # Average score
-    avg_score_result = db.query(func.avg(ReturnRequest.eligibility_score)).filter(
-        ReturnRequest.merchant_id == merchant.id,
-        ReturnRequest.eligibility_score.isnot(None)
-    ).scalar()
-    avg_score = float(avg_score_result) if avg_score_result else 0
-
-    # Buyer stats
-    total_buyers = db.query(Buyer).filter(Buyer.merchant_id == merchant.id).count()
-
-    # High risk buyers (return rate > 30%)
-    all_buyers = db.query(Buyer).filter(Buyer.merchant_id == merchant.id).all()
-    high_risk_buyers = len([b for b in all_buyers if b.return_rate > 0.3])
-
-    # Product stats
-    total_products = db.query(Product).filter(Product.merchant_id == merchant.id).count()
-
-    all_products = db.query(Product).filter(Product.merchant_id == merchant.id).all()
-    high_return_products = len([p for p in all_products if p.return_rate > 0.2])
-
-    # Weekly returns comparison
+    Return counts, approval rate and average score cover the last `days`
+    days (all time if omitted). Short ranges are one conditional-aggregation
+    query over return_requests; longer ones read the daily rollups (whole
+    days). Buyer and product counts are always current.
+    """
     now = datetime.utcnow()
     week_ago = now - timedelta(days=7)
     two_weeks_ago = now - timedelta(days=14)
+    since = now - timedelta(days=days) if days else None
+    use_rollups = since is None or days > ROLLUP_MIN_DAYS
+
+    # Return request stats (plus the weekly comparison) in one pass
+    created = ReturnRequest.created_at
+    columns = [
+        _count_if(created >= week_ago),
+        _count_if(and_(created >= two_weeks_ago, created < week_ago)),
+    ]
+    if not use_rollups:
+        in_range = created >= since
+        decision = ReturnRequest.decision
+        score = case((in_range, ReturnRequest.eligibility_score))
+        columns += [
+            _count_if(in_range),
+            _count_if(and_(in_range, decision == ReturnDecision.APPROVED)),
+            _count_if(and_(in_range, decision == ReturnDecision.DENIED)),
+            _count_if(and_(in_range, decision.in_([ReturnDecision.PENDING, ReturnDecision.REVIEW]))),
+            func.coalesce(func.sum(score), 0.0),
+            func.count(score),
+        ]
+    # The weekly comparison needs the last two weeks even for shorter ranges
+    lower = two_weeks_ago if use_rollups else min(since, two_weeks_ago)
+    returns_row = db.execute(
+        select(*columns).where(ReturnRequest.merchant_id == merchant.id, created >= lower)
+    ).one()
+    returns_this_week, returns_last_week = returns_row[0], returns_row[1]
+
+    if use_rollups:
+        totals = rollup_totals(db, merchant.id, since.date() if since else None)
+        total_returns = totals["total"]
+        approved_returns = totals["approved"]
+        denied_returns = totals["denied"]
+        pending_returns = totals["pending"]
+        score_sum, score_count = totals["score_sum"], totals["score_count"]
+    else:
+        (total_returns, approved_returns, denied_returns, pending_returns,
+         score_sum, score_count) = returns_row[2:]
 
-    returns_this_week = db.query(ReturnRequest).filter(
-        ReturnRequest.merchant_id == merchant.id,
-        ReturnRequest.created_at >= week_ago
-    ).count()
+    # Approval rate
+    decided_returns = approved_returns + denied_returns
+    approval_rate = (approved_returns / decided_returns * 100) if decided_returns > 0 else 0
 
-    returns_last_week = db.query(ReturnRequest).filter(
-        ReturnRequest.merchant_id == merchant.id,
-        ReturnRequest.created_at >= two_weeks_ago,
-        ReturnRequest.created_at < week_ago
-    ).count()
+    # Average score
+    avg_score = float(score_sum) / score_count if score_count else 0
+
+    # Buyer and product stats: counted in the database, one round trip
+    high_risk_buyer = Buyer.return_rate > HIGH_RISK_BUYER_RETURN_RATE
+    high_return_product = Product.return_rate > HIGH_RETURN_PRODUCT_RATE
+    total_buyers, high_risk_buyers, total_products, high_return_products = db.execute(select(
+        select(func.count(Buyer.id)).where(Buyer.merchant_id == merchant.id).scalar_subquery(),
+        select(func.count(Buyer.id)).where(Buyer.merchant_id == merchant.id, high_risk_buyer).scalar_subquery(),
+        select(func.count(Product.id)).where(Product.merchant_id == merchant.id).scalar_subquery(),
+        select(func.count(Product.id)).where(
+            Product.merchant_id == merchant.id, high_return_product
+        ).scalar_subquery(),
+    )).one()
 
     return DashboardStats(
         total_returns=total_returns,
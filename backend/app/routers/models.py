@@ -5,56 +5,42 @@ decision (approve/deny), that return request becomes a labeled ground-truth
 sample. Retraining mixes those samples into the training set at elevated
 weight, registers a new model version, and hot-swaps the serving model.
 """
-import json
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models.merchant import Merchant
-from app.models.return_request import ReturnRequest, ReturnDecision
+from app.models.drift import DriftSnapshot
+from app.models.retrain_job import RetrainJob
 from app.models.scoring_model import ScoringModel
 from app.schemas.scoring import (
     ModelVersionInfo,
-    RetrainResponse,
+    RetrainJobInfo,
     DriftReport,
+    DriftHistoryPoint,
     FeatureDrift,
 )
 from app.services.auth import get_current_merchant
-from app.ml.train import ModelTrainer
+from app.services.drift import (
+    DRIFT_STATUS_RANK,
+    MIN_DRIFT_SAMPLES,
+    drift_accumulator,
+    drift_status,
+    drift_window_start,
+    window_counts,
+)
+from app.services.model_registry import gc_model_blobs
+from app.services.retrain_jobs import SUCCEEDED, retrain_jobs
 from app.ml.predict import get_predictor
-from app.ml.explain import compute_psi, FEATURE_LABELS
+from app.ml.explain import psi_from_counts, FEATURE_LABELS
 
 router = APIRouter(prefix="/models", tags=["Model Registry"])
 
-MIN_DRIFT_SAMPLES = 30
-DRIFT_WINDOW = 500
-
-
-def _collect_feedback_samples(db: Session):
-    """Return requests where a human overrode (or confirmed) the decision.
-
-    decided_by == "system" means the model decided; anything else is a
-    merchant action and counts as ground truth. approved -> 1, denied -> 0.
-    """
-    rows = db.query(ReturnRequest).filter(
-        ReturnRequest.features_snapshot.isnot(None),
-        ReturnRequest.decided_by.isnot(None),
-        ReturnRequest.decided_by != "system",
-        ReturnRequest.decision.in_([ReturnDecision.APPROVED, ReturnDecision.DENIED]),
-    ).all()
-
-    data, labels = [], []
-    for row in rows:
-        try:
-            features = json.loads(row.features_snapshot)
-        except (json.JSONDecodeError, TypeError):
-            continue
-        data.append(features)
-        labels.append(1 if row.decision == ReturnDecision.APPROVED else 0)
-    return data, labels
+MAX_DRIFT_HOURS = 24 * 90
 
 
 def _to_version_info(record: ScoringModel) -> ModelVersionInfo:
@@ -63,6 +49,8 @@ def _to_version_info(record: ScoringModel) -> ModelVersionInfo:
         version=record.version,
         model_type=record.model_type,
         is_active=record.is_active,
+        is_pinned=bool(record.is_pinned),
+        blob_size=record.blob_size,
         training_samples=record.training_samples or 0,
         feedback_samples=record.feedback_samples or 0,
         accuracy=record.accuracy,
@@ -80,139 +68,203 @@ def list_models(
     merchant: Merchant = Depends(get_current_merchant),
     db: Session = Depends(get_db),
 ):
-    """List all registered model versions, newest first."""
+    """List all registered model versions, newest first (blobs are deferred
+    and never loaded here)."""
     records = db.query(ScoringModel).order_by(ScoringModel.version.desc()).all()
     return [_to_version_info(r) for r in records]
 
 
-@router.post("/retrain", response_model=RetrainResponse)
+def _to_job_info(job: RetrainJob, coalesced: bool = False) -> RetrainJobInfo:
+    message = None
+    if job.status == SUCCEEDED:
+        message = (
+            f"Model v{job.version} trained on {job.metrics['training_samples']} samples "
+            f"({job.feedback_samples} merchant-feedback) and activated."
+        )
+    return RetrainJobInfo(
+        id=job.id,
+        status=job.status,
+        stage=job.stage,
+        progress=job.progress or 0.0,
+        coalesced=coalesced,
+        version=job.version,
+        metrics=job.metrics,
+        feedback_samples=job.feedback_samples,
+        error=job.error,
+        message=message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.post("/retrain", response_model=RetrainJobInfo, status_code=status.HTTP_202_ACCEPTED)
 def retrain_model(
     merchant: Merchant = Depends(get_current_merchant),
     db: Session = Depends(get_db),
 ):
     """Retrain the scoring model using accumulated merchant feedback.
 
-    Registers the new version and immediately activates it for serving.
+    Returns a job right away; poll GET /models/jobs/{id} for its progress.
+    The new version is registered and activated for serving when the job
+    succeeds. Only one training runs at a time: while one is queued or
+    running, this returns that job (coalesced=true).
     """
-    feedback_data, feedback_labels = _collect_feedback_samples(db)
-
-    max_version = db.query(ScoringModel).order_by(ScoringModel.version.desc()).first()
-    new_version = (max_version.version + 1) if max_version else 1
-
-    trainer = ModelTrainer()
-    metrics = trainer.train(
-        n_synthetic_samples=5000,
-        feedback_data=feedback_data,
-        feedback_labels=feedback_labels,
-        version=new_version,
-        run_cv=False,
-    )
+    job, coalesced = retrain_jobs.submit(db, merchant.id)
+    return _to_job_info(job, coalesced)
 
-    # Register in DB (durable) and write the serving artifact (fast path)
-    db.query(ScoringModel).filter(ScoringModel.is_active == True).update(
-        {"is_active": False}
-    )
-    record = ScoringModel(
-        version=new_version,
-        model_type="gradient_boosting",
-        model_blob=trainer.serialize_bundle(),
-        features_used=json.dumps(trainer.feature_extractor.feature_names),
-        training_samples=metrics["training_samples"],
-        feedback_samples=metrics["feedback_samples"],
-        accuracy=metrics["accuracy"],
-        precision_score=metrics["precision"],
-        recall_score=metrics["recall"],
-        f1_score=metrics["f1"],
-        roc_auc=metrics["roc_auc"],
-        is_active=True,
-        trained_at=datetime.utcnow(),
-    )
-    db.add(record)
+
+@router.get("/jobs/{job_id}", response_model=RetrainJobInfo)
+def get_retrain_job(
+    job_id: str,
+    merchant: Merchant = Depends(get_current_merchant),
+    db: Session = Depends(get_db),
+):
+    """Status, progress and (once finished) metrics of a retraining job."""
+    job = db.get(RetrainJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Retrain job not found")
+    return _to_job_info(job)
+
+
+def _set_pinned(db: Session, version: int, pinned: bool) -> ModelVersionInfo:
+    record = db.query(ScoringModel).filter(ScoringModel.version == version).order_by(
+        ScoringModel.created_at.desc()
+    ).first()
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model version not found")
+    if pinned and record.blob_size is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Model blob was already garbage-collected",
+        )
+    record.is_pinned = pinned
     db.commit()
+    if not pinned:
+        gc_model_blobs(db)
+    db.refresh(record)
+    return _to_version_info(record)
 
-    trainer.save_model()
-    get_predictor().reload()
 
-    return RetrainResponse(
-        version=new_version,
-        metrics=metrics,
-        feedback_samples=len(feedback_data),
-        activated=True,
-        message=f"Model v{new_version} trained on {metrics['training_samples']} samples "
-                f"({len(feedback_data)} merchant-feedback) and activated.",
-    )
+@router.post("/{version}/pin", response_model=ModelVersionInfo)
+def pin_model(
+    version: int,
+    merchant: Merchant = Depends(get_current_merchant),
+    db: Session = Depends(get_db),
+):
+    """Keep this version's blob regardless of the retention policy."""
+    return _set_pinned(db, version, True)
+
+
+@router.post("/{version}/unpin", response_model=ModelVersionInfo)
+def unpin_model(
+    version: int,
+    merchant: Merchant = Depends(get_current_merchant),
+    db: Session = Depends(get_db),
+):
+    """Return this version to the retention policy (its blob may be
+    collected right away)."""
+    return _set_pinned(db, version, False)
 
 
 @router.get("/drift", response_model=DriftReport)
 def get_drift_report(
+    window: str = Query("week", pattern="^(hour|day|week)$"),
+    hours: Optional[int] = Query(None, ge=1, le=MAX_DRIFT_HOURS),
     merchant: Merchant = Depends(get_current_merchant),
     db: Session = Depends(get_db),
 ):
     """Compare recent scored traffic against the training distribution (PSI).
 
+    Covers the last hour, day or week (`window`), or the last `hours`
+    hours, of requests scored by the serving model version. Built from
+    the streaming drift counters (app.services.drift), so the cost does
+    not grow with traffic.
+
     PSI < 0.1 = stable, 0.1-0.25 = moderate shift, > 0.25 = drifted.
     """
-    predictor = get_predictor()
-    histograms = predictor.histograms
+    state = get_predictor().state  # one model for the whole report
+    histograms = state.histograms
     if not histograms:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="No trained model bundle available for drift comparison",
         )
 
-    rows = (
-        db.query(ReturnRequest.features_snapshot)
-        .filter(
-            ReturnRequest.merchant_id == merchant.id,
-            ReturnRequest.features_snapshot.isnot(None),
-        )
-        .order_by(ReturnRequest.created_at.desc())
-        .limit(DRIFT_WINDOW)
-        .all()
-    )
-
-    snapshots = []
-    for (snap,) in rows:
-        try:
-            snapshots.append(json.loads(snap))
-        except (json.JSONDecodeError, TypeError):
-            continue
+    # Include this worker's not-yet-flushed counters without writing them
+    since = drift_window_start(window, hours)
+    samples, counts = window_counts(db, merchant.id, state.version, since, drift_accumulator)
 
-    if len(snapshots) < MIN_DRIFT_SAMPLES:
+    if samples < MIN_DRIFT_SAMPLES:
         return DriftReport(
-            model_version=predictor.version,
-            samples_analyzed=len(snapshots),
+            model_version=state.version,
+            samples_analyzed=samples,
+            window_start=since,
             features=[],
             overall_status="insufficient_data",
         )
 
-    features = []
-    worst = "stable"
-    rank = {"stable": 0, "moderate": 1, "drifted": 2}
+    psi_by_feature = {}
     for name, hist in histograms.items():
-        values = [float(s[name]) for s in snapshots if s.get(name) is not None]
-        if not values:
-            continue
-        psi = compute_psi(hist["proportions"], hist["bin_edges"], values)
-        if psi > 0.25:
-            feature_status = "drifted"
-        elif psi > 0.1:
-            feature_status = "moderate"
-        else:
-            feature_status = "stable"
-        if rank[feature_status] > rank[worst]:
-            worst = feature_status
-        features.append(FeatureDrift(
-            feature=name,
-            label=FEATURE_LABELS.get(name, name),
-            psi=round(psi, 4),
-            status=feature_status,
-        ))
+        bins = counts.get(name)
+        if bins:
+            recent = [bins.get(i, 0) for i in range(len(hist["proportions"]))]
+            psi_by_feature[name] = psi_from_counts(hist["proportions"], recent)
 
-    features.sort(key=lambda f: f.psi, reverse=True)
+    features, worst = _feature_drift(psi_by_feature)
     return DriftReport(
-        model_version=predictor.version,
-        samples_analyzed=len(snapshots),
+        model_version=state.version,
+        samples_analyzed=samples,
+        window_start=since,
         features=features,
         overall_status=worst,
     )
+
+
+@router.get("/drift/history", response_model=List[DriftHistoryPoint])
+def get_drift_history(
+    days: int = Query(7, ge=1, le=90),
+    merchant: Merchant = Depends(get_current_merchant),
+    db: Session = Depends(get_db),
+):
+    """Time series of the scheduled drift snapshots, oldest first."""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (
+        db.query(DriftSnapshot)
+        .filter(DriftSnapshot.merchant_id == merchant.id, DriftSnapshot.computed_at >= since)
+        .order_by(DriftSnapshot.computed_at, DriftSnapshot.model_version)
+        .all()
+    )
+
+    points = []
+    for (computed_at, model_version), group in groupby(
+        rows, key=lambda r: (r.computed_at, r.model_version)
+    ):
+        group = list(group)
+        samples = group[0].samples
+        features, worst = _feature_drift({r.feature: r.psi for r in group})
+        points.append(DriftHistoryPoint(
+            computed_at=computed_at,
+            model_version=model_version,
+            window_hours=group[0].window_hours,
+            samples_analyzed=samples,
+            features=features,
+            overall_status=worst if samples >= MIN_DRIFT_SAMPLES else "insufficient_data",
+        ))
+    return points
+
+
+def _feature_drift(psi_by_feature: Dict[str, float]) -> Tuple[List[FeatureDrift], str]:
+    """Per-feature drift entries (worst first) and the overall status."""
+    features = [
+        FeatureDrift(
+            feature=name,
+            label=FEATURE_LABELS.get(name, name),
+            psi=round(psi, 4),
+            status=drift_status(psi),
+        )
+        for name, psi in psi_by_feature.items()
+    ]
+    features.sort(key=lambda f: f.psi, reverse=True)
+    worst = max((f.status for f in features), key=DRIFT_STATUS_RANK.get, default="stable")
+    return features, worst
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 from app.database import get_db
 from app.models.merchant import Merchant
@@ -12,86 +16,102 @@ from app.schemas.product import (
     ProductSync,
     ProductSyncResponse,
 )
-from app.services.auth import get_merchant_from_api_key, get_current_merchant
+from app.services.auth import MerchantSnapshot, get_merchant_from_api_key, get_current_merchant
+from app.services.catalog_sync import SyncItem, SyncResult, read_ndjson_chunks, sync_catalog
+from app.services.pagination import keyset_page
+from app.services.profile_cache import product_profiles
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
 
+def _sync_items(products: List[ProductCreate]) -> List[SyncItem]:
+    items = []
+    for product_data in products:
+        values, sent = product_data.model_dump(), set(product_data.model_fields_set)
+        # Auto-calculate price tier if not provided
+        if values["price_tier"] is None:
+            values["price_tier"] = Product.calculate_price_tier(values["price"])
+            sent.add("price_tier")
+        items.append((values, frozenset(sent)))
+    return items
+
+
+def _sync_and_commit(db: Session, merchant_id: str, products: List[ProductCreate], result: SyncResult):
+    external_ids = sync_catalog(db, Product, "external_product_id", merchant_id, _sync_items(products), result)
+    db.commit()
+    product_profiles.invalidate(merchant_id, external_ids)
+
+
 @router.post("/sync", response_model=ProductSyncResponse)
 def sync_products(
     sync_data: ProductSync,
-    merchant: Merchant = Depends(get_merchant_from_api_key),
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
     db: Session = Depends(get_db)
 ):
     """
     Bulk sync product data from merchant's platform.
 
-    Creates new products or updates existing ones based on external_product_id.
+    Creates new products or updates existing ones based on external_product_id
+    (only the fields sent are updated). For very large catalogs use
+    /products/sync/ndjson.
     """
-    created = 0
-    updated = 0
-    failed = 0
-    errors = []
-
-    for product_data in sync_data.products:
-        try:
-            # Check if product exists
-            existing = db.query(Product).filter(
-                Product.merchant_id == merchant.id,
-                Product.external_product_id == product_data.external_product_id
-            ).first()
-
-            # Auto-calculate price tier if not provided
-            if product_data.price_tier is None:
-                product_data.price_tier = Product.calculate_price_tier(product_data.price)
-
-            if existing:
-                # Update existing
-                for key, value in product_data.model_dump(exclude_unset=True).items():
-                    if key != "external_product_id":
-                        setattr(existing, key, value)
-                updated += 1
-            else:
-                # Create new
-                product = Product(
-                    merchant_id=merchant.id,
-                    **product_data.model_dump()
-                )
-                db.add(product)
-                created += 1
-
-        except Exception as e:
-            failed += 1
-            errors.append(f"{product_data.external_product_id}: {str(e)}")
+    result = SyncResult()
+    _sync_and_commit(db, merchant.id, sync_data.products, result)
+    return ProductSyncResponse(**asdict(result))
 
-    db.commit()
 
-    return ProductSyncResponse(
-        created=created,
-        updated=updated,
-        failed=failed,
-        errors=errors
-    )
+@router.post("/sync/ndjson", response_model=ProductSyncResponse)
+async def sync_products_ndjson(
+    request: Request,
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk sync products streamed as NDJSON, one ProductCreate object per line.
+
+    The body is read and committed SYNC_CHUNK_SIZE products at a time;
+    invalid lines are reported as failed, the rest are still synced.
+    """
+    result = SyncResult()
+    async for chunk in read_ndjson_chunks(request, ProductCreate, result):
+        await run_in_threadpool(_sync_and_commit, db, merchant.id, chunk, result)
+    return ProductSyncResponse(**asdict(result))
 
 
 @router.get("", response_model=List[ProductResponse])
 def list_products(
+    response: Response,
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     category: str = None,
+    min_return_rate: float = Query(None, ge=0, le=1),
+    sort: str = Query("recent", pattern="^(recent|return_rate)$"),
+    cursor: Optional[str] = None,
     merchant: Merchant = Depends(get_current_merchant),
     db: Session = Depends(get_db)
 ):
-    """List products for the merchant (dashboard)."""
+    """List products for the merchant (dashboard).
+
+    sort=return_rate lists the most-returned products first. When there
+    are more products, the X-Next-Cursor header holds the next page's
+    `cursor`.
+    """
     query = db.query(Product).filter(Product.merchant_id == merchant.id)
 
     if category:
         query = query.filter(Product.category == category)
-
-    products = query.order_by(Product.created_at.desc())\
-        .offset((page - 1) * per_page)\
-        .limit(per_page)\
-        .all()
+    if min_return_rate is not None:
+        query = query.filter(Product.return_rate >= min_return_rate)
+
+    if sort == "return_rate":
+        columns, key_types = (Product.return_rate, Product.id), (float, str)
+        key = lambda row: (row.return_rate, row.id)
+    else:
+        columns, key_types = (Product.created_at, Product.id), (datetime, str)
+        key = lambda row: (row.created_at, row.id)
+    products, next_cursor = keyset_page(query, columns, key_types, key, sort, cursor, per_page, page)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     return [ProductResponse(
         id=p.id,
@@ -154,7 +174,7 @@ def get_product(
 def update_product(
     product_id: str,
     update_data: ProductUpdate,
-    merchant: Merchant = Depends(get_merchant_from_api_key),
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
     db: Session = Depends(get_db)
 ):
     """Update product information."""
@@ -178,6 +198,7 @@ def update_product(
 
     db.commit()
     db.refresh(product)
+    product_profiles.invalidate(merchant.id, [product_id])
 
     return ProductResponse(
         id=product.id,
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from typing import Optional
-import json
+from datetime import datetime
 
 from app.database import get_db
 from app.models.merchant import Merchant
@@ -11,28 +12,33 @@ from app.schemas.return_request import (
     ReturnRequestUpdate,
     ReturnRequestListResponse,
 )
-from app.services.auth import get_merchant_from_api_key, get_current_merchant
+from app.services.auth import MerchantSnapshot, get_merchant_from_api_key, get_current_merchant
+from app.services.daily_stats import record_decision_change, rollup_totals
+from app.services.pagination import count_rows, keyset_page
 
 router = APIRouter(prefix="/returns", tags=["Returns"])
 
+# Decision filters whose total the daily rollups hold exactly
+ROLLUP_TOTAL_COLUMNS = {
+    None: "total",
+    ReturnDecision.APPROVED: "approved",
+    ReturnDecision.DENIED: "denied",
+}
+
+
+def _json_response(model: BaseModel) -> Response:
+    """Serialize a response schema directly, skipping FastAPI's second
+    validation pass through response_model (kept for the OpenAPI docs)."""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
 
 def _format_return_response(return_req: ReturnRequest) -> ReturnRequestResponse:
-    """Format return request for response."""
-    risk_flags = []
-    if return_req.risk_flags:
-        try:
-            risk_flags = json.loads(return_req.risk_flags)
-        except json.JSONDecodeError:
-            pass
-
-    explanation = None
-    if return_req.explanation:
-        try:
-            explanation = json.loads(return_req.explanation)
-        except json.JSONDecodeError:
-            pass
-
-    return ReturnRequestResponse(
+    """Format return request for response.
+
+    The row was validated when it was written, so the schema is built
+    without re-validation (model_construct).
+    """
+    return ReturnRequestResponse.model_construct(
         id=return_req.id,
         merchant_id=return_req.merchant_id,
         buyer_id=return_req.buyer_id,
@@ -45,9 +51,9 @@ def _format_return_response(return_req: ReturnRequest) -> ReturnRequestResponse:
         reason_details=return_req.reason_details,
         eligibility_score=return_req.eligibility_score,
         risk_level=return_req.risk_level,
-        risk_flags=risk_flags,
+        risk_flags=return_req.risk_flags or [],
         confidence=return_req.confidence,
-        explanation=explanation,
+        explanation=return_req.explanation or None,
         model_version=return_req.model_version,
         decision=return_req.decision,
         decided_at=return_req.decided_at,
@@ -60,7 +66,7 @@ def _format_return_response(return_req: ReturnRequest) -> ReturnRequestResponse:
 @router.get("/{return_id}", response_model=ReturnRequestResponse)
 def get_return_request(
     return_id: str,
-    merchant: Merchant = Depends(get_merchant_from_api_key),
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
     db: Session = Depends(get_db)
 ):
     """Get a specific return request by ID."""
@@ -75,19 +81,28 @@ def get_return_request(
             detail="Return request not found"
         )
 
-    return _format_return_response(return_req)
+    return _json_response(_format_return_response(return_req))
 
 
 @router.get("", response_model=ReturnRequestListResponse)
 def list_return_requests(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     decision: Optional[ReturnDecision] = None,
     risk_level: Optional[str] = None,
+    count: str = Query("estimate", pattern="^(exact|estimate|none)$"),
     merchant: Merchant = Depends(get_current_merchant),
     db: Session = Depends(get_db)
 ):
-    """List return requests for the merchant (dashboard)."""
+    """List return requests for the merchant (dashboard), newest first.
+
+    Pass the response's next_cursor as `cursor` to get the next page
+    (`page` still works but gets slower the deeper it goes). With
+    count=estimate the total comes from the daily rollups when the
+    filters allow, else from planner statistics where available;
+    count=none skips it.
+    """
     query = db.query(ReturnRequest).filter(
         ReturnRequest.merchant_id == merchant.id
     )
@@ -97,18 +112,29 @@ def list_return_requests(
     if risk_level:
         query = query.filter(ReturnRequest.risk_level == risk_level)
 
-    total = query.count()
-    items = query.order_by(ReturnRequest.created_at.desc())\
-        .offset((page - 1) * per_page)\
-        .limit(per_page)\
-        .all()
+    total, total_estimated = None, False
+    rollup_column = ROLLUP_TOTAL_COLUMNS.get(decision)
+    if count == "estimate" and not risk_level and rollup_column:
+        total = int(rollup_totals(db, merchant.id)[rollup_column])
+    elif count != "none":
+        total, total_estimated = count_rows(db, query, estimate=count == "estimate")
+
+    items, next_cursor = keyset_page(
+        query,
+        (ReturnRequest.created_at, ReturnRequest.id),
+        (datetime, str),
+        lambda r: (r.created_at, r.id),
+        "recent", cursor, per_page, page,
+    )
 
-    return ReturnRequestListResponse(
+    return _json_response(ReturnRequestListResponse.model_construct(
         items=[_format_return_response(r) for r in items],
         total=total,
+        total_estimated=total_estimated,
         page=page,
-        per_page=per_page
-    )
+        per_page=per_page,
+        next_cursor=next_cursor,
+    ))
 
 
 @router.put("/{return_id}", response_model=ReturnRequestResponse)
@@ -119,10 +145,12 @@ def update_return_decision(
     db: Session = Depends(get_db)
 ):
     """Update the decision for a return request (manual override)."""
+    # Row lock: concurrent overrides must see each other's old decision,
+    # or the daily rollups would count one request twice
     return_req = db.query(ReturnRequest).filter(
         ReturnRequest.id == return_id,
         ReturnRequest.merchant_id == merchant.id
-    ).first()
+    ).with_for_update().first()
 
     if not return_req:
         raise HTTPException(
@@ -130,7 +158,9 @@ def update_return_decision(
             detail="Return request not found"
         )
 
-    from datetime import datetime
+    record_decision_change(
+        db, merchant.id, return_req.created_at.date(), return_req.decision, update_data.decision
+    )
     return_req.decision = update_data.decision
     return_req.decided_at = datetime.utcnow()
     return_req.decided_by = update_data.decided_by or merchant.id
@@ -2,9 +2,13 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from app.database import get_db
-from app.models.merchant import Merchant
-from app.schemas.scoring import ScoreRequest, ScoreResponse
-from app.services.auth import get_merchant_from_api_key
+from app.schemas.scoring import (
+    ScoreRequest,
+    ScoreResponse,
+    BatchScoreRequest,
+    BatchScoreResponse,
+)
+from app.services.auth import MerchantSnapshot, get_merchant_from_api_key
 from app.services.scoring_engine import ScoringEngine
 
 router = APIRouter(prefix="/score", tags=["Scoring"])
@@ -13,7 +17,7 @@ router = APIRouter(prefix="/score", tags=["Scoring"])
 @router.post("", response_model=ScoreResponse)
 def calculate_score(
     request: ScoreRequest,
-    merchant: Merchant = Depends(get_merchant_from_api_key),
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
     db: Session = Depends(get_db)
 ):
     """
@@ -40,3 +44,30 @@ def calculate_score(
     """
     scoring_engine = ScoringEngine(db, merchant)
     return scoring_engine.calculate_score(request)
+
+
+@router.post("/batch", response_model=BatchScoreResponse)
+def calculate_batch_score(
+    batch: BatchScoreRequest,
+    merchant: MerchantSnapshot = Depends(get_merchant_from_api_key),
+    db: Session = Depends(get_db)
+):
+    """
+    Score many return requests in one call (backfills, marketplace imports).
+
+    Buyers and products are resolved in bulk, the model runs once over the
+    whole batch, and every return request is saved in a single transaction.
+
+    **Authentication:** Requires API key in X-API-Key header.
+
+    **Response:** one entry per request, in request order, carrying either
+    the same `result` `/score` would return or an `error` message.
+    """
+    scoring_engine = ScoringEngine(db, merchant)
+    results = scoring_engine.calculate_batch(batch.requests)
+    failed = sum(1 for item in results if item.error is not None)
+    return BatchScoreResponse(
+        scored=len(results) - failed,
+        failed=failed,
+        results=results,
+    )
@@ -52,6 +52,8 @@ class ReturnRequestResponse(BaseModel):
 
 class ReturnRequestListResponse(BaseModel):
     items: List[ReturnRequestResponse]
-    total: int
+    total: Optional[int] = None  # None with count=none
+    total_estimated: bool = False
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
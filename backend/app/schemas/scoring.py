@@ -73,6 +73,27 @@ class ScoreResponse(BaseModel):
     request_id: Optional[str] = Field(None, description="ID if return request was created")
 
 
+MAX_SCORE_BATCH = 5000
+
+
+class BatchScoreRequest(BaseModel):
+    """Several return requests scored in one call (backfills, imports)."""
+    requests: List[ScoreRequest] = Field(..., min_length=1, max_length=MAX_SCORE_BATCH)
+
+
+class BatchScoreItem(BaseModel):
+    """Outcome for one request of a batch, at its position in the input."""
+    index: int
+    result: Optional[ScoreResponse] = None
+    error: Optional[str] = None
+
+
+class BatchScoreResponse(BaseModel):
+    scored: int
+    failed: int
+    results: List[BatchScoreItem]
+
+
 class ModelVersionInfo(BaseModel):
     """A model version in the registry."""
     model_config = _ALLOW_MODEL_FIELDS
@@ -80,6 +101,8 @@ class ModelVersionInfo(BaseModel):
     version: int
     model_type: str
     is_active: bool
+    is_pinned: bool = False
+    blob_size: Optional[int] = None  # None once the blob was garbage-collected
     training_samples: int
     feedback_samples: int = 0
     accuracy: Optional[float] = None
@@ -91,13 +114,21 @@ class ModelVersionInfo(BaseModel):
     created_at: datetime
 
 
-class RetrainResponse(BaseModel):
-    """Result of a retraining run."""
-    version: int
-    metrics: dict
-    feedback_samples: int
-    activated: bool
-    message: str
+class RetrainJobInfo(BaseModel):
+    """State of an asynchronous retraining job."""
+    id: str
+    status: str  # queued | running | succeeded | failed
+    stage: Optional[str] = None
+    progress: float = 0.0  # 0-1
+    coalesced: bool = False  # this request joined a job already in progress
+    version: Optional[int] = None  # set once succeeded (and activated)
+    metrics: Optional[dict] = None
+    feedback_samples: Optional[int] = None
+    error: Optional[str] = None
+    message: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 
 class FeatureDrift(BaseModel):
@@ -113,6 +144,18 @@ class DriftReport(BaseModel):
     model_config = _ALLOW_MODEL_FIELDS
     model_version: Optional[int]
     samples_analyzed: int
+    window_start: Optional[datetime] = None
+    features: List[FeatureDrift]
+    overall_status: str  # stable | moderate | drifted | insufficient_data
+
+
+class DriftHistoryPoint(BaseModel):
+    """One scheduled drift snapshot for a merchant."""
+    model_config = _ALLOW_MODEL_FIELDS
+    computed_at: datetime
+    model_version: int
+    window_hours: int
+    samples_analyzed: int
     features: List[FeatureDrift]
     overall_status: str  # stable | moderate | drifted | insufficient_data
 
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 import secrets
@@ -12,6 +13,7 @@ from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
 from app.config import get_settings
 from app.database import get_db
 from app.models.merchant import Merchant
+from app.services.ttl_cache import TTLCache
 
 settings = get_settings()
 
@@ -20,6 +22,45 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.api_v1_prefix}/auth/lo
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 
+@dataclass(frozen=True)
+class MerchantSnapshot:
+    """Immutable view of an active merchant, as authenticated by API key.
+
+    Carries everything API-key endpoints and the scoring engine read, so
+    cached authentications never touch the ORM.
+    """
+
+    id: str
+    name: str
+    api_key_hash: str
+    default_return_window: int
+    fraud_threshold: float
+    auto_approve_threshold: float
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, merchant: Merchant) -> "MerchantSnapshot":
+        return cls(
+            id=merchant.id,
+            name=merchant.name,
+            api_key_hash=merchant.api_key_hash,
+            default_return_window=merchant.default_return_window or 30,
+            fraud_threshold=merchant.fraud_threshold if merchant.fraud_threshold is not None else 30.0,
+            auto_approve_threshold=(
+                merchant.auto_approve_threshold if merchant.auto_approve_threshold is not None else 70.0
+            ),
+            is_active=bool(merchant.is_active),
+        )
+
+
+# API key hash -> MerchantSnapshot. Entries are discarded when a key is
+# rotated or revoked and when merchant settings change; the TTL bounds
+# staleness in other worker processes.
+api_key_cache: TTLCache[MerchantSnapshot] = TTLCache(
+    settings.api_key_cache_size, settings.api_key_cache_ttl_s
+)
+
+
 class AuthService:
     @staticmethod
     def hash_password(password: str) -> str:
@@ -74,7 +115,11 @@ class AuthService:
     @staticmethod
     def get_merchant_by_api_key(db: Session, api_key: str) -> Optional[Merchant]:
         """Get a merchant by API key."""
-        api_key_hash = AuthService.hash_api_key(api_key)
+        return AuthService.get_merchant_by_api_key_hash(db, AuthService.hash_api_key(api_key))
+
+    @staticmethod
+    def get_merchant_by_api_key_hash(db: Session, api_key_hash: str) -> Optional[Merchant]:
+        """Get an active merchant by the SHA-256 hash of its API key."""
         return db.query(Merchant).filter(
             Merchant.api_key_hash == api_key_hash,
             Merchant.is_active == True
@@ -108,18 +153,25 @@ async def get_current_merchant(
 async def get_merchant_from_api_key(
     api_key: Optional[str] = Depends(api_key_header),
     db: Session = Depends(get_db)
-) -> Merchant:
-    """Dependency to get merchant from API key."""
+) -> MerchantSnapshot:
+    """Dependency to get merchant from API key (cached per key hash)."""
     if not api_key:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API key required",
             headers={"X-API-Key": "Required"},
         )
-    merchant = AuthService.get_merchant_by_api_key(db, api_key)
+    api_key_hash = AuthService.hash_api_key(api_key)
+    snapshot = api_key_cache.get(api_key_hash)
+    if snapshot is not None:
+        return snapshot
+
+    merchant = AuthService.get_merchant_by_api_key_hash(db, api_key_hash)
     if not merchant:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API key"
         )
-    return merchant
+    snapshot = MerchantSnapshot.from_model(merchant)
+    api_key_cache.put(api_key_hash, snapshot)
+    return snapshot
@@ -5,7 +5,7 @@ model and a ready-to-use demo merchant + API key, no manual steps.
 """
 import os
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from sqlalchemy import text, inspect
 from sqlalchemy.orm import Session
@@ -13,8 +13,22 @@ from sqlalchemy.orm import Session
 from app.config import get_settings
 from app.models.merchant import Merchant
 from app.models.scoring_model import ScoringModel
-from app.services.auth import AuthService
-from app.ml.train import ModelTrainer, default_model_path
+from app.models.return_request import ReturnRequest
+from app.models.return_velocity import ReturnVelocityEvent
+from app.models.drift import DriftBinCount, DriftBucket, DriftSnapshot, DriftSnapshotRun
+from app.models.merchant_daily_stats import MerchantDailyStats
+from app.services.auth import AuthService, api_key_cache
+from app.services.daily_stats import rebuild_daily_stats
+from app.services.drift import DRIFT_WINDOWS, rebuild_drift_buckets
+from app.services.feature_store import backfill_return_features
+from app.services.model_registry import (
+    compress_model_blobs,
+    gc_model_blobs,
+    store_blob,
+    write_model_artifact,
+)
+from app.services.velocity import RETENTION, prune_velocity_events, rebuild_velocity_events
+from app.ml.train import ModelTrainer, default_model_path, dump_bundle
 from app.ml.predict import get_predictor
 
 settings = get_settings()
@@ -27,11 +41,77 @@ SCHEMA_UPGRADES = [
     ("return_requests", "model_version", "INTEGER"),
     ("scoring_models", "feedback_samples", "INTEGER"),
     ("scoring_models", "roc_auc", "FLOAT"),
+    ("scoring_models", "blob_size", "INTEGER"),
+    ("scoring_models", "is_pinned", "BOOLEAN DEFAULT FALSE"),
+    ("return_features", "buyer_returns_1h", "INTEGER"),
+    ("return_features", "buyer_returns_24h", "INTEGER"),
+    ("return_features", "buyer_returns_7d", "INTEGER"),
+    ("return_features", "buyer_returns_30d", "INTEGER"),
 ]
 
+# Columns that moved from JSON-encoded TEXT to native JSON. SQLite stores
+# JSON as text already; on PostgreSQL they are converted to JSONB in place.
+JSON_COLUMN_UPGRADES = [
+    ("return_requests", "risk_flags"),
+    ("return_requests", "explanation"),
+    ("return_requests", "features_snapshot"),
+]
+
+# Indexes added after the initial release: (table, index name, columns, unique)
+INDEX_UPGRADES = [
+    ("buyers", "uq_buyers_merchant_external", ("merchant_id", "external_buyer_id"), True),
+    ("products", "uq_products_merchant_external", ("merchant_id", "external_product_id"), True),
+    ("return_requests", "ix_return_requests_merchant_created", ("merchant_id", "created_at", "id"), False),
+    ("buyers", "ix_buyers_merchant_created", ("merchant_id", "created_at", "id"), False),
+    ("products", "ix_products_merchant_created", ("merchant_id", "created_at", "id"), False),
+    ("scoring_models", "uq_scoring_models_version", ("version",), True),
+]
+
+# Columns pointing at rows of a table that gets a unique index: duplicates
+# are merged into one row before the index is built
+DEDUPE_REFERENCES = {
+    "buyers": [("return_requests", "buyer_id"), ("return_velocity_events", "buyer_id")],
+    "products": [("return_requests", "product_id")],
+}
+
+# Which duplicate is kept (first in this order); by default the most
+# recently updated. Registry rows have no updated_at: keep the active one,
+# else the newest.
+DEDUPE_KEEP_ORDER = {
+    "scoring_models": "COALESCE(is_active, FALSE) DESC, COALESCE(trained_at, created_at) DESC, id",
+}
+
+
+def dedupe_rows(conn, table: str, columns) -> int:
+    """Merge rows of `table` that share `columns` (duplicates created before
+    the unique index existed): the first row in DEDUPE_KEEP_ORDER is kept
+    and references to the others are moved onto it. Returns rows removed."""
+    key = ", ".join(columns)
+    keep_order = DEDUPE_KEEP_ORDER.get(table, "COALESCE(updated_at, created_at) DESC, id")
+    groups = conn.execute(text(
+        f"SELECT {key} FROM {table} GROUP BY {key} HAVING COUNT(*) > 1"
+    )).all()
+    removed = 0
+    for group in groups:
+        match = " AND ".join(f"{c} = :{c}" for c in columns)
+        params = dict(zip(columns, group))
+        ids = [row_id for (row_id,) in conn.execute(text(
+            f"SELECT id FROM {table} WHERE {match} ORDER BY {keep_order}"
+        ), params)]
+        keep, duplicates = ids[0], ids[1:]
+        for ref_table, ref_column in DEDUPE_REFERENCES.get(table, []):
+            for duplicate in duplicates:
+                conn.execute(text(
+                    f"UPDATE {ref_table} SET {ref_column} = :keep WHERE {ref_column} = :duplicate"
+                ), {"keep": keep, "duplicate": duplicate})
+        for duplicate in duplicates:
+            conn.execute(text(f"DELETE FROM {table} WHERE id = :id"), {"id": duplicate})
+        removed += len(duplicates)
+    return removed
+
 
 def ensure_schema(engine):
-    """Add columns introduced by newer versions to existing tables."""
+    """Add columns and indexes introduced by newer versions to existing tables."""
     inspector = inspect(engine)
     with engine.connect() as conn:
         for table, column, col_type in SCHEMA_UPGRADES:
@@ -43,6 +123,49 @@ def ensure_schema(engine):
                 conn.commit()
                 print(f"Schema upgrade: added {table}.{column}")
 
+        if engine.dialect.name == "postgresql":
+            # Fresh inspector: the loop above may just have added columns
+            current = inspect(engine)
+            for table, column in JSON_COLUMN_UPGRADES:
+                if table not in current.get_table_names():
+                    continue
+                col_type = {c["name"]: c["type"] for c in current.get_columns(table)}.get(column)
+                if col_type is None or col_type.__class__.__name__ == "JSONB":
+                    continue
+                try:
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"
+                    ))
+                    conn.commit()
+                    print(f"Schema upgrade: converted {table}.{column} to JSONB")
+                except Exception as e:
+                    # e.g. rows holding text that is not valid JSON
+                    conn.rollback()
+                    print(f"Warning: Could not convert {table}.{column} to JSONB: {e}")
+
+        for table, name, columns, unique in INDEX_UPGRADES:
+            if table not in inspector.get_table_names():
+                continue
+            if name in {i["name"] for i in inspector.get_indexes(table)}:
+                continue
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            try:
+                if unique:
+                    removed = dedupe_rows(conn, table, columns)
+                    if removed:
+                        print(f"Schema upgrade: merged {removed} duplicate {table} rows")
+                conn.execute(text(
+                    f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+                ))
+                conn.commit()
+                print(f"Schema upgrade: added index {name}")
+            except Exception as e:
+                conn.rollback()
+                if unique:
+                    # Upserts rely on this index (ON CONFLICT): don't serve without it
+                    raise RuntimeError(f"Could not create unique index {name} on {table}: {e}") from e
+                print(f"Warning: Could not create index {name}: {e}")
+
 
 def ensure_model(db: Session):
     """Make sure a trained model is available and registered.
@@ -63,9 +186,7 @@ def ensure_model(db: Session):
     file_version = predictor.version if predictor.bundle else None
 
     if active is not None and (file_version is None or active.version > file_version):
-        os.makedirs(os.path.dirname(model_path), exist_ok=True)
-        with open(model_path, "wb") as f:
-            f.write(active.model_blob)
+        write_model_artifact(active, model_path)
         predictor.reload()
         print(f"Restored scoring model v{active.version} from registry")
         return
@@ -82,7 +203,6 @@ def ensure_model(db: Session):
     record = ScoringModel(
         version=1,
         model_type="gradient_boosting",
-        model_blob=trainer.serialize_bundle(),
         features_used=json.dumps(trainer.feature_extractor.feature_names),
         training_samples=metrics["training_samples"],
         feedback_samples=0,
@@ -94,6 +214,7 @@ def ensure_model(db: Session):
         is_active=True,
         trained_at=datetime.utcnow(),
     )
+    store_blob(record, trainer.serialize_bundle())
     db.add(record)
     db.commit()
     get_predictor().reload()
@@ -113,12 +234,9 @@ def _register_existing_artifact(db: Session, deactivate_others: bool = False):
 
     bundle = predictor.bundle
     metrics = bundle.get("metrics", {})
-    with open(default_model_path(), "rb") as f:
-        blob = f.read()
     record = ScoringModel(
         version=bundle.get("version", 1),
         model_type="gradient_boosting",
-        model_blob=blob,
         features_used=json.dumps(bundle.get("feature_names", [])),
         training_samples=metrics.get("training_samples", 0),
         feedback_samples=metrics.get("feedback_samples", 0),
@@ -130,11 +248,23 @@ def _register_existing_artifact(db: Session, deactivate_others: bool = False):
         is_active=True,
         trained_at=datetime.fromisoformat(bundle["trained_at"]) if bundle.get("trained_at") else None,
     )
+    store_blob(record, dump_bundle(bundle))
     db.add(record)
     db.commit()
     print(f"Registered existing model artifact as v{record.version}")
 
 
+def ensure_model_blobs(db: Session):
+    """Compress registry blobs stored before compression, then apply the
+    blob retention policy."""
+    compressed = compress_model_blobs(db)
+    if compressed:
+        print(f"Compressed {compressed} model registry blobs")
+    collected = gc_model_blobs(db)
+    if collected:
+        print(f"Garbage-collected {collected} old model blobs")
+
+
 def ensure_demo_merchant(db: Session):
     """Provision the demo merchant with a deterministic API key.
 
@@ -159,17 +289,68 @@ def ensure_demo_merchant(db: Session):
 
     expected_hash = AuthService.hash_api_key(settings.demo_api_key)
     if merchant.api_key_hash != expected_hash:
+        api_key_cache.discard(merchant.api_key_hash)
         merchant.api_key_hash = expected_hash
         print("Demo merchant API key provisioned")
     db.commit()
 
 
+def ensure_velocity_events(db: Session):
+    """Backfill the velocity table on first start after upgrading, then
+    drop events no velocity window can see."""
+    if db.query(ReturnVelocityEvent.return_request_id).first() is None:
+        since = datetime.utcnow() - RETENTION
+        if db.query(ReturnRequest.id).filter(ReturnRequest.request_date >= since).first():
+            print(f"Rebuilt return velocity events ({rebuild_velocity_events(db)} rows)")
+            return
+    prune_velocity_events(db)
+
+
+def ensure_return_features(db: Session):
+    """Encode raw feature snapshots written before return_features existed."""
+    written = backfill_return_features(db)
+    if written:
+        print(f"Backfilled {written} return feature rows from feature snapshots")
+
+
+def ensure_drift_buckets(db: Session):
+    """Drop expired drift buckets and snapshots; on first start after
+    upgrading, count the last week of stored feature vectors for the
+    serving model."""
+    cutoff = datetime.utcnow() - timedelta(days=settings.drift_bucket_retention_days)
+    for model in (DriftBucket, DriftBinCount):
+        db.query(model).filter(model.bucket_start < cutoff).delete(synchronize_session=False)
+    for model in (DriftSnapshot, DriftSnapshotRun):
+        db.query(model).filter(model.computed_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+
+    state = get_predictor().state
+    if state.version is None or not state.histograms:
+        return
+    if db.query(DriftBucket.merchant_id).first() is None:
+        since = datetime.utcnow() - DRIFT_WINDOWS["week"]
+        counted = rebuild_drift_buckets(db, state.version, state.histograms, since)
+        if counted:
+            print(f"Rebuilt drift counters from {counted} stored feature vectors")
+
+
+def ensure_daily_stats(db: Session):
+    """Build the dashboard rollups on first start after upgrading."""
+    if db.query(MerchantDailyStats.day).first() is None and db.query(ReturnRequest.id).first():
+        print(f"Rebuilt merchant daily stats ({rebuild_daily_stats(db)} rows)")
+
+
 def run_bootstrap(engine, SessionLocal):
     ensure_schema(engine)
     db = SessionLocal()
     try:
         ensure_demo_merchant(db)
+        ensure_velocity_events(db)
+        ensure_return_features(db)
+        ensure_daily_stats(db)
         if settings.bootstrap_train:
             ensure_model(db)
+        ensure_model_blobs(db)
+        ensure_drift_buckets(db)
     finally:
         db.close()
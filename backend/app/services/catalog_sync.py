@@ -0,0 +1,200 @@
+"""Bulk upsert of merchant-synced buyers and products.
+
+/buyers/sync and /products/sync resolve which external IDs already exist
+with one IN query per chunk, then write the whole chunk with multi-row
+INSERT ... ON CONFLICT (merchant_id, external_id) DO UPDATE. An existing
+row only gets the fields the merchant actually sent (as with a PUT), so
+rows are grouped by their set of sent fields, one statement per group.
+
+The /sync/ndjson variants take one JSON object per line and stream the
+body, validating and writing SYNC_CHUNK_SIZE items at a time, so
+100k-item syncs never materialize one giant request body.
+"""
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app.services.upsert import UPSERT_CHUNK_SIZE
+
+# Items validated and written per step of an NDJSON sync (one commit each)
+SYNC_CHUNK_SIZE = 1000
+
+# Errors listed in a sync response; further failures are only counted
+MAX_REPORTED_ERRORS = 100
+
+# (column values, names of the fields the merchant sent)
+SyncItem = Tuple[Dict[str, Any], FrozenSet[str]]
+
+
+@dataclass
+class SyncResult:
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def fail(self, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+
+def sync_catalog(
+    db: Session,
+    model,
+    external_key: str,
+    merchant_id: str,
+    items: List[SyncItem],
+    result: SyncResult,
+) -> List[str]:
+    """Create or update `items` for the merchant (no commit).
+
+    Returns the external IDs written, for cache invalidation. An item
+    repeated within the payload is merged into the earlier one, as if
+    applied in order.
+    """
+    merged: Dict[str, SyncItem] = {}
+    for values, sent in items:
+        external_id = values[external_key]
+        if external_id in merged:
+            earlier, earlier_sent = merged[external_id]
+            merged[external_id] = ({**earlier, **{k: values[k] for k in sent}}, earlier_sent | sent)
+            result.updated += 1
+        else:
+            merged[external_id] = (values, sent)
+
+    external_ids = list(merged)
+    for start in range(0, len(external_ids), UPSERT_CHUNK_SIZE):
+        chunk = {ext_id: merged[ext_id] for ext_id in external_ids[start:start + UPSERT_CHUNK_SIZE]}
+        _sync_chunk(db, model, external_key, merchant_id, chunk, result)
+    return external_ids
+
+
+def _sync_chunk(db: Session, model, external_key: str, merchant_id: str,
+                chunk: Dict[str, SyncItem], result: SyncResult):
+    external_column = getattr(model, external_key)
+    existing = set(db.execute(
+        select(external_column).where(model.merchant_id == merchant_id, external_column.in_(list(chunk)))
+    ).scalars())
+
+    try:
+        with db.begin_nested():
+            _write(db, model, external_key, merchant_id, list(chunk.values()))
+    except Exception:
+        # Isolate the failing item(s); the rest of the chunk is still written
+        for external_id, item in chunk.items():
+            try:
+                with db.begin_nested():
+                    _write(db, model, external_key, merchant_id, [item])
+            except Exception as e:
+                result.fail(f"{external_id}: {e}")
+                continue
+            if external_id in existing:
+                result.updated += 1
+            else:
+                result.created += 1
+        return
+
+    result.updated += len(existing)
+    result.created += len(chunk) - len(existing)
+
+
+def _write(db: Session, model, external_key: str, merchant_id: str, items: List[SyncItem]):
+    now = datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        _write_orm(db, model, external_key, merchant_id, items, now)
+        return
+
+    insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    by_fields: Dict[FrozenSet[str], List[Dict[str, Any]]] = {}
+    for values, sent in items:
+        by_fields.setdefault(sent, []).append({
+            **values,
+            "id": str(uuid.uuid4()),
+            "merchant_id": merchant_id,
+            "created_at": now,
+            "updated_at": now,
+        })
+    for sent, rows in by_fields.items():
+        stmt = insert(model).values(rows)
+        updates = {name: stmt.excluded[name] for name in sent if name != external_key}
+        updates["updated_at"] = stmt.excluded.updated_at
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["merchant_id", external_key], set_=updates,
+        ))
+
+
+def _write_orm(db: Session, model, external_key: str, merchant_id: str,
+               items: List[SyncItem], now: datetime):
+    """Fallback for databases without ON CONFLICT: one SELECT per chunk."""
+    external_column = getattr(model, external_key)
+    rows = {
+        getattr(row, external_key): row
+        for row in db.query(model).filter(
+            model.merchant_id == merchant_id,
+            external_column.in_([values[external_key] for values, _ in items]),
+        )
+    }
+    for values, sent in items:
+        row = rows.get(values[external_key])
+        if row is None:
+            db.add(model(merchant_id=merchant_id, **values))
+            continue
+        for name in sent:
+            if name != external_key:
+                setattr(row, name, values[name])
+        row.updated_at = now
+    db.flush()
+
+
+async def read_ndjson_chunks(
+    request: Request,
+    schema: Type[BaseModel],
+    result: SyncResult,
+    chunk_size: int = SYNC_CHUNK_SIZE,
+) -> AsyncIterator[List[BaseModel]]:
+    """Validate a streamed NDJSON body line by line, yielding lists of up
+    to chunk_size items. Invalid lines are recorded in `result`."""
+    chunk: List[BaseModel] = []
+    buffer = b""
+    line_number = 0
+
+    def parse(line: bytes) -> Optional[BaseModel]:
+        try:
+            return schema.model_validate_json(line)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            result.fail(f"line {line_number}: {location + ': ' if location else ''}{error['msg']}")
+            return None
+
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            item = parse(line)
+            if item is not None:
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+
+    if buffer.strip():
+        line_number += 1
+        item = parse(buffer)
+        if item is not None:
+            chunk.append(item)
+    if chunk:
+        yield chunk
@@ -0,0 +1,107 @@
+"""Daily per-merchant return rollups behind the dashboard stats.
+
+merchant_daily_stats holds, per merchant and day, how many return requests
+were created and how many of them are currently approved, denied or
+pending, plus the sum of their eligibility scores. write_scored_returns()
+adds each scored batch in its transaction and the decision override
+endpoint moves a request between decision columns, so the rollups stay
+exact without a periodic job. rebuild_daily_stats() recreates them from
+return_requests.
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.merchant_daily_stats import MerchantDailyStats
+from app.models.return_request import ReturnRequest, ReturnDecision
+from app.services.upsert import upsert_add
+
+# Rollup column each decision is counted in
+DECISION_COLUMNS = {
+    ReturnDecision.APPROVED: "approved",
+    ReturnDecision.DENIED: "denied",
+    ReturnDecision.PENDING: "pending",
+    ReturnDecision.REVIEW: "pending",
+}
+
+COUNTER_COLUMNS = ("total", "approved", "denied", "pending", "score_sum", "score_count")
+
+
+def _empty(merchant_id: str, day: date) -> Dict[str, Any]:
+    row = {name: 0 for name in COUNTER_COLUMNS}
+    row.update(merchant_id=merchant_id, day=day, score_sum=0.0)
+    return row
+
+
+def record_scored_returns(db: Session, rows: List[Dict[str, Any]]):
+    """Add newly inserted return_requests rows to the rollups (no commit)."""
+    increments: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = (row["merchant_id"], row["created_at"].date())
+        entry = increments.get(key)
+        if entry is None:
+            entry = increments[key] = _empty(*key)
+        entry["total"] += 1
+        column = DECISION_COLUMNS.get(row["decision"])
+        if column:
+            entry[column] += 1
+        if row["eligibility_score"] is not None:
+            entry["score_sum"] += row["eligibility_score"]
+            entry["score_count"] += 1
+    upsert_add(db, MerchantDailyStats, list(increments.values()), COUNTER_COLUMNS)
+
+
+def record_decision_change(
+    db: Session,
+    merchant_id: str,
+    day: date,
+    old: Optional[ReturnDecision],
+    new: ReturnDecision,
+):
+    """Move one request of `day` from its old decision column to the new one (no commit)."""
+    old_column, new_column = DECISION_COLUMNS.get(old), DECISION_COLUMNS.get(new)
+    if old_column == new_column:
+        return
+    row = _empty(merchant_id, day)
+    if old_column:
+        row[old_column] -= 1
+    if new_column:
+        row[new_column] += 1
+    upsert_add(db, MerchantDailyStats, [row], COUNTER_COLUMNS)
+
+
+def rollup_totals(db: Session, merchant_id: str, since: Optional[date] = None) -> Dict[str, float]:
+    """Summed counters of the merchant's rollups from `since` (inclusive) on."""
+    query = select(*(func.coalesce(func.sum(getattr(MerchantDailyStats, name)), 0)
+                     for name in COUNTER_COLUMNS)).where(MerchantDailyStats.merchant_id == merchant_id)
+    if since is not None:
+        query = query.where(MerchantDailyStats.day >= since)
+    return dict(zip(COUNTER_COLUMNS, db.execute(query).one()))
+
+
+def rebuild_daily_stats(db: Session) -> int:
+    """Recreate merchant_daily_stats from return_requests; returns rows written."""
+    def count_if(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    decision = ReturnRequest.decision
+    day = func.date(ReturnRequest.created_at)
+    source = select(
+        ReturnRequest.merchant_id,
+        day,
+        func.count(ReturnRequest.id),
+        count_if(decision == ReturnDecision.APPROVED),
+        count_if(decision == ReturnDecision.DENIED),
+        count_if(decision.in_([ReturnDecision.PENDING, ReturnDecision.REVIEW])),
+        func.coalesce(func.sum(ReturnRequest.eligibility_score), 0.0),
+        func.count(ReturnRequest.eligibility_score),
+    ).where(ReturnRequest.created_at.isnot(None)).group_by(ReturnRequest.merchant_id, day)
+
+    db.query(MerchantDailyStats).delete(synchronize_session=False)
+    db.execute(insert(MerchantDailyStats).from_select(
+        ["merchant_id", "day", *COUNTER_COLUMNS], source
+    ))
+    db.commit()
+    return db.query(func.count(MerchantDailyStats.day)).scalar()
@@ -0,0 +1,302 @@
+"""Streaming drift histograms.
+
+Instead of re-binning recent feature vectors on every /models/drift call,
+the scoring engine adds each committed batch to in-memory counters: per
+(merchant, model version, hour), how many requests fell into each bin of
+the active bundle's training histograms. A background thread adds those
+counters to drift_buckets / drift_bin_counts every DRIFT_FLUSH_INTERVAL_S
+(an upsert that increments, so every API worker process can flush into
+the same rows). The drift report then sums the counts for its window,
+adds its own worker's pending counters without flushing them, and
+computes PSI, at a cost that depends on the number of features and bins,
+not on the traffic volume.
+"""
+import threading
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.drift import DriftBinCount, DriftBucket
+from app.models.return_features import FEATURE_COLUMNS, ReturnFeatures
+from app.services.upsert import upsert_add
+
+settings = get_settings()
+
+# Named report windows; any whole number of hours is accepted as well
+DRIFT_WINDOWS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(days=7),
+}
+
+# Fewer scored requests than this in a window -> "insufficient_data"
+MIN_DRIFT_SAMPLES = 30
+
+# Worst-first ordering of per-feature statuses
+DRIFT_STATUS_RANK = {"stable": 0, "moderate": 1, "drifted": 2}
+
+_Key = Tuple[str, int, datetime]  # (merchant_id, model_version, bucket_start)
+
+
+def bucket_start(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def drift_status(psi: float) -> str:
+    """PSI < 0.1 = stable, 0.1-0.25 = moderate shift, > 0.25 = drifted."""
+    if psi > 0.25:
+        return "drifted"
+    if psi > 0.1:
+        return "moderate"
+    return "stable"
+
+
+class _BinPlan:
+    """A model version's training-histogram bin edges, by feature-vector column."""
+
+    def __init__(self, histograms: Dict[str, Dict]):
+        self.features = [name for name in FEATURE_COLUMNS if name in histograms]
+        self.columns = [FEATURE_COLUMNS.index(name) for name in self.features]
+        self.edges = [np.asarray(histograms[name]["bin_edges"], dtype=float) for name in self.features]
+        self.n_bins = max((len(edges) - 1 for edges in self.edges), default=0)
+
+    def counts(self, matrix: np.ndarray) -> np.ndarray:
+        """Per-feature bin counts, shape (features, n_bins); values outside
+        the training range are not counted, as in compute_psi."""
+        out = np.zeros((len(self.features), self.n_bins), dtype=np.int64)
+        for row, (column, edges) in enumerate(zip(self.columns, self.edges)):
+            counts, _ = np.histogram(matrix[:, column], bins=edges)
+            out[row, :len(counts)] = counts
+        return out
+
+
+class DriftAccumulator:
+    """In-memory drift counters, flushed into the bucket tables."""
+
+    def __init__(self, flush_interval_s: float):
+        self.flush_interval = flush_interval_s
+        self._plans: Dict[int, _BinPlan] = {}
+        self._pending: Dict[_Key, List[Any]] = {}  # key -> [samples, counts]
+        self._lock = threading.Lock()
+        self._session_factory = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._added = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+
+    def add(
+        self,
+        merchant_id: str,
+        model_version: Optional[int],
+        histograms: Optional[Dict[str, Dict]],
+        scored_at: Sequence[datetime],
+        matrix: np.ndarray,
+    ):
+        """Count scored feature vectors (rows of `matrix`) against the bins
+        of `histograms`, which belong to `model_version`."""
+        if model_version is None or not histograms or not len(matrix):
+            return
+        plan = self._plans.get(model_version)
+        if plan is None:
+            plan = self._plans[model_version] = _BinPlan(histograms)
+
+        by_hour: Dict[datetime, List[int]] = {}
+        for i, ts in enumerate(scored_at):
+            by_hour.setdefault(bucket_start(ts), []).append(i)
+
+        for hour, indices in by_hour.items():
+            rows = matrix if len(by_hour) == 1 else matrix[indices]
+            counts = plan.counts(rows)
+            with self._lock:
+                entry = self._pending.setdefault((merchant_id, model_version, hour), [0, None])
+                entry[0] += len(rows)
+                entry[1] = counts if entry[1] is None else entry[1] + counts
+                self._added += len(rows)
+
+    def flush(self, db: Session) -> int:
+        """Write pending counters; returns buckets written. On failure the
+        counters are kept for the next flush."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        buckets, bins = [], []
+        for (merchant_id, model_version, hour), (samples, counts) in pending.items():
+            key = {"merchant_id": merchant_id, "model_version": model_version, "bucket_start": hour}
+            buckets.append({**key, "samples": samples})
+            features = self._plans[model_version].features
+            for row, col in zip(*np.nonzero(counts)):
+                bins.append({**key, "feature": features[row], "bin": int(col), "count": int(counts[row, col])})
+        try:
+            upsert_add(db, DriftBucket, buckets, ["samples"])
+            upsert_add(db, DriftBinCount, bins, ["count"])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                for key, (samples, counts) in pending.items():
+                    entry = self._pending.setdefault(key, [0, None])
+                    entry[0] += samples
+                    entry[1] = counts if entry[1] is None else entry[1] + counts
+                self._failed_flushes += 1
+            print(f"Warning: drift counter flush failed: {e}")
+            return 0
+        with self._lock:
+            self._flushes += 1
+        return len(buckets)
+
+    def pending_counts(
+        self, merchant_id: str, model_version: int, since: datetime
+    ) -> Tuple[int, Dict[str, Dict[int, int]]]:
+        """Not yet flushed requests of one merchant since `since` and their
+        per-feature bin counts, in window_counts' form."""
+        with self._lock:
+            entries = [
+                (samples, counts) for (merchant, version, hour), (samples, counts) in self._pending.items()
+                if merchant == merchant_id and version == model_version and hour >= since
+            ]
+        plan = self._plans.get(model_version)
+        total, merged = 0, {}
+        for samples, counts in entries:
+            total += samples
+            for row, col in zip(*np.nonzero(counts)):
+                bins = merged.setdefault(plan.features[row], {})
+                bins[int(col)] = bins.get(int(col), 0) + int(counts[row, col])
+        return total, merged
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def start(self, session_factory):
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        self._session_factory = session_factory
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="drift-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher thread after a final flush."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stop.set()
+        thread.join(timeout=30)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending_buckets": len(self._pending),
+                "added_rows": self._added,
+                "flushes": self._flushes,
+                "failed_flushes": self._failed_flushes,
+            }
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush_with_new_session()
+        self._flush_with_new_session()
+
+    def _flush_with_new_session(self):
+        db = self._session_factory()
+        try:
+            self.flush(db)
+        finally:
+            db.close()
+
+
+def drift_window_start(window: str = "week", hours: Optional[int] = None,
+                       now: Optional[datetime] = None) -> datetime:
+    """Start of a report window: the last `hours` hours, or a named window.
+
+    Whole buckets are summed, so the window reaches back to the start of
+    the hour it begins in."""
+    now = now or datetime.utcnow()
+    span = timedelta(hours=hours) if hours else DRIFT_WINDOWS[window]
+    return bucket_start(now - span)
+
+
+def window_counts(
+    db: Session,
+    merchant_id: str,
+    model_version: int,
+    since: datetime,
+    accumulator: Optional[DriftAccumulator] = None,
+) -> Tuple[int, Dict[str, Dict[int, int]]]:
+    """Requests scored since `since` and their summed per-feature bin counts,
+    plus the pending counters of `accumulator` (read-only: nothing is
+    flushed)."""
+    scope = (
+        DriftBucket.merchant_id == merchant_id,
+        DriftBucket.model_version == model_version,
+        DriftBucket.bucket_start >= since,
+    )
+    samples = db.execute(select(func.coalesce(func.sum(DriftBucket.samples), 0)).where(*scope)).scalar()
+
+    counts: Dict[str, Dict[int, int]] = {}
+    rows = db.execute(
+        select(DriftBinCount.feature, DriftBinCount.bin, func.sum(DriftBinCount.count))
+        .where(
+            DriftBinCount.merchant_id == merchant_id,
+            DriftBinCount.model_version == model_version,
+            DriftBinCount.bucket_start >= since,
+        )
+        .group_by(DriftBinCount.feature, DriftBinCount.bin)
+    )
+    for feature, bin_index, count in rows:
+        counts.setdefault(feature, {})[bin_index] = int(count)
+    samples = int(samples)
+
+    if accumulator is not None:
+        pending_samples, pending = accumulator.pending_counts(merchant_id, model_version, since)
+        samples += pending_samples
+        for feature, bins in pending.items():
+            merged = counts.setdefault(feature, {})
+            for bin_index, count in bins.items():
+                merged[bin_index] = merged.get(bin_index, 0) + count
+    return samples, counts
+
+
+def rebuild_drift_buckets(
+    db: Session, model_version: int, histograms: Dict[str, Dict], since: datetime
+) -> int:
+    """Recount stored feature vectors scored by model_version since `since`
+    (e.g. after upgrading); replaces existing buckets in that range.
+    Returns the number of requests counted."""
+    for model in (DriftBucket, DriftBinCount):
+        db.query(model).filter(
+            model.model_version == model_version, model.bucket_start >= bucket_start(since)
+        ).delete(synchronize_session=False)
+    db.commit()
+
+    accumulator = DriftAccumulator(flush_interval_s=0)
+    feature_columns = [getattr(ReturnFeatures, name) for name in FEATURE_COLUMNS]
+    result = db.execute(
+        select(ReturnFeatures.merchant_id, ReturnFeatures.scored_at, *feature_columns)
+        .where(
+            ReturnFeatures.model_version == model_version,
+            ReturnFeatures.scored_at >= bucket_start(since),
+        )
+        .order_by(ReturnFeatures.merchant_id)
+    )
+    counted = 0
+    for merchant_id, group in groupby(result, key=itemgetter(0)):
+        chunk = list(group)
+        matrix = np.array([row[2:] for row in chunk], dtype=np.float64)
+        accumulator.add(merchant_id, model_version, histograms, [row[1] for row in chunk], matrix)
+        counted += len(chunk)
+    accumulator.flush(db)
+    return counted
+
+
+drift_accumulator = DriftAccumulator(settings.drift_flush_interval_s)
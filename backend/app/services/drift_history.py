@@ -0,0 +1,178 @@
+"""Scheduled drift snapshots.
+
+DriftSnapshotJob runs inside the API lifespan. Every
+DRIFT_SNAPSHOT_INTERVAL_S it computes, for every merchant with traffic,
+the PSI of each feature over the last DRIFT_SNAPSHOT_WINDOW_HOURS from the
+streaming drift counters (app.services.drift) and appends the results to
+drift_snapshots. All merchants and features are scored with one
+compute_psi_matrix call over a (merchants, features, bins) count array.
+/models/drift/history serves the stored series for charting.
+
+Every API worker runs the job, so each snapshot is stamped with the start
+of its interval and claimed first by inserting a drift_snapshot_runs row
+for that time: the primary key admits one worker per interval, and the
+others skip it without computing anything.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.ml.explain import compute_psi_matrix
+from app.ml.predict import get_predictor
+from app.models.drift import DriftBinCount, DriftBucket, DriftSnapshot, DriftSnapshotRun
+from app.models.return_features import FEATURE_COLUMNS
+from app.services.drift import drift_accumulator, drift_window_start
+
+settings = get_settings()
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def snapshot_drift(
+    db: Session,
+    model_version: int,
+    histograms: Dict[str, Dict],
+    window_hours: int,
+    now: Optional[datetime] = None,
+) -> int:
+    """Store per-feature PSI of every merchant's recent traffic; returns the
+    number of merchants snapshotted."""
+    now = now or datetime.utcnow()
+    since = drift_window_start(hours=window_hours, now=now)
+
+    features = [name for name in FEATURE_COLUMNS if name in histograms]
+    feature_index = {name: i for i, name in enumerate(features)}
+    n_bins = max((len(histograms[name]["proportions"]) for name in features), default=0)
+    train = np.zeros((len(features), n_bins))
+    for i, name in enumerate(features):
+        proportions = histograms[name]["proportions"]
+        train[i, :len(proportions)] = proportions
+
+    samples = dict(db.execute(
+        select(DriftBucket.merchant_id, func.sum(DriftBucket.samples))
+        .where(DriftBucket.model_version == model_version, DriftBucket.bucket_start >= since)
+        .group_by(DriftBucket.merchant_id)
+    ).all())
+    if not samples or not features:
+        return 0
+    merchants = sorted(samples)
+    merchant_index = {merchant_id: i for i, merchant_id in enumerate(merchants)}
+
+    counts = np.zeros((len(merchants), len(features), n_bins))
+    rows = db.execute(
+        select(DriftBinCount.merchant_id, DriftBinCount.feature, DriftBinCount.bin,
+               func.sum(DriftBinCount.count))
+        .where(DriftBinCount.model_version == model_version, DriftBinCount.bucket_start >= since)
+        .group_by(DriftBinCount.merchant_id, DriftBinCount.feature, DriftBinCount.bin)
+    )
+    for merchant_id, feature, bin_index, count in rows:
+        if feature in feature_index and bin_index < n_bins:
+            counts[merchant_index[merchant_id], feature_index[feature], bin_index] = count
+
+    psi = compute_psi_matrix(train, counts)
+    observed = counts.sum(axis=-1) > 0
+    db.execute(insert(DriftSnapshot), [
+        {
+            "merchant_id": merchants[m],
+            "model_version": model_version,
+            "computed_at": now,
+            "window_hours": window_hours,
+            "samples": int(samples[merchants[m]]),
+            "feature": features[f],
+            "psi": float(psi[m, f]),
+        }
+        for m, f in zip(*np.nonzero(observed))
+    ])
+    db.commit()
+    return len(merchants)
+
+
+class DriftSnapshotJob:
+    """Background thread that snapshots drift on a fixed interval."""
+
+    def __init__(self, interval_s: float, window_hours: int):
+        self.interval = interval_s
+        self.window_hours = window_hours
+        self._session_factory = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._runs = 0
+        self._skipped = 0
+        self._last_run_at: Optional[datetime] = None
+        self._last_merchants = 0
+
+    def start(self, session_factory):
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._session_factory = session_factory
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="drift-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stop.set()
+        thread.join(timeout=30)
+
+    def interval_start(self, now: datetime) -> datetime:
+        """Start of the snapshot interval `now` falls in."""
+        elapsed = (now - _EPOCH).total_seconds()
+        return _EPOCH + timedelta(seconds=elapsed - elapsed % self.interval)
+
+    def run_once(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Snapshot the current interval, unless a worker process already
+        claimed it."""
+        computed_at = self.interval_start(now or datetime.utcnow())
+        state = get_predictor().state
+        histograms = state.histograms
+        if state.version is None or not histograms:
+            return 0
+
+        db.add(DriftSnapshotRun(computed_at=computed_at, model_version=state.version))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            self._skipped += 1
+            return 0
+
+        drift_accumulator.flush(db)
+        merchants = snapshot_drift(db, state.version, histograms, self.window_hours, computed_at)
+        self._runs += 1
+        self._last_run_at = computed_at
+        self._last_merchants = merchants
+        return merchants
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_s": self.interval,
+            "runs": self._runs,
+            "skipped": self._skipped,
+            "last_run_at": self._last_run_at.isoformat() if self._last_run_at else None,
+            "last_merchants": self._last_merchants,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = self._session_factory()
+            try:
+                self.run_once(db)
+            except Exception as e:
+                db.rollback()
+                print(f"Warning: drift snapshot failed: {e}")
+            finally:
+                db.close()
+
+
+drift_snapshot_job = DriftSnapshotJob(
+    settings.drift_snapshot_interval_s, settings.drift_snapshot_window_hours
+)
@@ -0,0 +1,129 @@
+"""Typed storage of the feature vectors return requests were scored with.
+
+Scoring writes each request's encoded model inputs to return_features
+(one float column per feature, see app.models.return_features) next to
+the return_requests row. Drift monitoring and feedback retraining select
+those columns straight into a NumPy matrix instead of parsing a JSON
+snapshot per row.
+
+Databases from before the table existed kept the raw features in
+return_requests.features_snapshot; backfill_return_features() encodes
+those once on startup.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.ml.features import FeatureExtractor
+from app.models.return_features import FEATURE_COLUMNS, VELOCITY_COLUMNS, ReturnFeatures
+from app.models.return_request import ReturnRequest, ReturnDecision
+
+# Key under which a scored row carries its encoded feature vector
+FEATURES_KEY = "features"
+
+BACKFILL_CHUNK_SIZE = 1000
+
+_FEATURE_ATTRS = [getattr(ReturnFeatures, name) for name in FEATURE_COLUMNS]
+
+
+def feature_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """return_features rows for scored return_requests rows that carry a
+    vector. Velocity counts are taken from the row's VELOCITY_COLUMNS keys."""
+    result = []
+    for row in rows:
+        vector = row.get(FEATURES_KEY)
+        if vector is None:
+            continue
+        values = dict(zip(FEATURE_COLUMNS, np.asarray(vector, dtype=float).tolist()))
+        values.update(
+            return_request_id=row["id"],
+            merchant_id=row["merchant_id"],
+            model_version=row["model_version"],
+            scored_at=row["request_date"],
+        )
+        values.update((name, row.get(name)) for name in VELOCITY_COLUMNS)
+        result.append(values)
+    return result
+
+
+def _to_matrix(rows, n_columns: int) -> np.ndarray:
+    # NULL feature values come through as NaN
+    return np.array(rows, dtype=np.float64).reshape(len(rows), n_columns)
+
+
+def feedback_feature_matrix(db: Session) -> Tuple[np.ndarray, np.ndarray]:
+    """Feature matrix and labels of return requests a merchant decided.
+
+    decided_by == "system" means the model decided; anything else is a
+    merchant action and counts as ground truth. approved -> 1, denied -> 0.
+    """
+    label = case((ReturnRequest.decision == ReturnDecision.APPROVED, 1), else_=0)
+    rows = db.execute(
+        select(*_FEATURE_ATTRS, label)
+        .join(ReturnRequest, ReturnRequest.id == ReturnFeatures.return_request_id)
+        .where(
+            ReturnRequest.decided_by.isnot(None),
+            ReturnRequest.decided_by != "system",
+            ReturnRequest.decision.in_([ReturnDecision.APPROVED, ReturnDecision.DENIED]),
+        )
+    ).all()
+    matrix = _to_matrix(rows, len(FEATURE_COLUMNS) + 1)
+    return matrix[:, :-1], matrix[:, -1].astype(int)
+
+
+def backfill_return_features(
+    db: Session, extractor: Optional[FeatureExtractor] = None
+) -> int:
+    """Encode legacy JSON snapshots that have no return_features row yet;
+    returns rows written. Snapshots that fail to parse are skipped."""
+    extractor = extractor or FeatureExtractor()
+    written = 0
+    last_id = ""
+    while True:
+        chunk = db.execute(
+            select(
+                ReturnRequest.id, ReturnRequest.merchant_id, ReturnRequest.model_version,
+                func.coalesce(ReturnRequest.request_date, ReturnRequest.created_at).label("scored_at"),
+                ReturnRequest.features_snapshot,
+            )
+            .outerjoin(ReturnFeatures, ReturnFeatures.return_request_id == ReturnRequest.id)
+            .where(
+                ReturnRequest.features_snapshot.isnot(None),
+                ReturnFeatures.return_request_id.is_(None),
+                ReturnRequest.id > last_id,
+            )
+            .order_by(ReturnRequest.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not chunk:
+            return written
+        last_id = chunk[-1].id
+
+        rows, snapshots = [], []
+        for row in chunk:
+            snapshot = row.features_snapshot
+            if isinstance(snapshot, str):
+                # Text written before the column held native JSON
+                try:
+                    snapshot = json.loads(snapshot)
+                except json.JSONDecodeError:
+                    continue
+            if not isinstance(snapshot, dict):
+                continue
+            snapshots.append(snapshot)
+            rows.append({
+                "id": row.id,
+                "merchant_id": row.merchant_id,
+                "model_version": row.model_version,
+                "request_date": row.scored_at,
+                **{name: snapshot.get(name) for name in VELOCITY_COLUMNS},
+            })
+        if rows:
+            for row, vector in zip(rows, extractor.extract_batch(snapshots)):
+                row[FEATURES_KEY] = vector
+            db.execute(insert(ReturnFeatures), feature_rows(rows))
+            db.commit()
+            written += len(rows)
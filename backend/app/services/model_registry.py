@@ -0,0 +1,80 @@
+"""Blob retention for the scoring_models registry.
+
+Every retrain registers another model bundle. Only the newest
+REGISTRY_RETENTION_VERSIONS versions, the active one and any pinned ones
+keep their blob; gc_model_blobs() clears the rest, leaving the metadata
+row (metrics, training counts) in place for the registry table.
+
+compress_model_blobs() rewrites blobs stored before registry compression
+existed; it runs once per blob on startup.
+"""
+import os
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.ml.train import default_model_path, dump_bundle, load_bundle
+from app.models.scoring_model import ScoringModel
+
+settings = get_settings()
+
+
+def store_blob(record: ScoringModel, blob: bytes):
+    record.model_blob = blob
+    record.blob_size = len(blob)
+
+
+def write_model_artifact(record: ScoringModel, path: Optional[str] = None) -> str:
+    """Write a registry version's blob as the serving artifact. The file is
+    replaced atomically, so a process loading it concurrently sees either
+    the old or the new bundle."""
+    path = path or default_model_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f"{path}.tmp-{os.getpid()}"
+    with open(staging, "wb") as f:
+        f.write(record.model_blob)
+    os.replace(staging, path)
+    return path
+
+
+def gc_model_blobs(db: Session, keep: Optional[int] = None) -> int:
+    """Clear the blobs of versions outside the retention policy; returns
+    how many were collected."""
+    keep = settings.registry_retention_versions if keep is None else keep
+    retained = [
+        version for (version,) in
+        db.query(ScoringModel.version).order_by(ScoringModel.version.desc()).limit(keep)
+    ] if keep > 0 else []
+
+    query = db.query(ScoringModel).filter(
+        ScoringModel.model_blob.isnot(None),
+        ScoringModel.is_active.isnot(True),
+        ScoringModel.is_pinned.isnot(True),
+    )
+    if retained:
+        query = query.filter(ScoringModel.version.notin_(retained))
+    collected = query.update(
+        {"model_blob": None, "blob_size": None}, synchronize_session=False
+    )
+    db.commit()
+    return collected
+
+
+def compress_model_blobs(db: Session) -> int:
+    """Recompress blobs written before compression (blob_size not yet
+    recorded), one at a time; returns how many were rewritten."""
+    ids = [
+        record_id for (record_id,) in db.query(ScoringModel.id).filter(
+            ScoringModel.model_blob.isnot(None), ScoringModel.blob_size.is_(None)
+        )
+    ]
+    for record_id in ids:
+        record = db.get(ScoringModel, record_id)
+        try:
+            store_blob(record, dump_bundle(load_bundle(record.model_blob)))
+        except Exception as e:
+            print(f"Warning: Could not recompress model v{record.version}: {e}")
+            record.blob_size = len(record.model_blob)
+        db.commit()  # also expires the record, releasing the blob
+    return len(ids)
@@ -0,0 +1,107 @@
+"""Cross-worker convergence on the registry's active model version.
+
+A retrain or bootstrap hot-swaps the model only in the process that ran
+it. ModelVersionWatcher runs in every API worker and, every
+REGISTRY_POLL_INTERVAL_S seconds, reads the active version from
+scoring_models (one single-row query on a small table; requests never
+touch the registry). When it differs from the version being served, the worker
+reloads the serving artifact, first restoring it from the registry blob
+if the file on this host holds another version (another replica
+retrained). Every worker of every replica therefore serves the active
+version within one poll interval plus a model load.
+"""
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.ml.predict import get_predictor
+from app.models.scoring_model import ScoringModel
+from app.services.model_registry import write_model_artifact
+
+settings = get_settings()
+
+
+class ModelVersionWatcher:
+    """Background thread that follows the registry's active version."""
+
+    def __init__(self, interval_s: float):
+        self.interval = interval_s
+        self._session_factory = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._checks = 0
+        self._reloads = 0
+        self._restores = 0
+        self._last_reload_at: Optional[datetime] = None
+
+    def start(self, session_factory):
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._session_factory = session_factory
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-version-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stop.set()
+        thread.join(timeout=30)
+
+    def check(self, db: Session) -> bool:
+        """Switch to the active version if it is not being served; returns
+        whether the model was reloaded."""
+        self._checks += 1
+        active = (
+            db.query(ScoringModel.id, ScoringModel.version)
+            .filter(ScoringModel.is_active == True)
+            .order_by(ScoringModel.version.desc())
+            .first()
+        )
+        predictor = get_predictor()
+        if active is None or active.version == predictor.version:
+            return False
+
+        # Another worker on this host may already have written the artifact
+        predictor.reload()
+        if predictor.version != active.version:
+            record = db.get(ScoringModel, active.id)
+            if record.model_blob is None:
+                print(f"Warning: active model v{active.version} has no blob to restore")
+                return False
+            write_model_artifact(record)
+            predictor.reload()
+            self._restores += 1
+        self._reloads += 1
+        self._last_reload_at = datetime.utcnow()
+        print(f"Switched to scoring model v{predictor.version}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_s": self.interval,
+            "serving_version": get_predictor().version,
+            "checks": self._checks,
+            "reloads": self._reloads,
+            "restores": self._restores,
+            "last_reload_at": self._last_reload_at.isoformat() if self._last_reload_at else None,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = self._session_factory()
+            try:
+                self.check(db)
+            except Exception as e:
+                db.rollback()
+                print(f"Warning: model version check failed: {e}")
+            finally:
+                db.close()
+
+
+model_version_watcher = ModelVersionWatcher(settings.registry_poll_interval_s)
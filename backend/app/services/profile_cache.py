@@ -0,0 +1,116 @@
+"""In-process read-through cache of buyer and product profiles.
+
+Scoring reads the same buyer and product rows on every request, but they
+only change when the merchant syncs or updates them. The scoring engine
+keeps immutable snapshots of the fields it needs here, keyed by
+(merchant_id, external_id); the buyers/products routers invalidate
+entries they write. The TTL bounds staleness across API worker
+processes, which each hold their own cache.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from app.config import get_settings
+from app.models.buyer import Buyer
+from app.models.product import Product, PriceTier, ProductCategory, CATEGORY_RISK_SCORES
+from app.services.ttl_cache import T, TTLCache
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class BuyerProfile:
+    """Feature-relevant snapshot of a Buyer row."""
+
+    id: str
+    external_buyer_id: str
+    total_orders: int
+    total_returns: int
+    total_reviews: int
+    avg_review_score: float
+    total_spend: float
+    account_created_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, buyer: Buyer) -> "BuyerProfile":
+        return cls(
+            id=buyer.id,
+            external_buyer_id=buyer.external_buyer_id,
+            total_orders=buyer.total_orders or 0,
+            total_returns=buyer.total_returns or 0,
+            total_reviews=buyer.total_reviews or 0,
+            avg_review_score=buyer.avg_review_score or 0.0,
+            total_spend=buyer.total_spend or 0.0,
+            account_created_at=buyer.account_created_at,
+        )
+
+    @property
+    def return_rate(self) -> float:
+        if self.total_orders == 0:
+            return 0.0
+        return self.total_returns / self.total_orders
+
+    @property
+    def account_age_days(self) -> int:
+        # Computed on read so cached profiles still age
+        if not self.account_created_at:
+            return 0
+        return (datetime.utcnow() - self.account_created_at).days
+
+
+@dataclass(frozen=True)
+class ProductProfile:
+    """Feature-relevant snapshot of a Product row."""
+
+    id: str
+    external_product_id: str
+    category: ProductCategory
+    price: float
+    price_tier: Optional[PriceTier]
+    custom_return_window: Optional[int]
+    total_sold: int
+    total_returned: int
+
+    @classmethod
+    def from_model(cls, product: Product) -> "ProductProfile":
+        return cls(
+            id=product.id,
+            external_product_id=product.external_product_id,
+            category=product.category or ProductCategory.OTHER,
+            price=product.price or 0.0,
+            price_tier=product.price_tier,
+            custom_return_window=product.custom_return_window,
+            total_sold=product.total_sold or 0,
+            total_returned=product.total_returned or 0,
+        )
+
+    @property
+    def return_rate(self) -> float:
+        if self.total_sold == 0:
+            return 0.0
+        return self.total_returned / self.total_sold
+
+    @property
+    def category_risk_score(self) -> float:
+        return CATEGORY_RISK_SCORES.get(self.category, 0.5)
+
+
+class ProfileCache(TTLCache[T]):
+    """TTLCache keyed by (merchant_id, external_id)."""
+
+    def invalidate(self, merchant_id: str, external_ids: Iterable[str]):
+        for external_id in external_ids:
+            self.discard((merchant_id, external_id))
+
+
+buyer_profiles: ProfileCache[BuyerProfile] = ProfileCache(
+    settings.profile_cache_size, settings.profile_cache_ttl_s
+)
+product_profiles: ProfileCache[ProductProfile] = ProfileCache(
+    settings.profile_cache_size, settings.profile_cache_ttl_s
+)
+
+
+def profile_cache_stats() -> Dict[str, Any]:
+    return {"buyers": buyer_profiles.stats(), "products": product_profiles.stats()}
@@ -0,0 +1,241 @@
+"""Asynchronous, single-flight model retraining.
+
+POST /models/retrain only records a RetrainJob and returns it; the
+training runs on a background thread of the worker that accepted it,
+which writes the job's stage and progress to its row for
+GET /models/jobs/{id}.
+
+One training at a time across all workers: an unfinished job holds
+retrain_jobs.active = 1, which the column's unique constraint admits
+once. A retrain request while a job is queued or running gets that job
+back (coalesced) instead of starting another, so version numbers never
+race. A job whose heartbeat (updated_at) is older than
+RETRAIN_JOB_STALE_S is treated as abandoned by a dead worker and failed,
+freeing the slot. Its thread may still be alive (just slow): it registers
+its model only while its job still holds the slot, and stops writing to
+the job row once it does not.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.ml.predict import get_predictor
+from app.ml.train import ModelTrainer
+from app.models.retrain_job import RetrainJob
+from app.models.scoring_model import ScoringModel
+from app.services.feature_store import feedback_feature_matrix
+from app.services.model_registry import gc_model_blobs, store_blob
+
+settings = get_settings()
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+SYNTHETIC_SAMPLES = 5000
+
+# Minimum seconds between progress writes within one stage
+PROGRESS_WRITE_INTERVAL_S = 1.0
+
+
+def retrain_and_activate(
+    db: Session,
+    progress: Optional[Callable[[str, float], None]] = None,
+    job_id: Optional[str] = None,
+) -> Tuple[int, Dict[str, Any], int]:
+    """Train on synthetic data plus merchant feedback, register the result
+    as the active version and serve it. Returns (version, metrics,
+    feedback samples).
+
+    With a job_id, the model is registered only if that job is still
+    active; otherwise a RuntimeError is raised and nothing is registered.
+    """
+    report = progress or (lambda stage, fraction: None)
+    report("collecting_feedback", 0.0)
+    feedback_matrix, feedback_labels = feedback_feature_matrix(db)
+
+    max_version = db.query(ScoringModel).order_by(ScoringModel.version.desc()).first()
+    new_version = (max_version.version + 1) if max_version else 1
+
+    trainer = ModelTrainer()
+    metrics = trainer.train(
+        n_synthetic_samples=SYNTHETIC_SAMPLES,
+        feedback_matrix=feedback_matrix,
+        feedback_labels=feedback_labels,
+        version=new_version,
+        run_cv=False,
+        progress=report,
+    )
+
+    # Register in DB (durable) and write the serving artifact (fast path)
+    report("registering", 0.9)
+    if job_id is not None:
+        # Claim the job row in the registering transaction: expiry has to
+        # wait for the commit, and an already expired job matches nothing
+        held = db.query(RetrainJob).filter(
+            RetrainJob.id == job_id, RetrainJob.active == 1
+        ).update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+        if not held:
+            db.rollback()
+            raise RuntimeError(f"Job {job_id} expired before version {new_version} was registered")
+    db.query(ScoringModel).filter(ScoringModel.is_active == True).update(
+        {"is_active": False}
+    )
+    record = ScoringModel(
+        version=new_version,
+        model_type="gradient_boosting",
+        features_used=json.dumps(trainer.feature_extractor.feature_names),
+        training_samples=metrics["training_samples"],
+        feedback_samples=metrics["feedback_samples"],
+        accuracy=metrics["accuracy"],
+        precision_score=metrics["precision"],
+        recall_score=metrics["recall"],
+        f1_score=metrics["f1"],
+        roc_auc=metrics["roc_auc"],
+        is_active=True,
+        trained_at=datetime.utcnow(),
+    )
+    store_blob(record, trainer.serialize_bundle())
+    db.add(record)
+    db.commit()
+
+    report("activating", 0.95)
+    trainer.save_model()
+    get_predictor().reload()
+    gc_model_blobs(db)
+    return new_version, metrics, len(feedback_labels)
+
+
+class RetrainJobRunner:
+    """Accepts retrain requests and runs each job on its own thread."""
+
+    def __init__(self, stale_s: float):
+        self.stale_s = stale_s
+        self._session_factory = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._coalesced = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._expired = 0
+
+    @property
+    def running(self) -> bool:
+        return self._session_factory is not None
+
+    def start(self, session_factory):
+        self._session_factory = session_factory
+
+    def stop(self):
+        """Stop accepting jobs and wait for a running training to finish
+        (it cannot be interrupted)."""
+        self._session_factory = None
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=120)
+            self._thread = None
+
+    def submit(self, db: Session, merchant_id: Optional[str]) -> Tuple[RetrainJob, bool]:
+        """The job that will produce the next model, and whether it is one
+        already queued or running (the request was coalesced onto it)."""
+        session_factory = self._session_factory
+        if session_factory is None:
+            raise RuntimeError("Retrain job runner is not running")
+        with self._lock:
+            self._expire_stale(db)
+            while True:
+                job = RetrainJob(merchant_id=merchant_id, status=QUEUED, active=1)
+                db.add(job)
+                try:
+                    db.commit()
+                    break
+                except IntegrityError:
+                    db.rollback()
+                existing = db.query(RetrainJob).filter(RetrainJob.active == 1).first()
+                if existing is not None:
+                    self._coalesced += 1
+                    return existing, True
+                # The unfinished job completed in between: try again
+
+            self._submitted += 1
+            self._thread = threading.Thread(
+                target=self._execute, args=(session_factory, job.id), name="retrain-job", daemon=True
+            )
+            self._thread.start()
+            return job, False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "submitted": self._submitted,
+            "coalesced": self._coalesced,
+            "succeeded": self._succeeded,
+            "failed": self._failed,
+            "expired": self._expired,
+            "training": self._thread is not None and self._thread.is_alive(),
+        }
+
+    def _expire_stale(self, db: Session):
+        now = datetime.utcnow()
+        expired = db.query(RetrainJob).filter(
+            RetrainJob.active == 1,
+            RetrainJob.updated_at < now - timedelta(seconds=self.stale_s),
+        ).update({
+            "status": FAILED,
+            "active": None,
+            "error": "Abandoned: no progress reported (worker stopped?)",
+            "finished_at": now,
+        }, synchronize_session=False)
+        if expired:
+            db.commit()
+            self._expired += expired
+
+    def _execute(self, session_factory, job_id: str):
+        def update(**values):
+            # No-op once the job expired: it was failed and its slot reused
+            db = session_factory()
+            try:
+                db.query(RetrainJob).filter(
+                    RetrainJob.id == job_id, RetrainJob.active == 1
+                ).update({**values, "updated_at": datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+        last = {"stage": None, "at": 0.0}
+
+        def progress(stage: str, fraction: float):
+            now = time.monotonic()
+            if stage == last["stage"] and now - last["at"] < PROGRESS_WRITE_INTERVAL_S:
+                return
+            last.update(stage=stage, at=now)
+            update(stage=stage, progress=round(fraction, 3))
+
+        db = session_factory()
+        try:
+            update(status=RUNNING, started_at=datetime.utcnow())
+            version, metrics, feedback_samples = retrain_and_activate(db, progress, job_id)
+            update(
+                status=SUCCEEDED, stage="done", progress=1.0, active=None,
+                version=version, metrics=metrics, feedback_samples=feedback_samples,
+                finished_at=datetime.utcnow(),
+            )
+            self._succeeded += 1
+        except Exception as e:
+            db.rollback()
+            print(f"Warning: retrain job {job_id} failed: {e}")
+            self._failed += 1
+            try:
+                update(status=FAILED, active=None, error=str(e), finished_at=datetime.utcnow())
+            except Exception as update_error:
+                # The job keeps its slot until it expires as stale
+                print(f"Warning: could not mark retrain job {job_id} failed: {update_error}")
+        finally:
+            db.close()
+
+
+retrain_jobs = RetrainJobRunner(settings.retrain_job_stale_s)
@@ -0,0 +1,268 @@
+"""Persistence of scored return requests, inline or write-behind.
+
+write_scored_returns() is the single writer for scoring results: it bulk
+inserts return_requests rows, their return_velocity_events and their
+return_features (encoded model inputs) with one executemany each, and
+adds them to the merchant_daily_stats rollups, inside the caller's
+transaction.
+
+With WRITE_BEHIND_MODE set, /score responds right after scoring (the
+request_id is pre-generated) and the rows go onto a bounded in-process
+queue. A background thread flushes them every WRITE_BEHIND_FLUSH_MS or
+every WRITE_BEHIND_BATCH_SIZE rows, whichever comes first.
+
+Durability:
+  "async"         respond before the rows are written; a crash loses at
+                  most one flush interval of accepted requests.
+  "group_commit"  callers wait for the flush that contains their rows, so
+                  a response still means committed, but many requests
+                  share one transaction and fsync.
+
+Backpressure: if the queue stays full for WRITE_BEHIND_BLOCK_MS, the
+caller writes its rows synchronously instead. stop() (called from the
+lifespan handler) drains the queue before shutdown.
+"""
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.return_request import ReturnRequest
+from app.models.return_velocity import ReturnVelocityEvent
+from app.models.return_features import VELOCITY_COLUMNS, ReturnFeatures
+from app.services.daily_stats import record_scored_returns
+from app.services.feature_store import FEATURES_KEY, feature_rows
+
+settings = get_settings()
+
+WRITE_BEHIND_MODES = ("off", "async", "group_commit")
+
+_RETURN_COLUMNS = [c.name for c in ReturnRequest.__table__.columns]
+
+
+def return_request_row(
+    record: ReturnRequest,
+    features: Optional[np.ndarray] = None,
+    raw_features: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Column values of an unsaved ReturnRequest, for bulk insert, plus the
+    encoded feature vector it was scored with (if any) and the velocity
+    counts from its raw features, for its return_features row."""
+    row = {name: getattr(record, name) for name in _RETURN_COLUMNS}
+    row[FEATURES_KEY] = features
+    raw_features = raw_features or {}
+    row.update((name, raw_features.get(name)) for name in VELOCITY_COLUMNS)
+    now = datetime.utcnow()
+    # Every row must carry the same keys, so fill the Python-side defaults
+    row["request_date"] = row["request_date"] or now
+    row["created_at"] = row["created_at"] or now
+    row["updated_at"] = row["updated_at"] or now
+    return row
+
+
+def write_scored_returns(db: Session, rows: List[Dict[str, Any]]):
+    """Insert scored return requests, their velocity events and their
+    feature vectors, and count them in the daily rollups (no commit)."""
+    if not rows:
+        return
+    # Bulk ORM inserts only take mapped columns, so FEATURES_KEY is ignored here
+    db.execute(insert(ReturnRequest), rows)
+    db.execute(insert(ReturnVelocityEvent), [
+        {
+            "return_request_id": row["id"],
+            "merchant_id": row["merchant_id"],
+            "buyer_id": row["buyer_id"],
+            "occurred_at": row["request_date"],
+        }
+        for row in rows
+    ])
+    features = feature_rows(rows)
+    if features:
+        db.execute(insert(ReturnFeatures), features)
+    record_scored_returns(db, rows)
+
+
+class _Pending:
+    __slots__ = ("rows", "done", "error")
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Bounded queue of scored rows flushed in bulk by a background thread."""
+
+    def __init__(
+        self,
+        mode: str,
+        flush_ms: float,
+        batch_size: int,
+        max_size: int,
+        block_ms: float,
+    ):
+        if mode not in WRITE_BEHIND_MODES:
+            raise ValueError(f"write_behind_mode must be one of {WRITE_BEHIND_MODES}, got {mode!r}")
+        self.mode = mode
+        self.flush_interval = max(flush_ms, 0.0) / 1000
+        self.batch_size = max(batch_size, 1)
+        self.block = max(block_ms, 0.0) / 1000
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(max_size, 1))
+        self._session_factory = None
+        self._thread: Optional[threading.Thread] = None
+        # Held while checking `running` and enqueueing, and while stopping,
+        # so nothing lands in the queue after the stop marker
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._flushed = 0
+        self._flushes = 0
+        self._sync_fallbacks = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, session_factory):
+        if self.mode == "off" or self.running:
+            return
+        self._session_factory = session_factory
+        self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush everything queued so far and stop the writer thread."""
+        with self._submit_lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._thread = None  # new submissions fall back to synchronous writes
+            self._queue.put(_STOP)
+        thread.join(timeout=30)
+        # Anything the thread left behind (it timed out or died)
+        self._drain()
+
+    def submit(self, rows: List[Dict[str, Any]]) -> bool:
+        """Queue rows for writing. Returns False if the caller must write
+        them itself (writer stopped or queue full)."""
+        pending = _Pending(rows)
+        with self._submit_lock:
+            if not self.running:
+                return False
+            try:
+                self._queue.put(pending, timeout=self.block)
+            except queue.Full:
+                with self._stats_lock:
+                    self._sync_fallbacks += 1
+                return False
+        with self._stats_lock:
+            self._enqueued += len(rows)
+        if self.mode == "group_commit":
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "mode": self.mode,
+                "running": self.running,
+                "queued": self._queue.qsize(),
+                "enqueued_rows": self._enqueued,
+                "flushed_rows": self._flushed,
+                "flushes": self._flushes,
+                "avg_rows_per_flush": round(self._flushed / self._flushes, 2) if self._flushes else None,
+                "sync_fallbacks": self._sync_fallbacks,
+                "failed_rows": self._failed,
+            }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            n_rows = len(first.rows)
+            deadline = time.monotonic() + self.flush_interval
+            while n_rows < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                n_rows += len(item.rows)
+            self._flush(batch)
+
+        self._drain()
+
+    def _drain(self):
+        """Flush whatever is still queued (used when stopping)."""
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._flush(leftovers)
+
+    def _flush(self, batch: List[_Pending]):
+        if self._write([row for item in batch for row in item.rows]):
+            self._finish(batch)
+            return
+        # Isolate the bad item(s) so one poison row doesn't drop the batch
+        for item in batch:
+            if self._write(item.rows):
+                self._finish([item])
+            else:
+                item.error = RuntimeError("write-behind flush failed")
+                with self._stats_lock:
+                    self._failed += len(item.rows)
+                item.done.set()
+
+    def _write(self, rows: List[Dict[str, Any]]) -> bool:
+        db = self._session_factory()
+        try:
+            write_scored_returns(db, rows)
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            print(f"Warning: write-behind flush of {len(rows)} rows failed: {e}")
+            return False
+        finally:
+            db.close()
+
+    def _finish(self, items: List[_Pending]):
+        with self._stats_lock:
+            self._flushed += sum(len(item.rows) for item in items)
+            self._flushes += 1
+        for item in items:
+            item.done.set()
+
+
+score_writer = WriteBehindQueue(
+    mode=settings.write_behind_mode,
+    flush_ms=settings.write_behind_flush_ms,
+    batch_size=settings.write_behind_batch_size,
+    max_size=settings.write_behind_queue_size,
+    block_ms=settings.write_behind_block_ms,
+)
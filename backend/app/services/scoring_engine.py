@@ -1,12 +1,15 @@
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Iterable, Set
 from datetime import datetime
-import json
+import uuid
 
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models.merchant import Merchant
 from app.models.buyer import Buyer
-from app.models.product import Product, CATEGORY_RISK_SCORES
+from app.models.product import Product, PriceTier, ProductCategory
 from app.models.return_request import ReturnRequest, ReturnReason, ReturnDecision
 from app.schemas.scoring import (
     ScoreRequest,
@@ -15,23 +18,46 @@ from app.schemas.scoring import (
     Recommendation,
     RiskFlag,
     FeatureContribution,
+    BatchScoreItem,
 )
 from app.config import get_settings
 from app.ml.predict import get_predictor
+from app.services.auth import MerchantSnapshot
+from app.services.drift import drift_accumulator
+from app.services.profile_cache import (
+    BuyerProfile,
+    ProductProfile,
+    buyer_profiles,
+    product_profiles,
+)
+from app.services.score_writer import return_request_row, score_writer, write_scored_returns
+from app.services.velocity import VelocityCounts, velocity_tracker
 
 settings = get_settings()
 
+# Max IDs per IN (...) lookup / rows per multi-row INSERT; keeps SQLite under
+# its bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+# Returns within 24 hours that trip the RETURN_BURST flag
+RETURN_BURST_24H = 3
+
 
 class ScoringEngine:
     """Engine for calculating return eligibility scores."""
 
-    def __init__(self, db: Session, merchant: Merchant):
+    def __init__(self, db: Session, merchant: MerchantSnapshot):
         self.db = db
         self.merchant = merchant
         self.ml_predictor = get_predictor()
+        self._created_profiles = []  # (cache, key, profile) to cache after commit
 
     def calculate_score(self, request: ScoreRequest) -> ScoreResponse:
-        """Calculate the return eligibility score."""
+        """Calculate the return eligibility score.
+
+        Runs as a single transaction: missing buyer/product rows and the
+        return request are committed together.
+        """
         # Get buyer and product from database
         buyer = self._get_or_create_buyer(request.buyer_id)
         product = self._get_or_create_product(request.product_id)
@@ -39,20 +65,112 @@ class ScoringEngine:
         # Calculate days since order
         days_since_order = (datetime.utcnow() - request.order_date).days
 
-        # Determine return window
-        return_window = product.custom_return_window or self.merchant.default_return_window
-        within_window = days_since_order <= return_window
+        # Buyer's recent returns (in-memory sliding windows)
+        velocity = velocity_tracker.counts(self.db, [buyer.id])[buyer.id]
 
         # Extract features for ML model
-        features = self._extract_features(buyer, product, request, days_since_order)
+        features = self._extract_features(buyer, product, request, days_since_order, velocity)
+
+        # Get ML prediction and per-feature explanation, from one model
+        # even if a reload lands meanwhile
+        state = self.ml_predictor.state
+        ml_score, confidence = self.ml_predictor.predict(features, state)
+        explanation = self.ml_predictor.explain(features, state)
+        model_version = state.version
+
+        response, return_request = self._decide(
+            buyer, product, request, days_since_order, features,
+            ml_score, confidence, explanation, model_version, velocity
+        )
 
-        # Get ML prediction and per-feature explanation
-        ml_score, confidence = self.ml_predictor.predict(features)
-        explanation = self.ml_predictor.explain(features)
-        model_version = self.ml_predictor.version
+        self._persist([return_request], [features])
+        return response
+
+    def calculate_batch(self, requests: List[ScoreRequest]) -> List[BatchScoreItem]:
+        """Score many return requests with bulk lookups and one model call.
+
+        Buyers and products are resolved with one query per chunk, every
+        feature row goes through the model (and the explainer) as a single
+        matrix, and all return requests are persisted together (one
+        transaction, or one write-behind submission). Items that fail
+        are reported with their error, in request order; the rest are
+        still scored and saved.
+        """
+        buyers = self._get_or_create_buyers(r.buyer_id for r in requests)
+        products = self._get_or_create_products(r.product_id for r in requests)
+        velocity = velocity_tracker.counts(self.db, [b.id for b in buyers.values()])
+
+        outcomes = [BatchScoreItem(index=i) for i in range(len(requests))]
+        prepared = []  # (index, days_since_order, features, velocity)
+        for index, request in enumerate(requests):
+            buyer = buyers[request.buyer_id]
+            try:
+                days_since_order = (datetime.utcnow() - request.order_date).days
+                features = self._extract_features(
+                    buyer, products[request.product_id],
+                    request, days_since_order, velocity[buyer.id]
+                )
+            except Exception as e:
+                outcomes[index].error = str(e)
+                continue
+            prepared.append((index, days_since_order, features, velocity[buyer.id]))
+            # Later items for the same buyer see this return, as they would
+            # if the requests had been scored one call at a time
+            velocity[buyer.id] = velocity[buyer.id].incremented()
+
+        features_list = [f for _, _, f, _ in prepared]
+        state = self.ml_predictor.state
+        predictions = self.ml_predictor.batch_predict(features_list, state)
+        explanations = self.ml_predictor.explain_batch(features_list, state)
+        model_version = state.version
+
+        records, records_features = [], []
+        for (index, days_since_order, features, counts), (ml_score, confidence), explanation in zip(
+            prepared, predictions, explanations
+        ):
+            request = requests[index]
+            try:
+                response, return_request = self._decide(
+                    buyers[request.buyer_id], products[request.product_id], request,
+                    days_since_order, features, ml_score, confidence, explanation,
+                    model_version, counts
+                )
+            except Exception as e:
+                outcomes[index].error = str(e)
+                continue
+            records.append(return_request)
+            records_features.append(features)
+            outcomes[index].result = response
+
+        self._persist(records, records_features)
+        return outcomes
+
+    def _decide(
+        self,
+        buyer: BuyerProfile,
+        product: ProductProfile,
+        request: ScoreRequest,
+        days_since_order: int,
+        features: dict,
+        ml_score: float,
+        confidence: float,
+        explanation: list,
+        model_version: Optional[int],
+        velocity: VelocityCounts,
+    ) -> Tuple[ScoreResponse, ReturnRequest]:
+        """Turn a model score into a decision.
+
+        Applies risk flags and merchant thresholds, and returns the API
+        response together with the (not yet added) return request record.
+        """
+        # Determine return window
+        return_window = product.custom_return_window or self.merchant.default_return_window
+        within_window = days_since_order <= return_window
 
         # Detect risk flags
-        risk_flags = self._detect_risk_flags(buyer, product, request, days_since_order)
+        risk_flags = self._detect_risk_flags(
+            buyer, product, request, days_since_order, velocity
+        )
 
         # Adjust score based on risk flags
         adjusted_score = self._adjust_score(ml_score, risk_flags, within_window)
@@ -61,13 +179,12 @@ class ScoringEngine:
         risk_level = self._get_risk_level(adjusted_score)
         recommendation = self._get_recommendation(adjusted_score, risk_flags)
 
-        # Create return request record
-        return_request = self._create_return_request(
+        return_request = self._build_return_request(
             buyer, product, request, adjusted_score, risk_level, risk_flags,
-            confidence, recommendation, explanation, features, model_version
+            confidence, recommendation, explanation, model_version
         )
 
-        return ScoreResponse(
+        response = ScoreResponse(
             score=round(adjusted_score, 2),
             risk_level=risk_level,
             recommendation=recommendation,
@@ -81,56 +198,182 @@ class ScoringEngine:
             model_version=model_version,
             request_id=return_request.id,
         )
+        return response, return_request
 
-    def _get_or_create_buyer(self, external_buyer_id: str) -> Buyer:
-        """Get or create a buyer record."""
-        buyer = self.db.query(Buyer).filter(
-            Buyer.merchant_id == self.merchant.id,
-            Buyer.external_buyer_id == external_buyer_id
-        ).first()
-
-        if not buyer:
-            buyer = Buyer(
-                merchant_id=self.merchant.id,
-                external_buyer_id=external_buyer_id,
-            )
-            self.db.add(buyer)
+    def _get_or_create_buyer(self, external_buyer_id: str) -> BuyerProfile:
+        """Get or create a buyer record (cached profile snapshot, no commit)."""
+        return self._get_or_create_buyers([external_buyer_id])[external_buyer_id]
+
+    def _get_or_create_product(self, external_product_id: str) -> ProductProfile:
+        """Get or create a product record (cached profile snapshot, no commit)."""
+        return self._get_or_create_products([external_product_id])[external_product_id]
+
+    def _get_or_create_buyers(self, external_buyer_ids: Iterable[str]) -> Dict[str, BuyerProfile]:
+        """Bulk get-or-create keyed by external buyer ID (see _get_or_create)."""
+        return self._get_or_create(
+            Buyer, Buyer.external_buyer_id, BuyerProfile, buyer_profiles,
+            self._new_buyer_row, external_buyer_ids,
+        )
+
+    def _get_or_create_products(
+        self, external_product_ids: Iterable[str]
+    ) -> Dict[str, ProductProfile]:
+        """Bulk get-or-create keyed by external product ID (see _get_or_create)."""
+        return self._get_or_create(
+            Product, Product.external_product_id, ProductProfile, product_profiles,
+            self._new_product_row, external_product_ids,
+        )
+
+    def _get_or_create(self, model, external_column, profile_cls, cache, new_row, external_ids):
+        """Profiles for the given external IDs, creating missing rows.
+
+        Only cache misses are queried. Missing rows are inserted with
+        ON CONFLICT DO NOTHING on (merchant_id, external ID), so concurrent
+        first-time scores can't create duplicates: rows another transaction
+        inserted first are read back instead. Nothing is committed here,
+        and new rows are cached only once the caller has committed.
+        """
+        merchant_id = self.merchant.id
+        profiles = {}
+        misses = []
+        for ext_id in dict.fromkeys(external_ids):
+            cached = cache.get((merchant_id, ext_id))
+            if cached is not None:
+                profiles[ext_id] = cached
+            else:
+                misses.append(ext_id)
+        if not misses:
+            return profiles
+
+        profiles.update(self._load_profiles(model, external_column, profile_cls, cache, misses))
+        rows = [new_row(ext_id) for ext_id in misses if ext_id not in profiles]
+        if not rows:
+            return profiles
+
+        inserted = self._insert_missing(model, rows, ["merchant_id", external_column.key])
+        lost = []
+        for row in rows:
+            ext_id = row[external_column.key]
+            if row["id"] in inserted:
+                profile = profile_cls.from_model(model(**row))
+                profiles[ext_id] = profile
+                self._created_profiles.append((cache, (merchant_id, ext_id), profile))
+            else:
+                lost.append(ext_id)
+        if lost:
+            profiles.update(self._load_profiles(model, external_column, profile_cls, cache, lost))
+        return profiles
+
+    def _load_profiles(self, model, external_column, profile_cls, cache, external_ids):
+        """SELECT existing rows by external ID (chunked) and cache them."""
+        profiles = {}
+        for chunk in _chunks(external_ids):
+            for record in self.db.query(model).filter(
+                model.merchant_id == self.merchant.id,
+                external_column.in_(chunk)
+            ):
+                ext_id = getattr(record, external_column.key)
+                profile = profile_cls.from_model(record)
+                cache.put((self.merchant.id, ext_id), profile)
+                profiles[ext_id] = profile
+        return profiles
+
+    def _insert_missing(self, model, rows: List[dict], conflict_columns: List[str]) -> Set[str]:
+        """INSERT rows unless they already exist; returns the IDs inserted."""
+        inserted: Set[str] = set()
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            for chunk in _chunks(rows):
+                stmt = (
+                    insert(model)
+                    .values(chunk)
+                    .on_conflict_do_nothing(index_elements=conflict_columns)
+                    .returning(model.id)
+                )
+                inserted.update(self.db.execute(stmt).scalars())
+            return inserted
+
+        # Other databases: one savepoint per row
+        for row in rows:
+            try:
+                with self.db.begin_nested():
+                    self.db.add(model(**row))
+                inserted.add(row["id"])
+            except IntegrityError:
+                pass
+        return inserted
+
+    def _persist(self, records: List[ReturnRequest], features_list: List[dict]):
+        """Save scored return requests (with the feature vectors they were
+        scored on) and commit the scoring transaction.
+
+        Rows are bulk inserted in this transaction, or handed to the
+        write-behind queue when it is enabled. In that case only new
+        buyer/product rows are committed here, because the queued rows
+        reference them.
+        """
+        vectors = self.ml_predictor.feature_extractor.extract_batch(features_list) if records else []
+        rows = [
+            return_request_row(r, v, f) for r, v, f in zip(records, vectors, features_list)
+        ]
+        if score_writer.running:
             self.db.commit()
-            self.db.refresh(buyer)
-
-        return buyer
-
-    def _get_or_create_product(self, external_product_id: str) -> Product:
-        """Get or create a product record."""
-        product = self.db.query(Product).filter(
-            Product.merchant_id == self.merchant.id,
-            Product.external_product_id == external_product_id
-        ).first()
-
-        if not product:
-            from app.models.product import PriceTier, ProductCategory
-            product = Product(
-                merchant_id=self.merchant.id,
-                external_product_id=external_product_id,
-                name=f"Product {external_product_id}",
-                price=0.0,  # Unknown, will use default tier
-                price_tier=PriceTier.MEDIUM,
-                category=ProductCategory.OTHER,
-            )
-            self.db.add(product)
+            if not score_writer.submit(rows):
+                # Queue full (backpressure) or shutting down: write inline
+                write_scored_returns(self.db, rows)
+                self.db.commit()
+        else:
+            write_scored_returns(self.db, rows)
             self.db.commit()
-            self.db.refresh(product)
+        self._after_commit(rows, vectors)
+
+    def _after_commit(self, rows: List[dict], vectors: np.ndarray):
+        """Publish committed (or accepted) state to the in-process caches
+        and drift counters."""
+        for cache, key, profile in self._created_profiles:
+            cache.put(key, profile)
+        self._created_profiles.clear()
+        for row in rows:
+            velocity_tracker.record(row["buyer_id"], row["request_date"])
+        state = self.ml_predictor.state
+        if rows and rows[0]["model_version"] == state.version:
+            drift_accumulator.add(
+                self.merchant.id, state.version, state.histograms,
+                [row["request_date"] for row in rows], vectors,
+            )
 
-        return product
+    def _new_buyer_row(self, external_buyer_id: str) -> dict:
+        return {
+            "id": str(uuid.uuid4()),
+            "merchant_id": self.merchant.id,
+            "external_buyer_id": external_buyer_id,
+        }
+
+    def _new_product_row(self, external_product_id: str) -> dict:
+        return {
+            "id": str(uuid.uuid4()),
+            "merchant_id": self.merchant.id,
+            "external_product_id": external_product_id,
+            "name": f"Product {external_product_id}",
+            "price": 0.0,  # Unknown, will use default tier
+            "price_tier": PriceTier.MEDIUM,
+            "category": ProductCategory.OTHER,
+        }
 
     def _extract_features(
         self,
-        buyer: Buyer,
-        product: Product,
+        buyer: BuyerProfile,
+        product: ProductProfile,
         request: ScoreRequest,
-        days_since_order: int
+        days_since_order: int,
+        velocity: VelocityCounts,
     ) -> dict:
-        """Extract features for ML model."""
+        """Extract features for ML model.
+
+        The buyer_returns_* velocity counts are not model inputs (see
+        app.ml.features); they are stored in the request's return_features
+        row."""
         return {
             # Buyer features
             "buyer_return_rate": buyer.return_rate,
@@ -139,6 +382,10 @@ class ScoringEngine:
             "buyer_avg_review_score": buyer.avg_review_score,
             "buyer_account_age_days": buyer.account_age_days,
             "buyer_total_spend": buyer.total_spend,
+            "buyer_returns_1h": velocity.last_1h,
+            "buyer_returns_24h": velocity.last_24h,
+            "buyer_returns_7d": velocity.last_7d,
+            "buyer_returns_30d": velocity.last_30d,
 
             # Product features
             "product_return_rate": product.return_rate,
@@ -158,10 +405,11 @@ class ScoringEngine:
 
     def _detect_risk_flags(
         self,
-        buyer: Buyer,
-        product: Product,
+        buyer: BuyerProfile,
+        product: ProductProfile,
         request: ScoreRequest,
-        days_since_order: int
+        days_since_order: int,
+        velocity: VelocityCounts,
     ) -> List[RiskFlag]:
         """Detect risk flags based on various indicators."""
         flags = []
@@ -237,17 +485,21 @@ class ScoringEngine:
                 ))
 
         # Multiple recent returns
-        recent_returns = self.db.query(ReturnRequest).filter(
-            ReturnRequest.buyer_id == buyer.id,
-            ReturnRequest.request_date >= datetime.utcnow().replace(day=1)
-        ).count()
-        if recent_returns >= 3:
+        if velocity.this_month >= 3:
             flags.append(RiskFlag(
                 code="MULTIPLE_RECENT_RETURNS",
-                description=f"{recent_returns} returns this month",
+                description=f"{velocity.this_month} returns this month",
                 severity="high"
             ))
 
+        # Burst of returns within a day
+        if velocity.last_24h >= RETURN_BURST_24H:
+            flags.append(RiskFlag(
+                code="RETURN_BURST",
+                description=f"{velocity.last_24h} returns in the last 24 hours",
+                severity="medium"
+            ))
+
         return flags
 
     def _adjust_score(
@@ -300,10 +552,10 @@ class ScoringEngine:
         else:
             return Recommendation.REVIEW
 
-    def _create_return_request(
+    def _build_return_request(
         self,
-        buyer: Buyer,
-        product: Product,
+        buyer: BuyerProfile,
+        product: ProductProfile,
         request: ScoreRequest,
         score: float,
         risk_level: RiskLevel,
@@ -311,10 +563,9 @@ class ScoringEngine:
         confidence: float,
         recommendation: Recommendation,
         explanation: Optional[list] = None,
-        features: Optional[dict] = None,
         model_version: Optional[int] = None,
     ) -> ReturnRequest:
-        """Create a return request record."""
+        """Build a return request record; the caller persists it (see _persist)."""
         # Determine initial decision based on recommendation
         if recommendation == Recommendation.APPROVE:
             decision = ReturnDecision.APPROVED
@@ -327,27 +578,30 @@ class ScoringEngine:
             decided_by = None
 
         return_request = ReturnRequest(
+            # Assigned up front so the response never needs a post-commit refresh
+            id=str(uuid.uuid4()),
             merchant_id=self.merchant.id,
             buyer_id=buyer.id,
             product_id=product.id,
             order_id=request.order_id,
             order_date=request.order_date,
             order_amount=request.order_amount,
+            request_date=datetime.utcnow(),
             reason=request.return_reason,
             reason_details=request.reason_details,
             eligibility_score=score,
             risk_level=risk_level.value,
-            risk_flags=json.dumps([f.model_dump() for f in risk_flags]),
+            risk_flags=[f.model_dump() for f in risk_flags],
             confidence=confidence,
-            explanation=json.dumps(explanation) if explanation else None,
-            features_snapshot=json.dumps(features) if features else None,
+            explanation=explanation or None,
             model_version=model_version,
             decision=decision,
             decided_at=datetime.utcnow() if decided_by else None,
             decided_by=decided_by,
         )
-        self.db.add(return_request)
-        self.db.commit()
-        self.db.refresh(return_request)
-
         return return_request
+
+
+def _chunks(items: list, size: int = LOOKUP_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
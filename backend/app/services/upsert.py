@@ -0,0 +1,45 @@
+"""Counter upserts for the pre-aggregated tables (drift buckets, daily stats).
+
+upsert_add() inserts rows keyed by the table's primary key and, where a
+row already exists, adds the given columns onto it. Each worker process
+can then flush its increments into the same rows without coordination.
+"""
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+# Rows per multi-row upsert; keeps SQLite under its bound-parameter limit
+UPSERT_CHUNK_SIZE = 500
+
+
+def upsert_add(db: Session, model, rows: List[Dict[str, Any]], add_columns: Sequence[str]):
+    """INSERT rows, adding add_columns onto rows that already exist (no commit)."""
+    if not rows:
+        return
+    key_columns = [c.name for c in model.__table__.primary_key.columns]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            stmt = insert(model).values(rows[start:start + UPSERT_CHUNK_SIZE])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={
+                    name: getattr(model, name) + getattr(stmt.excluded, name)
+                    for name in add_columns
+                },
+            ))
+        return
+
+    # Other databases: UPDATE, then INSERT where nothing matched
+    for row in rows:
+        match = [getattr(model, name) == row[name] for name in key_columns]
+        result = db.execute(update(model).where(*match).values({
+            name: getattr(model, name) + row[name] for name in add_columns
+        }))
+        if result.rowcount == 0:
+            db.add(model(**row))
+    db.flush()
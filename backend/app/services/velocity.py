@@ -0,0 +1,201 @@
+"""Per-buyer return-velocity counters.
+
+Counts each buyer's returns in the last hour, 24 hours, 7 days, 30 days and
+in the current calendar month without querying return_requests per score.
+Every buyer seen recently keeps its return timestamps in memory (oldest
+first) with one start pointer per window. A lookup only advances those
+pointers past events that have aged out, so each event is stepped over at
+most once per window (amortized O(1)).
+
+The return_velocity_events table is the persistent copy. The engine adds
+an event in the same transaction as each return request. Buyers not in
+memory, or whose entry is older than the TTL (events written by other
+worker processes), are hydrated from it with one indexed query per batch.
+rebuild_velocity_events() recreates the table from return_requests.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.return_request import ReturnRequest
+from app.models.return_velocity import ReturnVelocityEvent
+
+settings = get_settings()
+
+# Rolling windows, shortest first; the calendar month is handled separately
+VELOCITY_WINDOWS: Tuple[Tuple[str, timedelta], ...] = (
+    ("1h", timedelta(hours=1)),
+    ("24h", timedelta(hours=24)),
+    ("7d", timedelta(days=7)),
+    ("30d", timedelta(days=30)),
+)
+
+# No window reaches further back than this (30 days, or a 31-day month)
+RETENTION = timedelta(days=32)
+
+# Max buyer IDs per IN (...) when hydrating
+HYDRATE_CHUNK_SIZE = 500
+
+
+@dataclass(frozen=True)
+class VelocityCounts:
+    """A buyer's return counts per window, as of one point in time."""
+
+    last_1h: int = 0
+    last_24h: int = 0
+    last_7d: int = 0
+    last_30d: int = 0
+    this_month: int = 0
+
+    def incremented(self) -> "VelocityCounts":
+        """Counts after one more return now (every window includes it)."""
+        return VelocityCounts(
+            self.last_1h + 1, self.last_24h + 1, self.last_7d + 1,
+            self.last_30d + 1, self.this_month + 1,
+        )
+
+
+def _window_starts(now: datetime) -> List[datetime]:
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return [now - span for _, span in VELOCITY_WINDOWS] + [month_start]
+
+
+class _BuyerEvents:
+    """One buyer's return timestamps, oldest first, with a start pointer
+    (absolute event index) per window."""
+
+    __slots__ = ("events", "dropped", "starts", "loaded_at")
+
+    def __init__(self, timestamps: Iterable[datetime], loaded_at: float):
+        self.events = deque(sorted(timestamps))
+        self.dropped = 0  # events popped from the left so far
+        self.starts = [0] * (len(VELOCITY_WINDOWS) + 1)
+        self.loaded_at = loaded_at
+
+    def add(self, occurred_at: datetime):
+        if not self.events or occurred_at >= self.events[-1]:
+            self.events.append(occurred_at)
+            return
+        # Out-of-order event (clock skew between workers): re-sort and let
+        # the pointers re-advance from the oldest event
+        self.events = deque(sorted([*self.events, occurred_at]))
+        self.starts = [self.dropped] * len(self.starts)
+
+    def counts(self, now: datetime) -> VelocityCounts:
+        events = self.events
+        expired = now - RETENTION
+        while events and events[0] < expired:
+            events.popleft()
+            self.dropped += 1
+
+        total = self.dropped + len(events)
+        for i, window_start in enumerate(_window_starts(now)):
+            start = max(self.starts[i], self.dropped)
+            while start < total and events[start - self.dropped] < window_start:
+                start += 1
+            self.starts[i] = start
+        return VelocityCounts(*(total - start for start in self.starts))
+
+
+class VelocityTracker:
+    """Bounded in-memory velocity state for recently seen buyers."""
+
+    def __init__(self, max_buyers: int, ttl: float):
+        self.max_buyers = max_buyers
+        self.ttl = ttl
+        self._buyers: "OrderedDict[str, _BuyerEvents]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.hydrated = 0
+
+    def counts(
+        self, db: Session, buyer_ids: Iterable[str], now: Optional[datetime] = None
+    ) -> Dict[str, VelocityCounts]:
+        """Current counts for each buyer, hydrating unknown buyers from the table."""
+        now = now or datetime.utcnow()
+        wanted = list(dict.fromkeys(buyer_ids))
+        clock = time.monotonic()
+        with self._lock:
+            missing = [
+                buyer_id for buyer_id in wanted
+                if buyer_id not in self._buyers or clock - self._buyers[buyer_id].loaded_at > self.ttl
+            ]
+        loaded = self._load(db, missing, now) if missing else {}
+
+        with self._lock:
+            for buyer_id in missing:
+                self._buyers[buyer_id] = _BuyerEvents(loaded.get(buyer_id, ()), clock)
+            self.hydrated += len(missing)
+            self.hits += len(wanted) - len(missing)
+
+            result = {}
+            for buyer_id in wanted:
+                self._buyers.move_to_end(buyer_id)
+                result[buyer_id] = self._buyers[buyer_id].counts(now)
+            while len(self._buyers) > self.max_buyers:
+                self._buyers.popitem(last=False)
+            return result
+
+    def record(self, buyer_id: str, occurred_at: datetime):
+        """Count a committed return (buyers not in memory pick it up from
+        the table on their next lookup)."""
+        with self._lock:
+            entry = self._buyers.get(buyer_id)
+            if entry is not None:
+                entry.add(occurred_at)
+
+    def clear(self):
+        with self._lock:
+            self._buyers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"buyers": len(self._buyers), "hits": self.hits, "hydrated": self.hydrated}
+
+    @staticmethod
+    def _load(db: Session, buyer_ids: List[str], now: datetime) -> Dict[str, List[datetime]]:
+        since = now - RETENTION
+        events: Dict[str, List[datetime]] = {}
+        for start in range(0, len(buyer_ids), HYDRATE_CHUNK_SIZE):
+            rows = db.query(ReturnVelocityEvent.buyer_id, ReturnVelocityEvent.occurred_at).filter(
+                ReturnVelocityEvent.buyer_id.in_(buyer_ids[start:start + HYDRATE_CHUNK_SIZE]),
+                ReturnVelocityEvent.occurred_at >= since,
+            )
+            for buyer_id, occurred_at in rows:
+                events.setdefault(buyer_id, []).append(occurred_at)
+        return events
+
+
+def rebuild_velocity_events(db: Session, now: Optional[datetime] = None) -> int:
+    """Recreate return_velocity_events from return_requests; returns rows written."""
+    since = (now or datetime.utcnow()) - RETENTION
+    db.query(ReturnVelocityEvent).delete(synchronize_session=False)
+    source = select(
+        ReturnRequest.id, ReturnRequest.merchant_id, ReturnRequest.buyer_id, ReturnRequest.request_date
+    ).where(ReturnRequest.request_date >= since)
+    db.execute(insert(ReturnVelocityEvent).from_select(
+        ["return_request_id", "merchant_id", "buyer_id", "occurred_at"], source
+    ))
+    db.commit()
+    velocity_tracker.clear()
+    return db.query(func.count(ReturnVelocityEvent.return_request_id)).scalar()
+
+
+def prune_velocity_events(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete events no window can see any more; returns rows deleted."""
+    expired = (now or datetime.utcnow()) - RETENTION
+    deleted = db.query(ReturnVelocityEvent).filter(
+        ReturnVelocityEvent.occurred_at < expired
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+velocity_tracker = VelocityTracker(settings.velocity_cache_size, settings.velocity_cache_ttl_s)
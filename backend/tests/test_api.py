@@ -1,5 +1,6 @@
 """End-to-end API tests: bootstrap, scoring, explainability, feedback
 retraining, model registry, and drift monitoring."""
+import time
 from datetime import datetime, timedelta
 
 API_KEY = "rpe_test_demo_key_000000000000000000"
@@ -45,6 +46,7 @@ def _score(client, buyer_id, product_id, amount, reason, days_ago=5):
 
 def test_health(client):
     assert client.get("/health").json()["status"] == "healthy"
+    assert "inference" in client.get("/metrics").json()
 
 
 def test_bootstrap_provisioned_model_and_merchant(client):
@@ -96,6 +98,231 @@ def test_return_detail_includes_explanation(client):
     body = resp.json()
     assert body["explanation"]
     assert body["risk_flags"] is not None
+    assert body["reason"] == "size_issue" and body["decision"] in ("approved", "denied", "review")
+
+    # Stored as native JSON, and the fast response path matches the schema
+    from app.database import SessionLocal
+    from app.models.return_request import ReturnRequest
+    from app.schemas.return_request import ReturnRequestResponse
+
+    db = SessionLocal()
+    try:
+        record = db.get(ReturnRequest, result["request_id"])
+        assert isinstance(record.explanation, list) and isinstance(record.risk_flags, list)
+        assert record.features_snapshot is None
+    finally:
+        db.close()
+    assert ReturnRequestResponse.model_validate(body).model_dump(mode="json") == body
+    listed = client.get("/api/v1/returns?per_page=100", headers=_login(client)).json()["items"]
+    assert body in listed
+
+
+def test_batch_scoring(client):
+    """Batch results come back in request order, persisted, and later items
+    see earlier returns from the same batch."""
+    _sync_buyer(client, "batch-risky", orders=6, returns=4,
+                review_score=2.0, spend=9000, age_days=20)
+    order_date = (datetime.utcnow() - timedelta(days=5)).isoformat()
+    items = [
+        {"buyer_id": buyer, "product_id": f"prod-batch-{i}", "order_id": f"order-batch-{i}",
+         "order_date": order_date, "order_amount": 999 + i, "return_reason": "changed_mind"}
+        for i, buyer in enumerate(["trusted-1", "batch-risky", "batch-new",
+                                   "batch-risky", "batch-risky", "batch-risky"])
+    ]
+    resp = client.post("/api/v1/score/batch", headers=HEADERS, json={"requests": items})
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["scored"] == len(items) and body["failed"] == 0
+    assert [r["index"] for r in body["results"]] == list(range(len(items)))
+
+    results = [r["result"] for r in body["results"]]
+    assert all(r["explanation"] and r["model_version"] is not None for r in results)
+    flags = [{f["code"] for f in r["risk_flags"]} for r in results]
+    # The fourth return of the month for batch-risky trips the velocity flag
+    assert "MULTIPLE_RECENT_RETURNS" not in flags[3]
+    assert "MULTIPLE_RECENT_RETURNS" in flags[5]
+
+    detail = client.get(f"/api/v1/returns/{results[2]['request_id']}", headers=HEADERS)
+    assert detail.status_code == 200, detail.text
+    assert detail.json()["order_id"] == "order-batch-2"
+
+
+def test_api_key_cache_follows_rotation_and_settings(client):
+    """Cached API-key auth must never outlive a rotated or revoked key."""
+    resp = client.post("/api/v1/auth/register", json={
+        "name": "Key Rotation Store", "email": "rotation@shopzone.example.com", "password": "rotate1234",
+    })
+    assert resp.status_code == 201, resp.text
+    token = client.post("/api/v1/auth/login", data={
+        "username": "rotation@shopzone.example.com", "password": "rotate1234",
+    }).json()["access_token"]
+    jwt_headers = {"Authorization": f"Bearer {token}"}
+
+    def buyer_sync(key):
+        return client.post("/api/v1/buyers/sync", headers={"X-API-Key": key},
+                           json={"buyers": [{"external_buyer_id": "rotation-buyer"}]})
+
+    old_key = client.post("/api/v1/auth/api-key", headers=jwt_headers).json()["api_key"]
+    assert buyer_sync(old_key).status_code == 200
+    assert buyer_sync(old_key).status_code == 200  # served from the cache
+    assert client.get("/metrics").json()["api_key_cache"]["hits"] >= 1
+
+    new_key = client.post("/api/v1/auth/api-key", headers=jwt_headers).json()["api_key"]
+    assert buyer_sync(old_key).status_code == 401
+    assert buyer_sync(new_key).status_code == 200
+
+    # Threshold changes apply to the next API-key call
+    resp = client.put("/api/v1/auth/me", headers=jwt_headers, json={"auto_approve_threshold": 0})
+    assert resp.status_code == 200, resp.text
+    result = client.post("/api/v1/score", headers={"X-API-Key": new_key}, json={
+        "buyer_id": "rotation-buyer", "product_id": "rotation-product", "order_id": "rotation-1",
+        "order_date": datetime.utcnow().isoformat(), "order_amount": 100, "return_reason": "defective",
+    }).json()
+    assert result["recommendation"] == "APPROVE"
+
+    assert client.delete("/api/v1/auth/api-key", headers=jwt_headers).status_code == 204
+    assert buyer_sync(new_key).status_code == 401
+
+
+def test_profile_cache_invalidated_by_sync(client):
+    """Scoring reads cached buyer profiles, but a sync is visible at once."""
+    first = _score(client, "cache-buyer", "prod-cache", 999, "size_issue")
+    assert first["buyer_return_rate"] == 0
+    _score(client, "cache-buyer", "prod-cache", 999, "size_issue")
+    stats = client.get("/metrics").json()["profile_cache"]
+    assert stats["buyers"]["hits"] >= 1 and stats["products"]["hits"] >= 1
+
+    _sync_buyer(client, "cache-buyer", orders=10, returns=6,
+                review_score=2.0, spend=5000, age_days=10)
+    after = _score(client, "cache-buyer", "prod-cache", 999, "size_issue")
+    assert after["buyer_return_rate"] == 60.0
+    assert client.get("/metrics").json()["profile_cache"]["buyers"]["invalidations"] >= 1
+
+
+def test_get_or_create_is_race_safe(client):
+    """A second insert of the same merchant-side ID is a no-op, and the
+    engine reads back the row that won."""
+    from app.database import SessionLocal
+    from app.models.buyer import Buyer
+    from app.services.auth import MerchantSnapshot, AuthService
+    from app.services.profile_cache import buyer_profiles
+    from app.services.scoring_engine import ScoringEngine
+
+    db = SessionLocal()
+    try:
+        merchant = MerchantSnapshot.from_model(AuthService.get_merchant_by_api_key(db, API_KEY))
+        engine = ScoringEngine(db, merchant)
+        first = engine._new_buyer_row("race-buyer")
+        assert engine._insert_missing(Buyer, [first], ["merchant_id", "external_buyer_id"]) == {first["id"]}
+        db.commit()
+
+        rival = engine._new_buyer_row("race-buyer")
+        assert engine._insert_missing(Buyer, [rival], ["merchant_id", "external_buyer_id"]) == set()
+        buyer_profiles.clear()
+        assert engine._get_or_create_buyer("race-buyer").id == first["id"]
+        db.commit()
+        row = db.query(Buyer).filter(Buyer.id == first["id"]).one()
+        assert row.total_orders == 0 and row.created_at is not None
+        assert db.query(Buyer).filter(Buyer.external_buyer_id == "race-buyer").count() == 1
+    finally:
+        db.close()
+
+
+def test_inference_pool_matches_local_and_hot_swaps(client, monkeypatch, tmp_path):
+    """Worker processes answer like the in-process model, and switch to a
+    new artifact after a reload."""
+    from app.config import get_settings
+    from app.ml.predict import get_predictor
+    from app.ml.train import ModelTrainer
+
+    predictor = get_predictor()
+    raw = {
+        "buyer_return_rate": 0.4, "buyer_account_age_days": 20, "buyer_total_orders": 5,
+        "buyer_avg_review_score": 2.5, "order_amount": 4999, "days_since_order": 12,
+        "return_reason": "changed_mind", "product_category": "electronics",
+    }
+    local = predictor.predict(raw)
+    old = predictor.state
+    with open(predictor.model_path, "rb") as f:
+        original_artifact = f.read()
+    # Work on a copy of the artifact; spawned workers read MODEL_PATH
+    model_path = str(tmp_path / "scoring_model.joblib")
+    with open(model_path, "wb") as f:
+        f.write(original_artifact)
+    monkeypatch.setattr(get_settings(), "model_path", model_path)
+    monkeypatch.setenv("MODEL_PATH", model_path)
+    predictor.start_pool(1)
+    try:
+        assert predictor.pool is not None
+        assert predictor.pool.call_versioned(old.version, "predict", raw) == (old.version, local)
+
+        trainer = ModelTrainer()
+        trainer.train(n_synthetic_samples=800, version=3001, run_cv=False)
+        trainer.save_model(predictor.model_path)
+        predictor.reload()
+        pool, predictor.pool = predictor.pool, None  # answer locally
+        swapped = predictor.predict(raw)
+        predictor.pool = pool
+        assert predictor.version == 3001 and swapped != local
+        assert predictor.pool.call_versioned(3001, "predict", raw) == (3001, swapped)
+        assert predictor.pool.call_versioned(3001, "explain_batch", [raw]) == (
+            3001, predictor.explain_batch([raw])
+        )
+        assert predictor.stats()["pool"]["generation"] == 1
+
+        # A request still holding the old state is not answered by a worker
+        # serving the new version
+        assert predictor.pool.call_versioned(old.version, "predict", raw) == (3001, None)
+        assert predictor.predict(raw, old) == local
+        assert predictor.stats()["pool"]["version_mismatches"] == 2
+    finally:
+        with open(predictor.model_path, "wb") as f:
+            f.write(original_artifact)
+        predictor.reload()
+        predictor.shutdown()
+    assert predictor.pool is None
+    assert predictor.predict(raw) == local
+
+
+def test_reload_swaps_complete_state(client, monkeypatch):
+    """Requests never see a half-loaded model during a reload, and a
+    request pinned to the old state finishes on it."""
+    import threading
+
+    from app.ml.predict import MLPredictor, get_predictor
+
+    predictor = get_predictor()
+    raw = {"buyer_return_rate": 0.1, "order_amount": 120, "return_reason": "defective"}
+    old = predictor.state
+    expected = predictor.predict(raw, old)
+
+    done = threading.Event()
+    seen = []
+
+    def score_while_reloading():
+        while not done.is_set():
+            state = predictor.state
+            seen.append((state.model is not None and state.bundle is not None, state.version))
+
+    scorer = threading.Thread(target=score_while_reloading)
+    scorer.start()
+    try:
+        for _ in range(3):
+            predictor.reload()
+    finally:
+        done.set()
+        scorer.join()
+
+    assert seen and all(complete for complete, _ in seen)
+    assert predictor.state is not old and predictor.version == old.version
+    assert predictor.predict(raw, old) == expected
+    assert predictor.explain(raw, old) == predictor.explain(raw)
+
+    # An artifact that cannot be loaded leaves the serving state in place
+    current = predictor.state
+    monkeypatch.setattr(MLPredictor, "model_path", property(lambda self: "/nonexistent.joblib"))
+    predictor.reload()
+    assert predictor.state is current
 
 
 def test_feedback_loop_retrain_and_registry(client):
@@ -118,11 +345,26 @@ def test_feedback_loop_retrain_and_registry(client):
     max_version_before = max(m["version"] for m in before)
 
     resp = client.post("/api/v1/models/retrain", headers=headers)
-    assert resp.status_code == 200, resp.text
-    body = resp.json()
-    assert body["version"] == max_version_before + 1
-    assert body["feedback_samples"] >= 1
-    assert body["activated"] is True
+    assert resp.status_code == 202, resp.text
+    job = resp.json()
+    assert job["status"] in ("queued", "running") and job["coalesced"] is False
+
+    # A second click while training joins the same job
+    again = client.post("/api/v1/models/retrain", headers=headers).json()
+    assert again["id"] == job["id"] and again["coalesced"] is True
+
+    deadline = time.monotonic() + 120
+    while job["status"] not in ("succeeded", "failed") and time.monotonic() < deadline:
+        time.sleep(0.2)
+        job = client.get(f"/api/v1/models/jobs/{job['id']}", headers=headers).json()
+    assert job["status"] == "succeeded", job
+    assert job["progress"] == 1.0 and job["finished_at"] is not None
+    assert job["version"] == max_version_before + 1
+    assert job["feedback_samples"] >= 1
+    assert job["metrics"]["roc_auc"] > 0.5
+    body = job
+
+    assert client.get("/api/v1/models/jobs/missing", headers=headers).status_code == 404
 
     after = client.get("/api/v1/models", headers=headers).json()
     active = next(m for m in after if m["is_active"])
@@ -158,3 +400,208 @@ def test_drift_report(client):
     for feat in report["features"]:
         assert feat["psi"] >= 0
         assert feat["status"] in ("stable", "moderate", "drifted")
+
+    # Windows come from the streaming counters
+    for query in ("?window=hour", "?hours=6"):
+        resp = client.get(f"/api/v1/models/drift{query}", headers=headers)
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["samples_analyzed"] >= 35
+    assert client.get("/api/v1/models/drift?window=month", headers=headers).status_code == 422
+
+
+def test_drift_history_snapshots(client):
+    """A scheduled snapshot stores the same per-feature PSI the live report
+    computes for that window, and history serves it as a time series."""
+    from app.database import SessionLocal
+    from app.services.drift_history import DriftSnapshotJob
+
+    headers = _login(client)
+    resp = client.get("/api/v1/models/drift/history", headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.json() == []
+
+    job = DriftSnapshotJob(interval_s=600, window_hours=24)
+    db = SessionLocal()
+    try:
+        assert job.run_once(db) >= 1
+        # The interval is claimed: a later run, or another worker's job, skips it
+        assert job.run_once(db) == 0
+        assert DriftSnapshotJob(interval_s=600, window_hours=24).run_once(db) == 0
+    finally:
+        db.close()
+
+    live = client.get("/api/v1/models/drift?hours=24", headers=headers).json()
+    history = client.get("/api/v1/models/drift/history?days=1", headers=headers).json()
+    assert len(history) == 1
+    point = history[0]
+    assert point["window_hours"] == 24
+    assert point["samples_analyzed"] == live["samples_analyzed"]
+    assert point["overall_status"] == live["overall_status"]
+    assert {f["feature"]: f["psi"] for f in point["features"]} == \
+        {f["feature"]: f["psi"] for f in live["features"]}
+
+
+def test_dashboard_stats_rollups_match_live_aggregation(client):
+    """All-time stats (daily rollups) agree with a short-range aggregation
+    over the same traffic, also after a manual override and a rebuild."""
+    from app.database import SessionLocal
+    from app.services.daily_stats import rebuild_daily_stats
+
+    headers = _login(client)
+    _sync_buyer(client, "dash-buyer", orders=10, returns=5, review_score=3.0, spend=900, age_days=60)
+    scored = _score(client, "dash-buyer", "dash-product", 300, "defective")
+
+    def both():
+        rollup = client.get("/api/v1/dashboard/stats", headers=headers)
+        live = client.get("/api/v1/dashboard/stats?days=30", headers=headers)
+        assert rollup.status_code == live.status_code == 200, rollup.text + live.text
+        return rollup.json(), live.json()
+
+    rollup, live = both()
+    assert rollup == live
+    assert rollup["total_returns"] == rollup["returns_this_week"] > 0
+    assert rollup["total_buyers"] > 0 and rollup["high_risk_buyers"] >= 1
+
+    new_decision = "denied" if scored["recommendation"] == "approve" else "approved"
+    resp = client.put(f"/api/v1/returns/{scored['request_id']}", headers=headers,
+                      json={"decision": new_decision})
+    assert resp.status_code == 200, resp.text
+    after, live = both()
+    assert after == live
+    assert after[f"{new_decision}_returns"] == rollup[f"{new_decision}_returns"] + 1
+
+    db = SessionLocal()
+    try:
+        assert rebuild_daily_stats(db) >= 1
+    finally:
+        db.close()
+    assert both()[0] == after
+
+
+def test_return_rate_filters_and_sorts_in_database(client):
+    """min_return_rate is applied before pagination, so every page is full
+    and pages do not overlap."""
+    from app.database import SessionLocal
+    from app.models.buyer import Buyer
+
+    headers = _login(client)
+    for i, returns in enumerate([0, 2, 5, 6, 8, 9]):
+        _sync_buyer(client, f"rate-{i}", orders=10, returns=returns,
+                    review_score=4.0, spend=1000, age_days=100)
+
+    def page(n):
+        resp = client.get(f"/api/v1/buyers?min_return_rate=0.5&sort=return_rate&per_page=2&page={n}",
+                          headers=headers)
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    first, second = page(1), page(2)
+    assert len(first) == len(second) == 2
+    rates = [b["return_rate"] for b in first + second]
+    assert rates == sorted(rates, reverse=True)
+    assert all(rate >= 0.5 for rate in rates)
+    assert not {b["id"] for b in first} & {b["id"] for b in second}
+
+    db = SessionLocal()
+    try:
+        for buyer, sql_rate in db.query(Buyer, Buyer.return_rate).limit(50):
+            assert abs(buyer.return_rate - sql_rate) < 1e-12
+    finally:
+        db.close()
+
+
+def test_bulk_sync_upserts_and_streams_ndjson(client):
+    """Sync creates and updates in bulk; updates only touch the fields sent."""
+    import json
+
+    headers = _login(client)
+    resp = client.post("/api/v1/products/sync", headers=HEADERS, json={"products": [
+        {"external_product_id": f"bulk-p{i}", "name": f"Bulk {i}", "price": 30 + i * 100}
+        for i in range(5)
+    ]})
+    assert resp.json() == {"created": 5, "updated": 0, "failed": 0, "errors": []}
+
+    resp = client.post("/api/v1/products/sync", headers=HEADERS, json={"products": [
+        {"external_product_id": "bulk-p0", "name": "Renamed", "price": 700, "total_sold": 40},
+        {"external_product_id": "bulk-p5", "name": "Bulk 5", "price": 10},
+    ]})
+    assert resp.json() == {"created": 1, "updated": 1, "failed": 0, "errors": []}
+    product = client.get("/api/v1/products/bulk-p0", headers=headers).json()
+    assert (product["name"], product["price_tier"], product["total_sold"]) == ("Renamed", "premium", 40)
+
+    # An update that omits fields leaves them as they were
+    _sync_buyer(client, "bulk-b0", orders=12, returns=3, review_score=4.5, spend=800, age_days=90)
+    resp = client.post("/api/v1/buyers/sync", headers=HEADERS,
+                       json={"buyers": [{"external_buyer_id": "bulk-b0", "total_returns": 4}]})
+    assert resp.json()["updated"] == 1
+    buyer = client.get("/api/v1/buyers/bulk-b0", headers=headers).json()
+    assert (buyer["total_orders"], buyer["total_returns"], buyer["total_spend"]) == (12, 4, 800)
+
+    lines = [json.dumps({"external_buyer_id": f"nd-{i}", "total_orders": i}) for i in range(2500)]
+    lines.insert(10, '{"external_buyer_id": "nd-bad", "total_orders": -1}')
+    lines.insert(20, "not json")
+    lines.append(json.dumps({"external_buyer_id": "bulk-b0", "total_orders": 20}))
+    resp = client.post("/api/v1/buyers/sync/ndjson", headers={**HEADERS, "Content-Type": "application/x-ndjson"},
+                       content="\n".join(lines) + "\n")
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert (body["created"], body["updated"], body["failed"]) == (2500, 1, 2)
+    assert body["errors"][0].startswith("line 11: total_orders")
+    assert body["errors"][1].startswith("line 21: Invalid JSON")
+    assert client.get("/api/v1/buyers/nd-2499", headers=headers).json()["total_orders"] == 2499
+    buyer = client.get("/api/v1/buyers/bulk-b0", headers=headers).json()
+    assert (buyer["total_orders"], buyer["total_returns"]) == (20, 4)
+
+
+def test_cursor_pagination_walks_every_row_once(client):
+    """Keyset pages cover the list exactly once, even across created_at ties
+    (a bulk sync stamps a whole chunk with the same time)."""
+    headers = _login(client)
+    resp = client.post("/api/v1/buyers/sync", headers=HEADERS, json={"buyers": [
+        {"external_buyer_id": f"page-{i}", "total_orders": 10, "total_returns": i % 7} for i in range(25)
+    ]})
+    assert resp.json()["created"] == 25
+
+    def walk(url):
+        seen, cursor = [], None
+        while True:
+            resp = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+            assert resp.status_code == 200, resp.text
+            seen += [b["id"] for b in resp.json()]
+            cursor = resp.headers.get("X-Next-Cursor")
+            if not cursor:
+                return seen
+
+    from app.database import SessionLocal
+    from app.models.buyer import Buyer
+
+    db = SessionLocal()
+    try:
+        merchant_id = db.query(Buyer.merchant_id).filter(Buyer.external_buyer_id == "page-0").scalar()
+        total = db.query(Buyer).filter(Buyer.merchant_id == merchant_id).count()
+    finally:
+        db.close()
+    for sort in ("recent", "return_rate"):
+        walked = walk(f"/api/v1/buyers?sort={sort}&per_page=97")
+        assert len(walked) == len(set(walked)) == total
+        first = client.get(f"/api/v1/buyers?sort={sort}&per_page=100", headers=headers).json()
+        assert walked[:100] == [b["id"] for b in first]
+
+    assert client.get("/api/v1/buyers?cursor=garbage", headers=headers).status_code == 400
+    recent_cursor = client.get("/api/v1/buyers?per_page=1", headers=headers).headers["X-Next-Cursor"]
+    assert client.get(f"/api/v1/buyers?sort=return_rate&cursor={recent_cursor}",
+                      headers=headers).status_code == 400
+
+    exact = client.get("/api/v1/returns?count=exact&per_page=100", headers=headers).json()
+    estimated = client.get("/api/v1/returns?per_page=5", headers=headers).json()
+    assert estimated["total"] == exact["total"] and not estimated["total_estimated"]
+    ids, cursor = [], None
+    while True:
+        page = client.get("/api/v1/returns?count=none&per_page=5" + (f"&cursor={cursor}" if cursor else ""),
+                          headers=headers).json()
+        assert page["total"] is None
+        ids += [r["id"] for r in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(ids) == len(set(ids)) == exact["total"]
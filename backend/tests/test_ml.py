@@ -0,0 +1,273 @@
+"""Unit tests for the ML layer: the fast inference/explanation paths must
+agree with the straightforward sklearn computations they replace."""
+import os
+import threading
+from itertools import combinations
+from math import factorial
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+
+from app.ml.artifacts import export_arrays, load_arrays
+from app.ml.compiled import CompiledEnsemble
+from app.ml.ecommerce_data import generate_flipkart_amazon_dataset
+from app.ml.explain import explain_batch, explain_prediction, explain_treeshap_batch
+from app.ml.features import NUMERICAL_FEATURES, PRICE_TIER_MAP, RETURN_REASON_MAP, FeatureExtractor
+from app.ml.predict import MicroBatchDispatcher, MLPredictor
+from app.ml.train import ModelTrainer
+from app.ml.treeshap import TreeShapExplainer
+
+
+@pytest.fixture(scope="module")
+def trained():
+    trainer = ModelTrainer()
+    trainer.train(n_synthetic_samples=800, run_cv=False)
+    data, _ = generate_flipkart_amazon_dataset(40)
+    X = trainer.feature_extractor.extract_batch(data)
+    return trainer, data, X
+
+
+def _ablate_one_by_one(model, row, baselines):
+    """Reference ablation: one predict_proba call per feature."""
+    base_prob = model.predict_proba(row)[0][1]
+    deltas = []
+    for idx in range(row.shape[1]):
+        ablated = row.copy()
+        ablated[0, idx] = baselines[idx]
+        deltas.append((base_prob - model.predict_proba(ablated)[0][1]) * 100)
+    return deltas
+
+
+def test_vectorized_ablation_matches_per_feature_calls(trained):
+    trainer, data, X = trained
+    bundle = trainer.bundle
+    args = (trainer.model, X[:8], bundle["baselines"], bundle["feature_names"], data[:8])
+
+    batch = explain_batch(*args, top_k=len(bundle["feature_names"]))
+    for row, explanation in enumerate(batch):
+        reference = _ablate_one_by_one(trainer.model, X[row:row + 1], bundle["baselines"])
+        expected = {
+            bundle["feature_names"][i]: round(d, 2)
+            for i, d in enumerate(reference) if abs(d) >= 0.05
+        }
+        assert {c["feature"]: c["contribution"] for c in explanation} == expected
+
+    single = explain_prediction(
+        trainer.model, X[:1], bundle["baselines"], bundle["feature_names"], data[0]
+    )
+    assert single == explain_batch(*args)[0]
+
+
+def test_compiled_ensemble_matches_sklearn(trained):
+    trainer, _, X = trained
+    compiled = CompiledEnsemble.from_model(trainer.model)
+    assert compiled is not None
+
+    expected = trainer.model.predict_proba(X)
+    assert np.max(np.abs(compiled.predict_proba(X) - expected)) <= 1e-9
+    for row in range(5):
+        single = compiled.predict_proba(X[row:row + 1])
+        assert np.max(np.abs(single - expected[row:row + 1])) <= 1e-9
+
+
+def test_compile_rejects_unsupported_models():
+    from sklearn.linear_model import LogisticRegression
+    model = LogisticRegression().fit(np.random.rand(20, 3), [0, 1] * 10)
+    assert CompiledEnsemble.from_model(model) is None
+
+
+def _path_dependent_value(tree, x, coalition, node=0):
+    """E[tree(x) | x_S] with non-coalition splits averaged by cover."""
+    left, right = tree.children_left[node], tree.children_right[node]
+    if left == -1:
+        return tree.value[node, 0, 0]
+    if tree.feature[node] in coalition:
+        goes_left = np.float32(x[tree.feature[node]]) <= tree.threshold[node]
+        return _path_dependent_value(tree, x, coalition, left if goes_left else right)
+    cover = tree.weighted_n_node_samples
+    return (cover[left] * _path_dependent_value(tree, x, coalition, left)
+            + cover[right] * _path_dependent_value(tree, x, coalition, right)) / cover[node]
+
+
+def test_treeshap_matches_brute_force_shapley():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 4))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(scale=0.3, size=300) > 0).astype(int)
+    model = GradientBoostingClassifier(n_estimators=5, max_depth=3).fit(X, y)
+    ensemble = CompiledEnsemble.from_model(model)
+    explainer = TreeShapExplainer.from_ensemble(ensemble)
+
+    n = X.shape[1]
+    for x, phi in zip(X[:4], explainer.shap_values(X[:4])):
+        expected = np.zeros(n)
+        for tree in (est.tree_ for est in model.estimators_[:, 0]):
+            for i in range(n):
+                others = [j for j in range(n) if j != i]
+                for size in range(n):
+                    weight = factorial(size) * factorial(n - size - 1) / factorial(n)
+                    for subset in combinations(others, size):
+                        with_i = _path_dependent_value(tree, x, set(subset) | {i})
+                        without = _path_dependent_value(tree, x, set(subset))
+                        expected[i] += weight * (with_i - without)
+        assert np.allclose(phi, expected * model.learning_rate, atol=1e-12)
+
+
+def test_treeshap_is_additive_and_selectable_per_bundle(trained):
+    trainer, data, X = trained
+    ensemble = CompiledEnsemble.from_model(trainer.model)
+    explainer = MLPredictor._build_shap_explainer(
+        ensemble, {**trainer.bundle, "explanation_method": "treeshap"}
+    )
+    assert explainer is not None
+    assert MLPredictor._build_shap_explainer(ensemble, trainer.bundle) is None  # ablation default
+
+    phi = explainer.shap_values(X)
+    assert np.allclose(phi.sum(axis=1) + explainer.expected_value,
+                       ensemble.decision_function(X), atol=1e-9)
+
+    explanations = explain_treeshap_batch(
+        explainer, ensemble, X[:3], trainer.bundle["feature_names"], data[:3]
+    )
+    for explanation in explanations:
+        assert explanation
+        assert {"feature", "label", "value", "contribution", "direction"} <= set(explanation[0])
+
+
+def test_mapped_arrays_match_compiled_model(trained, tmp_path):
+    trainer, _, X = trained
+    bundle = {**trainer.bundle, "explanation_method": "treeshap"}
+    ensemble = CompiledEnsemble.from_model(trainer.model)
+    explainer = MLPredictor._build_shap_explainer(ensemble, bundle)
+    model_path = str(tmp_path / "scoring_model.joblib")
+    assert load_arrays(model_path, bundle) is None
+
+    export_arrays(model_path, bundle, ensemble, explainer)
+    mapped, mapped_explainer = load_arrays(model_path, bundle)
+    assert isinstance(mapped.value, np.memmap) and not mapped.value.flags.writeable
+    assert np.array_equal(mapped.predict_proba(X), ensemble.predict_proba(X))
+    assert np.array_equal(mapped_explainer.shap_values(X), explainer.shap_values(X))
+
+    # A published export is never replaced; each bundle gets its own directory
+    directory = export_arrays(model_path, bundle, ensemble)
+    assert load_arrays(model_path, bundle)[1] is not None
+    newer = {**bundle, "version": bundle["version"] + 1}
+    assert load_arrays(model_path, newer) is None
+    newer_directory = export_arrays(model_path, newer, ensemble)
+    assert newer_directory != directory and load_arrays(model_path, newer)[1] is None
+
+    # Publishing removes exports no live process maps, whatever their version
+    assert not os.path.exists(directory)
+    assert load_arrays(model_path, bundle) is None
+
+    # Rollback while another live process maps the newer export: it stays;
+    # the marker of an exited process does not keep anything
+    markers = tmp_path / "scoring_model.arrays-in-use"
+    (markers / str(os.getppid())).write_text(os.path.basename(newer_directory))
+    (markers / str(2**31 - 1)).write_text(os.path.basename(newer_directory))
+    assert export_arrays(model_path, bundle, ensemble) == directory
+    assert os.path.isdir(newer_directory)
+    assert not (markers / str(2**31 - 1)).exists()
+    (markers / str(os.getppid())).unlink()
+    retrained = {**bundle, "trained_at": "2026-10-17T00:00:00"}
+    export_arrays(model_path, retrained, ensemble)
+    assert not os.path.exists(directory) and not os.path.exists(newer_directory)
+
+
+def test_microbatch_dispatcher_coalesces_concurrent_rows(trained):
+    trainer, _, X = trained
+    dispatcher = MicroBatchDispatcher(window_ms=50, max_rows=16)
+    results = [None] * 16
+    start = threading.Barrier(16)
+
+    def worker(i):
+        start.wait()
+        results[i] = dispatcher.submit(trainer.model, X[i:i + 1])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    dispatcher.stop()
+
+    assert np.allclose(results, trainer.model.predict_proba(X[:16])[:, 1], atol=1e-12)
+    stats = dispatcher.stats()
+    assert stats["rows"] == 16
+    assert stats["batches"] < 16
+    assert stats["max_batch_size"] > 1
+    assert stats["max_queue_delay_ms"] >= stats["avg_queue_delay_ms"] >= 0
+
+
+def test_microbatch_dispatcher_answers_rows_submitted_during_stop(trained):
+    """Submissions racing stop() are all answered, never left waiting."""
+    trainer, _, X = trained
+    dispatcher = MicroBatchDispatcher(window_ms=5, max_rows=4)
+    results = [None] * 8
+    stopping = threading.Event()
+
+    def worker(i):
+        while not stopping.is_set():
+            results[i] = dispatcher.submit(trainer.model, X[i:i + 1])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for _ in range(20):
+        dispatcher.stop()
+    stopping.set()
+    for t in threads:
+        t.join(timeout=10)
+    dispatcher.stop()
+
+    assert not any(t.is_alive() for t in threads)
+    assert np.allclose(results, trainer.model.predict_proba(X[:8])[:, 1], atol=1e-12)
+
+
+def _extract_row_by_row(raw):
+    """Reference extraction (the original per-row list build)."""
+    row = [float(raw.get(f, 0) or 0) for f in NUMERICAL_FEATURES]
+    row.append(float(PRICE_TIER_MAP.get(raw.get("product_price_tier", "medium"), 1)))
+    row.append(float(RETURN_REASON_MAP.get(raw.get("return_reason", "other"), 7)))
+    return row
+
+
+def test_columnar_extraction_matches_row_by_row():
+    data, _ = generate_flipkart_amazon_dataset(60)
+    data[0] = {"buyer_return_rate": None, "return_reason": "not_a_reason"}
+    data[1] = {"product_price_tier": "premium", "order_amount": "12.5"}
+    extractor = FeatureExtractor()
+    expected = np.array([_extract_row_by_row(r) for r in data])
+
+    assert np.array_equal(extractor.extract_batch(data), expected)
+    assert extractor.extract_batch(data, dtype=np.float32).dtype == np.float32
+    for i in range(3):
+        assert np.array_equal(extractor.extract(data[i]), expected[i:i + 1])
+
+    rest = data[2:]
+    columns = {key: [r[key] for r in rest] for key in rest[0]}
+    assert np.array_equal(extractor.extract_columns(columns), expected[2:])
+
+
+def test_psi_matrix_matches_per_feature_psi():
+    from app.ml.explain import compute_psi, compute_psi_matrix
+
+    rng = np.random.default_rng(1)
+    edges = [np.linspace(0, 1, 11), np.linspace(-2, 2, 5)]
+    train = [rng.dirichlet(np.ones(len(e) - 1)) for e in edges]
+    samples = [[rng.uniform(0, 1, 200), rng.normal(size=150)], [rng.uniform(0, 0.3, 80), np.array([])]]
+
+    padded = np.zeros((2, 10))
+    for f, props in enumerate(train):
+        padded[f, :len(props)] = props
+    counts = np.zeros((2, 2, 10))
+    for m, merchant in enumerate(samples):
+        for f, values in enumerate(merchant):
+            binned, _ = np.histogram(values, bins=edges[f])
+            counts[m, f, :len(binned)] = binned
+
+    psi = compute_psi_matrix(padded, counts)
+    for m, merchant in enumerate(samples):
+        for f, values in enumerate(merchant):
+            assert np.isclose(psi[m, f], compute_psi(train[f], edges[f], values))
+    assert psi[1, 1] == 0.0
@@ -0,0 +1,462 @@
+"""Unit tests for scoring-path services that keep state in memory."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from test_api import HEADERS, _login
+
+from app.services.velocity import (
+    VELOCITY_WINDOWS,
+    VelocityCounts,
+    _BuyerEvents,
+    _window_starts,
+    rebuild_velocity_events,
+    velocity_tracker,
+)
+
+
+def _brute_force_counts(events, now):
+    starts = _window_starts(now)
+    return VelocityCounts(*(sum(1 for e in events if start <= e <= now) for start in starts))
+
+
+def test_sliding_windows_match_brute_force_counts():
+    rng = random.Random(7)
+    now = datetime(2026, 3, 2, 12, 0)
+    events = sorted(now - timedelta(minutes=rng.randint(0, 60 * 24 * 45)) for _ in range(300))
+    history = [e for e in events if e <= now - timedelta(days=20)]
+    future = [e + timedelta(days=20) for e in events if e > now - timedelta(days=20)]
+
+    buyer = _BuyerEvents(history, loaded_at=0.0)
+    assert buyer.counts(now) == _brute_force_counts(history, now)
+
+    # Time moves forward (across a month boundary) while new returns arrive
+    seen = list(history)
+    clock = now
+    for event in sorted(future):
+        clock = event
+        buyer.add(event)
+        seen.append(event)
+        assert buyer.counts(clock) == _brute_force_counts(seen, clock)
+    assert len(VELOCITY_WINDOWS) + 1 == len(buyer.starts)
+
+
+def test_velocity_rebuilt_from_history(client):
+    """The backing table can be recreated from return_requests, and the
+    tracker then reports the same counts as before."""
+    from app.database import SessionLocal
+    from app.models.buyer import Buyer
+
+    resp = client.post("/api/v1/score", headers=HEADERS, json={
+        "buyer_id": "velocity-buyer", "product_id": "velocity-product", "order_id": "velocity-1",
+        "order_date": datetime.utcnow().isoformat(), "order_amount": 250, "return_reason": "defective",
+    })
+    assert resp.status_code == 200, resp.text
+
+    db = SessionLocal()
+    try:
+        buyer_ids = [b.id for b in db.query(Buyer.id).limit(20)]
+        before = velocity_tracker.counts(db, buyer_ids)
+        assert rebuild_velocity_events(db) > 0
+        assert velocity_tracker.stats()["buyers"] == 0
+        assert velocity_tracker.counts(db, buyer_ids) == before
+    finally:
+        db.close()
+
+
+def test_schema_upgrade_merges_duplicates_before_unique_index(tmp_path):
+    """Legacy duplicate buyers are merged (references moved to the kept
+    row) so the unique index the upserts rely on can be built."""
+    from sqlalchemy import create_engine, inspect, text
+
+    from app.database import Base
+    from app.services.bootstrap import ensure_schema
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_buyers_merchant_external"))
+        for buyer_id, updated in (("old", "2024-01-01"), ("new", "2024-06-01")):
+            conn.execute(text(
+                "INSERT INTO buyers (id, merchant_id, external_buyer_id, created_at, updated_at) "
+                "VALUES (:id, 'm1', 'dup', :updated, :updated)"
+            ), {"id": buyer_id, "updated": updated})
+        conn.execute(text(
+            "INSERT INTO return_velocity_events (return_request_id, merchant_id, buyer_id, occurred_at) "
+            "VALUES ('r1', 'm1', 'old', '2024-01-02')"
+        ))
+
+    ensure_schema(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id FROM buyers")).scalars().all() == ["new"]
+        assert conn.execute(text("SELECT buyer_id FROM return_velocity_events")).scalar() == "new"
+    assert "uq_buyers_merchant_external" in {i["name"] for i in inspect(engine).get_indexes("buyers")}
+    engine.dispose()
+
+
+def test_write_behind_modes_persist_scored_returns(client, monkeypatch):
+    """Both durability modes end with the scored rows in the database;
+    group_commit before the response, async at the latest on stop()."""
+    from app.database import SessionLocal
+    from app.services import scoring_engine
+    from app.services.score_writer import WriteBehindQueue
+
+    for mode in ("group_commit", "async"):
+        writer = WriteBehindQueue(mode, flush_ms=20, batch_size=50, max_size=100, block_ms=10)
+        writer.start(SessionLocal)
+        monkeypatch.setattr(scoring_engine, "score_writer", writer)
+        ids = []
+        for i in range(5):
+            resp = client.post("/api/v1/score", headers=HEADERS, json={
+                "buyer_id": f"wb-buyer-{mode}", "product_id": "wb-product", "order_id": f"wb-{mode}-{i}",
+                "order_date": datetime.utcnow().isoformat(), "order_amount": 120, "return_reason": "size_issue",
+            })
+            assert resp.status_code == 200, resp.text
+            ids.append(resp.json()["request_id"])
+        if mode == "group_commit":
+            assert client.get(f"/api/v1/returns/{ids[-1]}", headers=HEADERS).status_code == 200
+        writer.stop()
+
+        stats = writer.stats()
+        assert stats["flushed_rows"] == stats["enqueued_rows"] == 5
+        assert stats["failed_rows"] == 0
+        for request_id in ids:
+            assert client.get(f"/api/v1/returns/{request_id}", headers=HEADERS).status_code == 200
+
+
+def test_write_behind_stop_loses_no_accepted_rows(monkeypatch):
+    """Every row submit() accepted is flushed, even when it races stop()."""
+    import threading
+
+    from app.services.score_writer import WriteBehindQueue
+
+    for mode in ("group_commit", "async"):
+        writer = WriteBehindQueue(mode, flush_ms=1, batch_size=8, max_size=1000, block_ms=10)
+        written = []
+        monkeypatch.setattr(writer, "_write", lambda rows: written.extend(rows) or True)
+        accepted = []
+        stopping = threading.Event()
+
+        def submitter(worker):
+            i = 0
+            while not stopping.is_set():
+                row = {"id": f"{worker}-{i}"}
+                if writer.submit([row]):
+                    accepted.append(row["id"])
+                i += 1
+
+        threads = [threading.Thread(target=submitter, args=(w,)) for w in range(4)]
+        for t in threads:
+            t.start()
+        for _ in range(20):
+            writer.start(object)
+            writer.stop()
+        stopping.set()
+        for t in threads:
+            t.join(timeout=10)
+
+        assert not any(t.is_alive() for t in threads)
+        assert accepted and sorted(r["id"] for r in written) == sorted(accepted)
+
+
+def test_return_features_written_and_backfilled(client):
+    """Scoring stores the encoded feature vector and the buyer's velocity
+    counts; legacy JSON snapshots are backfilled into the same columns."""
+    import numpy as np
+
+    from app.database import SessionLocal
+    from app.ml.features import FeatureExtractor
+    from app.models.return_features import FEATURE_COLUMNS, VELOCITY_COLUMNS, ReturnFeatures
+    from app.models.return_request import ReturnRequest
+    from app.services.feature_store import backfill_return_features
+
+    extractor = FeatureExtractor()
+    assert list(FEATURE_COLUMNS) == extractor.feature_names
+
+    for order_id in ("features-1", "features-2"):
+        resp = client.post("/api/v1/score", headers=HEADERS, json={
+            "buyer_id": "features-buyer", "product_id": "features-product", "order_id": order_id,
+            "order_date": datetime.utcnow().isoformat(), "order_amount": 640, "return_reason": "wrong_item",
+        })
+        assert resp.status_code == 200, resp.text
+    request_id = resp.json()["request_id"]
+
+    db = SessionLocal()
+    try:
+        stored = db.get(ReturnFeatures, request_id)
+        assert stored is not None
+        assert stored.order_amount == 640
+        assert stored.return_reason_encoded == extractor.extract({"return_reason": "wrong_item"})[0, -1]
+        record = db.get(ReturnRequest, request_id)
+        assert stored.model_version == record.model_version
+        assert record.features_snapshot is None
+        # The second return saw the first in every window
+        assert [getattr(stored, name) for name in VELOCITY_COLUMNS] == [1, 1, 1, 1]
+
+        # Simulate a row scored before return_features existed
+        legacy = {"buyer_return_rate": 0.4, "buyer_total_orders": 12, "order_amount": 99.0,
+                  "product_price_tier": "premium", "return_reason": "changed_mind",
+                  "buyer_returns_24h": 3}
+        db.delete(stored)
+        record.features_snapshot = legacy
+        db.commit()
+
+        assert backfill_return_features(db) == 1
+        assert backfill_return_features(db) == 0
+        backfilled = db.get(ReturnFeatures, request_id)
+        row = [getattr(backfilled, name) for name in FEATURE_COLUMNS]
+        assert np.array_equal(row, extractor.extract(legacy)[0])
+        assert backfilled.buyer_returns_24h == 3 and backfilled.buyer_returns_1h is None
+    finally:
+        db.close()
+
+
+def test_drift_counters_match_direct_psi(client):
+    """Counters flushed in several increments (across hour buckets), plus
+    ones still pending, give the same PSI as binning the raw values at once."""
+    import numpy as np
+
+    from app.database import SessionLocal
+    from app.ml.explain import compute_psi, psi_from_counts
+    from app.ml.predict import get_predictor
+    from app.models.return_features import FEATURE_COLUMNS
+    from app.services.drift import DriftAccumulator, drift_window_start, window_counts
+
+    histograms = get_predictor().histograms
+    rng = np.random.default_rng(3)
+    matrix = rng.uniform(0, 50, size=(90, len(FEATURE_COLUMNS)))
+    now = datetime.utcnow()
+    scored_at = [now - timedelta(minutes=40 * (i % 3)) for i in range(90)]
+
+    accumulator = DriftAccumulator(flush_interval_s=0)
+    db = SessionLocal()
+    try:
+        for start in range(0, 90, 30):
+            accumulator.add("drift-merchant", 999, histograms,
+                            scored_at[start:start + 30], matrix[start:start + 30])
+            if start < 60:
+                assert accumulator.flush(db) >= 1
+        # The last increment is read from memory, not flushed
+        samples, counts = window_counts(
+            db, "drift-merchant", 999, drift_window_start("day"), accumulator
+        )
+        assert samples == 90 and accumulator.stats()["pending_buckets"] > 0
+        for name, hist in histograms.items():
+            column = matrix[:, FEATURE_COLUMNS.index(name)]
+            recent = [counts.get(name, {}).get(i, 0) for i in range(len(hist["proportions"]))]
+            assert np.isclose(psi_from_counts(hist["proportions"], recent),
+                              compute_psi(hist["proportions"], hist["bin_edges"], column))
+
+        # Only the current hour's bucket for a one-hour window
+        samples, _ = window_counts(
+            db, "drift-merchant", 999, drift_window_start(hours=1, now=now), accumulator
+        )
+        assert samples == sum(1 for ts in scored_at if ts >= drift_window_start(hours=1, now=now))
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def scratch_versions():
+    """Registry versions a test registers, deleted when it finishes so
+    later tests see the registry as bootstrap and the API tests left it."""
+    versions = []
+    yield versions
+
+    from app.database import SessionLocal
+    from app.models.scoring_model import ScoringModel
+
+    db = SessionLocal()
+    try:
+        db.query(ScoringModel).filter(ScoringModel.version.in_(versions)).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_model_blobs_compressed_deferred_and_collected(client, scratch_versions):
+    """Registry blobs are compressed, never loaded by the list endpoint,
+    and only the newest versions plus active/pinned ones keep theirs."""
+    import io
+
+    import joblib
+    import numpy as np
+    from sqlalchemy import inspect
+
+    from app.database import SessionLocal
+    from app.ml.train import load_bundle
+    from app.models.scoring_model import ScoringModel
+    from app.services.model_registry import compress_model_blobs, gc_model_blobs
+
+    bundle = {"model": None, "weights": np.zeros(20000)}
+    raw = io.BytesIO()
+    joblib.dump(bundle, raw)
+    db = SessionLocal()
+    try:
+        # Registered before compression existed: raw blob, no blob_size
+        scratch_versions.extend(range(1001, 1005))
+        for version in scratch_versions:
+            db.add(ScoringModel(version=version, model_blob=raw.getvalue()))
+        db.commit()
+        assert compress_model_blobs(db) == 4
+        legacy = db.query(ScoringModel).filter(ScoringModel.version == 1001).one()
+        assert legacy.blob_size == len(legacy.model_blob) < len(raw.getvalue()) // 10
+        assert np.array_equal(load_bundle(legacy.model_blob)["weights"], bundle["weights"])
+        db.expunge_all()
+
+        records = db.query(ScoringModel).all()
+        assert all("model_blob" in inspect(r).unloaded for r in records)
+        db.expunge_all()
+    finally:
+        db.close()
+
+    headers = _login(client)
+    assert client.post("/api/v1/models/1002/pin", headers=headers).json()["is_pinned"] is True
+    assert client.post("/api/v1/models/9999/pin", headers=headers).status_code == 404
+
+    db = SessionLocal()
+    try:
+        gc_model_blobs(db, keep=1)
+        kept = {
+            r.version for r in db.query(ScoringModel).filter(ScoringModel.model_blob.isnot(None))
+        }
+        active = db.query(ScoringModel.version).filter(ScoringModel.is_active == True).scalar()
+        assert kept == {1004, 1002, active}
+    finally:
+        db.close()
+
+    listed = {m["version"]: m for m in client.get("/api/v1/models", headers=headers).json()}
+    assert listed[1001]["blob_size"] is None and listed[1004]["blob_size"] > 0
+    assert client.post("/api/v1/models/1001/pin", headers=headers).status_code == 409
+    assert client.post("/api/v1/models/1002/unpin", headers=headers).json()["is_pinned"] is False
+
+
+def test_version_watcher_follows_active_model(client, scratch_versions, monkeypatch, tmp_path):
+    """A worker whose artifact holds another version restores the active
+    one from the registry blob and switches to it, and back on rollback."""
+    from app.config import get_settings
+    from app.database import SessionLocal
+    from app.ml.predict import get_predictor
+    from app.ml.train import ModelTrainer
+    from app.models.scoring_model import ScoringModel
+    from app.services.model_registry import store_blob
+    from app.services.model_sync import ModelVersionWatcher
+
+    # Restores write the artifact (and its array export) here
+    monkeypatch.setattr(get_settings(), "model_path", str(tmp_path / "scoring_model.joblib"))
+    watcher = ModelVersionWatcher(interval_s=0)
+    predictor = get_predictor()
+    db = SessionLocal()
+    try:
+        original = db.query(ScoringModel).filter(ScoringModel.is_active == True).one()
+        original_version = original.version
+        assert predictor.version == original_version
+        assert watcher.check(db) is False
+
+        # Trained and activated by "another replica": only the registry has it
+        trainer = ModelTrainer()
+        trainer.train(n_synthetic_samples=800, version=2001, run_cv=False)
+        scratch_versions.append(2001)
+        record = ScoringModel(version=2001, is_active=True)
+        store_blob(record, trainer.serialize_bundle())
+        original.is_active = False
+        db.add(record)
+        db.commit()
+
+        assert watcher.check(db) is True
+        assert predictor.version == 2001
+        assert watcher.stats()["restores"] == 1
+
+        # Rollback
+        record.is_active = False
+        original.is_active = True
+        db.commit()
+        assert watcher.check(db) is True
+        assert predictor.version == original_version
+        assert watcher.stats()["reloads"] == 2
+    finally:
+        # Leave the original version active and served even if a check failed
+        db.rollback()
+        db.query(ScoringModel).filter(ScoringModel.version == 2001).update({"is_active": False})
+        db.query(ScoringModel).filter(ScoringModel.version == original_version).update({"is_active": True})
+        db.commit()
+        watcher.check(db)
+        db.close()
+
+
+def test_expired_retrain_job_does_not_register(client, monkeypatch):
+    """A job failed as stale while its thread still trains registers
+    nothing and keeps its FAILED status; versions stay unique."""
+    from sqlalchemy.exc import IntegrityError
+
+    from app.database import SessionLocal
+    from app.models.retrain_job import RetrainJob
+    from app.models.scoring_model import ScoringModel
+    from app.services import retrain_jobs
+
+    monkeypatch.setattr(retrain_jobs, "SYNTHETIC_SAMPLES", 800)
+    runner = retrain_jobs.RetrainJobRunner(stale_s=60)
+    db = SessionLocal()
+    try:
+        job = RetrainJob(status=retrain_jobs.RUNNING, active=1)
+        db.add(job)
+        db.commit()
+        # No heartbeat for longer than stale_s: the next submit expires it
+        job.updated_at = datetime.utcnow() - timedelta(seconds=120)
+        db.commit()
+        runner._expire_stale(db)
+        db.refresh(job)
+        assert job.status == retrain_jobs.FAILED and job.active is None
+        versions = {v for (v,) in db.query(ScoringModel.version)}
+
+        with pytest.raises(RuntimeError, match="expired"):
+            retrain_jobs.retrain_and_activate(db, job_id=job.id)
+        assert {v for (v,) in db.query(ScoringModel.version)} == versions
+
+        db.add(ScoringModel(version=max(versions)))
+        with pytest.raises(IntegrityError):
+            db.commit()
+        db.rollback()
+    finally:
+        db.query(RetrainJob).filter(RetrainJob.id == job.id).delete()
+        db.commit()
+        db.close()
+
+
+def test_retrain_job_failing_to_start_releases_slot(client):
+    """A job whose RUNNING update fails is marked FAILED, not left
+    holding the single active slot."""
+    from app.database import SessionLocal
+    from app.models.retrain_job import RetrainJob
+    from app.services import retrain_jobs
+
+    sessions = []
+
+    def session_factory():
+        db = SessionLocal()
+        if not sessions:
+            # The first session (the RUNNING update) cannot commit
+            def commit():
+                raise RuntimeError("database unavailable")
+            db.commit = commit
+        sessions.append(db)
+        return db
+
+    runner = retrain_jobs.RetrainJobRunner(stale_s=60)
+    runner.start(session_factory)
+    db = SessionLocal()
+    try:
+        job, coalesced = runner.submit(db, None)
+        assert not coalesced
+        runner.stop()
+        db.refresh(job)
+        assert job.status == retrain_jobs.FAILED and job.active is None
+        assert "database unavailable" in job.error
+        assert runner.stats()["failed"] == 1
+    finally:
+        db.query(RetrainJob).filter(RetrainJob.id == job.id).delete()
+        db.commit()
+        db.close()
@@ -1,7 +1,7 @@
 'use client';
 
 import { useEffect, useState } from 'react';
-import { api, ModelVersion, DriftReport, RetrainResult } from '@/lib/api';
+import { api, ModelVersion, DriftReport, RetrainJob } from '@/lib/api';
 import { Brain, RefreshCw, CheckCircle2, Activity, AlertTriangle } from 'lucide-react';
 
 const driftColors: Record<string, string> = {
@@ -27,7 +27,7 @@ export default function ModelsPage() {
   const [drift, setDrift] = useState<DriftReport | null>(null);
   const [loading, setLoading] = useState(true);
   const [retraining, setRetraining] = useState(false);
-  const [retrainResult, setRetrainResult] = useState<RetrainResult | null>(null);
+  const [retrainJob, setRetrainJob] = useState<RetrainJob | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   const fetchData = async () => {
@@ -53,10 +53,19 @@ export default function ModelsPage() {
   const handleRetrain = async () => {
     setRetraining(true);
     setError(null);
-    setRetrainResult(null);
+    setRetrainJob(null);
     try {
-      const result = await api.retrainModel();
-      setRetrainResult(result);
+      // Training runs as a background job: poll until it finishes
+      let job = await api.retrainModel();
+      setRetrainJob(job);
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await api.getRetrainJob(job.id);
+        setRetrainJob(job);
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Retraining failed');
+      }
       await fetchData();
     } catch (e: any) {
       setError(e.message || 'Retraining failed');
@@ -88,7 +97,9 @@ export default function ModelsPage() {
           className="flex items-center px-4 py-2 bg-primary-600 text-white rounded-lg hover:bg-primary-700 disabled:opacity-50"
         >
           <RefreshCw className={`h-4 w-4 mr-2 ${retraining ? 'animate-spin' : ''}`} />
-          {retraining ? 'Training…' : 'Retrain from feedback'}
+          {retraining
+            ? `Training… ${Math.round((retrainJob?.progress ?? 0) * 100)}%`
+            : 'Retrain from feedback'}
         </button>
       </div>
 
@@ -96,14 +107,14 @@ export default function ModelsPage() {
         <div className="mb-6 p-4 bg-red-50 text-red-700 rounded-lg text-sm">{error}</div>
       )}
 
-      {retrainResult && (
+      {retrainJob?.status === 'succeeded' && (
         <div className="mb-6 p-4 bg-green-50 text-green-800 rounded-lg text-sm flex items-start">
           <CheckCircle2 className="h-5 w-5 mr-2 flex-shrink-0" />
           <div>
-            <p className="font-medium">{retrainResult.message}</p>
+            <p className="font-medium">{retrainJob.message}</p>
             <p className="mt-1 text-green-700">
               Your manual approve/deny overrides were used as ground-truth labels
-              ({retrainResult.feedback_samples} samples).
+              ({retrainJob.feedback_samples} samples).
             </p>
           </div>
         </div>
@@ -46,6 +46,9 @@ export default function ReturnsPage() {
   const [returns, setReturns] = useState<ReturnRequest[]>([]);
   const [loading, setLoading] = useState(true);
   const [page, setPage] = useState(1);
+  // cursors[i] fetches page i + 1; filled in as pages are visited
+  const [cursors, setCursors] = useState<(string | undefined)[]>([undefined]);
+  const [hasNext, setHasNext] = useState(false);
   const [total, setTotal] = useState(0);
   const [filter, setFilter] = useState<string>('');
   const [selectedReturn, setSelectedReturn] = useState<ReturnRequest | null>(null);
@@ -55,9 +58,14 @@ export default function ReturnsPage() {
   const fetchReturns = async () => {
     setLoading(true);
     try {
-      const data = await api.getReturns(page, perPage, filter || undefined);
+      const data = await api.getReturns(cursors[page - 1], perPage, filter || undefined);
       setReturns(data.items);
-      setTotal(data.total);
+      setTotal(data.total ?? 0);
+      setHasNext(data.next_cursor !== null);
+      if (data.next_cursor) {
+        const next = data.next_cursor;
+        setCursors(c => [...c.slice(0, page), next]);
+      }
     } catch (error) {
       console.error('Failed to fetch returns:', error);
     } finally {
@@ -79,7 +87,11 @@ export default function ReturnsPage() {
     }
   };
 
-  const totalPages = Math.ceil(total / perPage);
+  const selectFilter = (value: string) => {
+    setFilter(value);
+    setPage(1);
+    setCursors([undefined]);
+  };
 
   return (
     <div>
@@ -92,7 +104,7 @@ export default function ReturnsPage() {
       <div className="bg-white rounded-xl shadow-sm p-4 mb-6">
         <div className="flex flex-wrap gap-2">
           <button
-            onClick={() => { setFilter(''); setPage(1); }}
+            onClick={() => selectFilter('')}
             className={`px-4 py-2 rounded-lg text-sm font-medium transition-colors ${
               filter === '' ? 'bg-primary-100 text-primary-700' : 'bg-gray-100 text-gray-600 hover:bg-gray-200'
             }`}
@@ -100,7 +112,7 @@ export default function ReturnsPage() {
             All
           </button>
           <button
-            onClick={() => { setFilter('review'); setPage(1); }}
+            onClick={() => selectFilter('review')}
             className={`px-4 py-2 rounded-lg text-sm font-medium transition-colors ${
               filter === 'review' ? 'bg-orange-100 text-orange-700' : 'bg-gray-100 text-gray-600 hover:bg-gray-200'
             }`}
@@ -108,7 +120,7 @@ export default function ReturnsPage() {
             Needs Review
           </button>
           <button
-            onClick={() => { setFilter('approved'); setPage(1); }}
+            onClick={() => selectFilter('approved')}
             className={`px-4 py-2 rounded-lg text-sm font-medium transition-colors ${
               filter === 'approved' ? 'bg-green-100 text-green-700' : 'bg-gray-100 text-gray-600 hover:bg-gray-200'
             }`}
@@ -116,7 +128,7 @@ export default function ReturnsPage() {
             Approved
           </button>
           <button
-            onClick={() => { setFilter('denied'); setPage(1); }}
+            onClick={() => selectFilter('denied')}
             className={`px-4 py-2 rounded-lg text-sm font-medium transition-colors ${
               filter === 'denied' ? 'bg-red-100 text-red-700' : 'bg-gray-100 text-gray-600 hover:bg-gray-200'
             }`}
@@ -212,7 +224,7 @@ export default function ReturnsPage() {
         )}
 
         {/* Pagination */}
-        {totalPages > 1 && (
+        {(page > 1 || hasNext) && (
           <div className="px-6 py-4 border-t flex items-center justify-between">
             <p className="text-sm text-gray-500">
               Showing {(page - 1) * perPage + 1} to {Math.min(page * perPage, total)} of {total}
@@ -226,8 +238,8 @@ export default function ReturnsPage() {
                 <ChevronLeft className="h-5 w-5" />
               </button>
               <button
-                onClick={() => setPage(p => Math.min(totalPages, p + 1))}
-                disabled={page === totalPages}
+                onClick={() => setPage(p => p + 1)}
+                disabled={!hasNext}
                 className="p-2 rounded-lg border hover:bg-gray-50 disabled:opacity-50"
               >
                 <ChevronRight className="h-5 w-5" />
@@ -62,12 +62,20 @@ interface ModelVersion {
   created_at: string;
 }
 
-interface RetrainResult {
-  version: number;
-  metrics: Record<string, number>;
-  feedback_samples: number;
-  activated: boolean;
-  message: string;
+interface RetrainJob {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  stage: string | null;
+  progress: number;
+  coalesced: boolean;
+  version: number | null;
+  metrics: Record<string, number> | null;
+  feedback_samples: number | null;
+  error: string | null;
+  message: string | null;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
 }
 
 interface FeatureDrift {
@@ -191,13 +199,15 @@ class ApiClient {
     return this.fetch('/dashboard/stats');
   }
 
-  async getReturns(page = 1, perPage = 20, decision?: string): Promise<{
+  async getReturns(cursor?: string, perPage = 20, decision?: string): Promise<{
     items: ReturnRequest[];
-    total: number;
-    page: number;
+    total: number | null;
+    total_estimated: boolean;
     per_page: number;
+    next_cursor: string | null;
   }> {
-    let url = `/returns?page=${page}&per_page=${perPage}`;
+    let url = `/returns?per_page=${perPage}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
     if (decision) url += `&decision=${decision}`;
     return this.fetch(url);
   }
@@ -228,10 +238,14 @@ class ApiClient {
     return this.fetch('/models');
   }
 
-  async retrainModel(): Promise<RetrainResult> {
+  async retrainModel(): Promise<RetrainJob> {
     return this.fetch('/models/retrain', { method: 'POST' });
   }
 
+  async getRetrainJob(id: string): Promise<RetrainJob> {
+    return this.fetch(`/models/jobs/${id}`);
+  }
+
   async getDriftReport(): Promise<DriftReport> {
     return this.fetch('/models/drift');
   }
@@ -244,7 +258,7 @@ export type {
   Buyer,
   FeatureContribution,
   ModelVersion,
-  RetrainResult,
+  RetrainJob,
   FeatureDrift,
   DriftReport,
 };